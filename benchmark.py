@@ -0,0 +1,75 @@
+# Benchmark of the exploration strategies (see strategy.py): the number of calls to the prover
+# that each strategy needs to decide the lattice below a maximal configuration. The prover is
+# replaced by an oracle built from the proofs of results.md: for a property, a configuration
+# is TRUE if it is below one of the configurations proved in results.md, FALSE otherwise.
+#
+# usage:
+#  $ python3 benchmark.py
+#  $ python3 benchmark.py -q "Conf[S]" -c "RSA|ECC, None|Sign|Encrypt, reopen, SNoAA|SSec, anon|pwd|cert, switch, lt_leaks"
+
+from configurations import *
+from explorer import Explorer
+from lazy import LazyTrie
+from strategy import STRATEGIES
+
+from argparse import ArgumentParser
+from re import findall
+
+RESULTS = "results.md"
+MAXIMAL = "RSA|ECC, None|Sign|Encrypt, reopen, SNoAA|SSec, anon|pwd|cert, switch, lt_leaks"
+
+
+# property -> the configurations proved in results.md
+def proofs(file = RESULTS):
+   p = {}
+   with open(file, "r") as f:
+      for query, config in findall(r'opcua.py -q "([^"]+)" *-c "([^"]+)"', f.read()):
+         p.setdefault(query, []).append(bitconf.from_str(config))
+   return p
+
+# Number of calls to the prover of the strategy to decide the lattice below sup, and the
+# maximal TRUE configurations it found.
+def explore(strategy, proved, sup, processes = 1):
+   calls = []
+   def test(job):
+      calls.append(job.conf)
+      if any(job.conf <= c for c in proved):
+         return Result.TRUE, timedelta(seconds=0)
+      return Result.FALSE, timedelta(seconds=0)
+   E = Explorer(LazyTrie.from_conf(sup), test, processes, strategy = strategy)
+   E.run([], use_first = True)
+   unproved, false, true = E.frontier()
+   return len(calls), [c for c, r, t in true]
+
+def main():
+   parser = ArgumentParser(
+      prog = 'benchmark.py',
+      description = 'number of calls to the prover of the exploration strategies, with the proofs of ' + RESULTS + ' as oracle'
+   )
+   parser.add_argument('-c', '--config',    help='maximal configuration (default: ' + MAXIMAL + ')', default=MAXIMAL)
+   parser.add_argument('-p', '--processes', help='parallel calls to the prover (default: 1)', type=int, default=1)
+   parser.add_argument('-q', '--query',     help='property of ' + RESULTS + ' (default: all of them)')
+   args = parser.parse_args()
+
+   sup = bitconf.from_str(args.config)
+   size = sum(1 for c in LazyTrie.from_conf(sup).configurations())
+   print(str(size) + " configurations below " + str(sup) + ".\n")
+   print("property".ljust(14) + "".join(name.rjust(10) for name in STRATEGIES))
+   total = { name: 0 for name in STRATEGIES }
+   for query, proved in proofs().items():
+      if args.query != None and query != args.query:
+         continue
+      line = query.ljust(14)
+      frontiers = []
+      for name, strategy in STRATEGIES.items():
+         calls, true = explore(strategy(), proved, sup, args.processes)
+         total[name] += calls
+         frontiers.append(true)
+         line += str(calls).rjust(10)
+      if any(f != frontiers[0] for f in frontiers):
+         line += "  (the strategies disagree!)"
+      print(line)
+   print("total".ljust(14) + "".join(str(total[name]).rjust(10) for name in STRATEGIES))
+
+if __name__ == "__main__":
+   main()
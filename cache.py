@@ -0,0 +1,150 @@
+# Persistent cache of proof results (see opcua.prove).
+# An entry is keyed by a hash of everything that determines what ProVerif answers: the rendered
+# model and library, the version of ProVerif and its options. So a configuration that renders
+# to the same files as one already proved, in this run or in an earlier one, is not proved again.
+#
+# Beside the decided results (TRUE, FALSE, CANNOT), the cache keeps negative entries:
+# a TIMEOUT entry records that ProVerif did not conclude within `timeout` seconds, and a
+# MEM_OUT entry that it did not within `limit` GiB. A later run with a smaller (or equal)
+# budget gets the same answer without running ProVerif, a run with a larger budget runs it,
+# knowing that it will take more than `timeout` seconds.
+#
+# A FALSE result of a run stopped at the first false query (see opcua.StreamParser) is partial:
+# it lacks the verdicts of the other queries, so it only answers jobs that would stop too.
+#
+# Entries are JSON files in CACHE_DIR, named by their key. They are written atomically,
+# so that several runs (e.g. prove.sh and reproduce_proofs.py) may share the cache.
+
+from configurations import Result
+
+from datetime import timedelta
+from hashlib import sha256
+import json
+from os import getpid, makedirs, path, replace, stat
+from shutil import which
+from subprocess import run, PIPE, STDOUT
+from threading import Lock, get_ident
+
+CACHE_DIR = ".proof_cache"
+DECIDED   = [Result.TRUE, Result.FALSE, Result.CANNOT]
+
+# Version of the prover, from its help message and its binary
+VERSIONS = {}
+VERSIONS_LOCK = Lock()
+
+def prover_version(exe):
+   with VERSIONS_LOCK:
+      if not exe in VERSIONS:
+         binary = which(exe)
+         version = ""
+         if binary != None:
+            s = stat(binary)
+            version = binary + " " + str(s.st_size) + " " + str(s.st_mtime_ns) + "\n"
+            try:
+               p = run([exe, "-help"], stdout=PIPE, stderr=STDOUT, encoding='utf-8', timeout=60)
+               version += p.stdout.split('\n')[0]
+            except Exception:
+               pass
+         VERSIONS[exe] = version
+      return VERSIONS[exe]
+
+# Key of a proof job: options is the command line of the prover without the input files.
+def key(options, conf_text, targ_text):
+   h = sha256()
+   for part in [prover_version(options[0]), " ".join(options), conf_text, targ_text]:
+      h.update(part.encode('utf-8'))
+      h.update(b'\0')
+   return h.hexdigest()
+
+
+# Short name of the settings of the prover (binary, version and options), e.g. for the history
+def settings(options):
+   return sha256((prover_version(options[0]) + "\0" + " ".join(options)).encode('utf-8')).hexdigest()[:16]
+
+class Cache:
+   def __init__(self, directory = CACHE_DIR):
+      self.directory = directory
+
+   def file(self, key):
+      return path.join(self.directory, key[:2], key + ".json")
+
+   def get(self, key):
+      try:
+         with open(self.file(key), "r") as f:
+            return json.load(f)
+      except (OSError, ValueError):
+         return None
+
+   def put(self, key, entry):
+      f = self.file(key)
+      makedirs(path.dirname(f), exist_ok = True)
+      tmp = f + "." + str(getpid()) + "." + str(get_ident()) + ".tmp"
+      with open(tmp, "w") as t:
+         json.dump(entry, t)
+      replace(tmp, f)
+
+   # Fill the proof result r from the cache, if the entry answers a job with the given budget
+   # (timeout in seconds, limit in GiB, None for no limit). Otherwise, r.lower_bound is the time
+   # ProVerif is known to need, if any. Partial results only answer jobs that accept them.
+   def load(self, key, r, timeout, limit, partial = False):
+      e = self.get(key)
+      if e == None:
+         return False
+      result = Result[e["result"]]
+      if e.get("partial", False) and not partial:
+         return False
+      hit = result in DECIDED or \
+            (result == Result.TIMEOUT  and timeout != None and timeout <= e["timeout"]) or \
+            (result == Result.MEM_OUT  and (e["limit"] == None or (limit != None and limit <= e["limit"])))
+      if not hit:
+         if result == Result.TIMEOUT:
+            r.lower_bound = timedelta(seconds=e["timeout"])
+         return False
+      r.result    = result
+      r.verdicts  = None if e["verdicts"] == None else [None if v == None else Result[v] for v in e["verdicts"]]
+      r.output    = e["output"]
+      r.duration  = timedelta(seconds=e["duration"])
+      r.timed_out = result == Result.TIMEOUT
+      r.peak      = e["peak"]
+      r.cached    = True
+      if e.get("partial", False):
+         r.aborted = r.verdicts
+      return True
+
+   # Record the proof result r of a job with the given budget.
+   def store(self, key, r, timeout, limit):
+      partial = r.aborted != None
+      if partial:
+         # do not replace the complete result
+         output = r.output[-10000:]
+         e = self.get(key)
+         if e != None and Result[e["result"]] in DECIDED:
+            return
+      elif r.result in DECIDED:
+         output = r.summary()
+      elif (r.result == Result.TIMEOUT and timeout != None) or r.result == Result.MEM_OUT:
+         output = r.output[-10000:]
+         e = self.get(key)
+         if e != None and Result[e["result"]] in DECIDED:
+            return
+         if e != None and Result[e["result"]] == r.result:
+            if r.result == Result.TIMEOUT:
+               timeout = max(timeout, e["timeout"])
+            elif e["limit"] == None or limit == None:
+               limit = None
+            else:
+               limit = max(limit, e["limit"])
+      else:
+         # errors are not cached
+         return
+      self.put(key, {
+         "queries":       r.queries,
+         "configuration": r.configuration,
+         "result":        r.result.name,
+         "verdicts":      None if r.verdicts == None else [None if v == None else v.name for v in r.verdicts],
+         "duration":      r.duration.total_seconds(),
+         "peak":          r.peak,
+         "timeout":       timeout,
+         "limit":         limit,
+         "partial":       partial,
+         "output":        output })
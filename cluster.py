@@ -0,0 +1,348 @@
+# Coordinator/worker mode, to spread a lattice exploration campaign over several hosts.
+# The coordinator (prove.py --serve PORT) keeps the lattice: it renders the input files of
+# ProVerif, and hands them out with the timeout and the memory limit to the workers that
+# connect to it:
+#  $ python3 cluster.py coordinator:PORT --cores 16 --memory 400 --token TOKEN
+# The coordinator listens on localhost only, unless told another address (prove.py --bind),
+# and the workers must give it the shared token (prove.py --token, or PROVE_TOKEN in the
+# environment of both): otherwise anyone could send it verdicts.
+# Each worker tells its number of cores and its memory (in GiB), and gets at most one run of
+# ProVerif per core, within its memory. It sends back the results of the runs with their
+# telemetry. When a worker disconnects (or dies), its runs are handed out to the other workers,
+# and the worker connects again as soon as it can. The coordinator pings the workers when it has
+# nothing to send them: a worker (or a coordinator) that says nothing for SILENCE seconds is
+# hung, and is disconnected.
+#
+# The messages are JSON lines:
+#  worker -> coordinator: {"type": "hello", "host", "cores", "memory", "token"}
+#                         {"type": "result", "id", "result"}, see opcua.ProofResult.to_dict
+#                         {"type": "result", "id", "error"}, if the worker could not run ProVerif
+#                         {"type": "pong"}, the answer to a ping
+#  coordinator -> worker: {"type": "job", "id", "conf", "targ", "timeout", "limit", "watchdog",
+#                          "early_abort", "dev"}
+#                         {"type": "cancel", "id"}
+#                         {"type": "rejected"}, for a wrong token: then the worker stops
+#                         {"type": "ping"}
+
+from explorer import available_memory
+import opcua
+from runner import Runner, ENDED
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hmac import compare_digest
+from itertools import count
+import json
+from os import cpu_count, environ, getpid
+from queue import Empty, Queue
+from secrets import token_hex
+import socket
+from threading import Event, Lock, Thread
+from time import sleep
+
+PORT  = 7077
+HOST  = "localhost" # where the coordinator listens by default
+TOKEN = "PROVE_TOKEN" # environment variable of the shared token
+RETRY = 5 # seconds between two attempts to connect
+HEARTBEAT = 30 # seconds without message to a worker before a ping
+SILENCE   = 3 * HEARTBEAT # seconds without message from the other side before disconnecting
+GiB   = 1024*1024*1024 # Bytes
+
+# The shared token: the given one, or the one of the environment
+def token_of(token = None):
+   return token or environ.get(TOKEN)
+
+
+def send(stream, lock, message):
+   with lock:
+      stream.write((json.dumps(message) + "\n").encode('utf-8'))
+      stream.flush()
+
+
+# A run of ProVerif, handed out to a worker
+class Task:
+   def __init__(self, number, key, message, limit):
+      self.number    = number
+      self.key       = key     # the job id given to execute(), to cancel it
+      self.message   = message
+      self.limit     = limit   # GiB
+      self.worker    = None
+      self.cancelled = False
+      self.result    = None    # see opcua.ProofResult.to_dict
+      self.error     = None    # why the worker could not run ProVerif
+      self.done      = Event()
+
+
+# A worker, seen from the coordinator. Its messages are written by its own thread, so that a
+# slow or hung worker blocks no one else.
+class Connection:
+   def __init__(self, sock, address):
+      self.sock    = sock
+      self.sock.settimeout(SILENCE)
+      self.stream  = sock.makefile('rwb')
+      self.lock    = Lock()
+      self.outbox  = Queue() # messages to send, None to close the connection
+      self.host    = address[0]
+      self.cores   = 0
+      self.memory  = 0 # GiB
+      self.tasks   = {} # number -> task
+      Thread(target = self.sender, daemon = True).start()
+
+   def send(self, message):
+      self.outbox.put(message)
+
+   # Close the connection once the messages already given are sent.
+   def close(self):
+      self.outbox.put(None)
+
+   # Send the messages, and a ping when there is none for HEARTBEAT seconds.
+   def sender(self):
+      try:
+         while True:
+            try:
+               m = self.outbox.get(timeout = HEARTBEAT)
+            except Empty:
+               m = {"type": "ping"}
+            if m == None:
+               break
+            send(self.stream, self.lock, m)
+      except (OSError, ValueError):
+         pass # the connection is closed, or the worker hung: its tasks are handed out again
+      try:
+         self.sock.shutdown(socket.SHUT_RDWR)
+         self.stream.close()
+      except OSError:
+         pass # with what is left unsent
+      self.sock.close()
+
+   # like explorer.Scheduler: an idle worker takes any task
+   def fits(self, task):
+      used = sum(t.limit or 0 for t in self.tasks.values())
+      return len(self.tasks) < self.cores and (self.tasks == {} or used + (task.limit or 0) <= self.memory)
+
+
+class Coordinator:
+   # Without a token (see token_of), a random one is made and printed for the workers.
+   def __init__(self, port = PORT, host = HOST, token = None):
+      self.token   = token_of(token)
+      if self.token == None:
+         self.token = token_hex(16)
+         print("Token of the workers: " + self.token)
+      self.server  = socket.create_server((host, port))
+      self.workers = []
+      self.pending = [] # tasks waiting for a worker
+      self.tasks   = {} # key -> task
+      self.doomed  = set() # keys cancelled before they were executed
+      self.ended   = OrderedDict() # the last ENDED keys, to ignore their late cancellations
+      self.numbers = count()
+      self.lock    = Lock()
+      Thread(target = self.accept, daemon = True).start()
+
+   def accept(self):
+      while True:
+         sock, address = self.server.accept()
+         Thread(target = self.serve, args = (Connection(sock, address),), daemon = True).start()
+
+   def serve(self, w):
+      try:
+         for line in w.stream:
+            m = json.loads(line)
+            if m["type"] == "hello":
+               if not compare_digest(str(m.get("token")).encode('utf-8'), self.token.encode('utf-8')):
+                  print("Worker " + w.host + " rejected: wrong token.")
+                  w.send({"type": "rejected"})
+                  break
+               w.host, w.cores, w.memory = m["host"], m["cores"], m["memory"]
+               print("Worker " + w.host + " connected: " + str(w.cores) + " cores, " + str(w.memory) + " GiB.")
+               with self.lock:
+                  self.workers.append(w)
+                  self.dispatch()
+            elif not w in self.workers:
+               break # not authenticated
+            # a pong only shows that the worker is alive
+            elif m["type"] == "result":
+               with self.lock:
+                  task = w.tasks.pop(m["id"], None)
+                  if task != None:
+                     self.tasks.pop(task.key, None)
+                     task.result = m.get("result")
+                     task.error  = m.get("error")
+                     task.done.set()
+                  self.dispatch()
+      except (OSError, ValueError, KeyError):
+         pass
+      with self.lock:
+         if w in self.workers:
+            self.workers.remove(w)
+            print("Worker " + w.host + " disconnected, " + str(len(w.tasks)) + " runs to hand out again.")
+         for task in w.tasks.values():
+            task.worker = None
+            if task.cancelled:
+               self.tasks.pop(task.key, None)
+               task.done.set()
+            else:
+               self.pending.insert(0, task)
+         w.tasks = {}
+         self.dispatch()
+      w.close()
+
+   # Hand out the pending tasks to the workers that have room for them (with self.lock): the
+   # messages are only queued (see Connection.sender).
+   def dispatch(self):
+      for task in list(self.pending):
+         for w in self.workers:
+            if w.fits(task):
+               self.pending.remove(task)
+               w.tasks[task.number] = task
+               task.worker = w
+               w.send(task.message)
+               break
+
+   # The executor of opcua.prove: the run is handed out to a worker, and r gets its results.
+   # The log gets the end of the output only (see opcua.ProofResult.to_dict).
+   def execute(self, r, conf_text, targ_text, timeout = None, limit = None, rnd_ext = '', runner = None,
+               job_id = None, watchdog = False, early_abort = False, dev = False, log = None):
+      number = next(self.numbers)
+      key = job_id if job_id != None else ("cluster", number)
+      task = Task(number, key, {"type": "job", "id": number, "conf": conf_text, "targ": targ_text,
+                                "timeout": timeout, "limit": limit, "watchdog": watchdog,
+                                "early_abort": early_abort, "dev": dev}, limit)
+      with self.lock:
+         if key in self.doomed:
+            self.doomed.remove(key)
+            task.done.set()
+         else:
+            self.tasks[key] = task
+            self.pending.append(task)
+            self.dispatch()
+      task.done.wait()
+      with self.lock:
+         self.ended[key] = None
+         if len(self.ended) > ENDED:
+            self.ended.popitem(last = False)
+      if task.error != None:
+         raise RuntimeError("worker " + task.worker.host + ": " + task.error)
+      if task.result == None:
+         # cancelled before a worker ran it
+         r.cancelled = True
+         r.conclude()
+      else:
+         r.from_dict(task.result)
+         if log != None:
+            log.write(r.output)
+
+   # Cancel the run of a job id, like runner.Runner.cancel.
+   def cancel(self, key):
+      with self.lock:
+         task = self.tasks.get(key)
+         if task == None:
+            if not key in self.ended:
+               self.doomed.add(key)
+            return False
+         task.cancelled = True
+         if task.worker == None:
+            self.pending.remove(task)
+            self.tasks.pop(key)
+            task.done.set()
+         else:
+            task.worker.send({"type": "cancel", "id": task.number})
+      return True
+
+   # Forget a job id that was cancelled and will not be executed.
+   def forget(self, key):
+      with self.lock:
+         self.doomed.discard(key)
+
+
+class Worker:
+   def __init__(self, host, port = PORT, cores = None, memory = None, token = None):
+      self.host        = host
+      self.port        = port
+      self.token       = token_of(token)
+      self.cores       = cores or cpu_count()
+      self.memory      = memory or available_memory() * 9 // 10 // GiB
+      self.runner      = Runner(self.cores)
+      self.pool        = ThreadPoolExecutor(self.cores)
+      self.connections = count()
+
+   def run(self):
+      while True:
+         try:
+            sock = socket.create_connection((self.host, self.port))
+         except OSError:
+            sleep(RETRY)
+            continue
+         print("Connected to " + self.host + ":" + str(self.port) + ".")
+         if not self.serve(sock, next(self.connections)):
+            print("Rejected by " + self.host + ":" + str(self.port) + ": wrong token.")
+            return
+         print("Disconnected from " + self.host + ":" + str(self.port) + ".")
+         sleep(RETRY)
+
+   # False if the coordinator rejected the worker
+   def serve(self, sock, connection):
+      sock.settimeout(SILENCE) # the coordinator pings us
+      stream = sock.makefile('rwb')
+      lock = Lock()
+      running = set()
+      accepted = True
+      try:
+         send(stream, lock, {"type": "hello", "host": socket.gethostname(), "cores": self.cores,
+                             "memory": self.memory, "token": self.token})
+         for line in stream:
+            m = json.loads(line)
+            if m["type"] == "job":
+               running.add(m["id"])
+               self.pool.submit(self.job, stream, lock, connection, running, m)
+            elif m["type"] == "cancel":
+               self.runner.cancel((connection, m["id"]))
+            elif m["type"] == "ping":
+               send(stream, lock, {"type": "pong"})
+            elif m["type"] == "rejected":
+               accepted = False
+               break
+      except (OSError, ValueError, KeyError):
+         pass
+      # the coordinator hands out these runs again
+      for id in running.copy():
+         self.runner.cancel((connection, id))
+      sock.close()
+      return accepted
+
+   # The coordinator waits for an answer to each job: the result of the run, or the error that
+   # prevented it (e.g. no proverif on this host).
+   def job(self, stream, lock, connection, running, m):
+      r = opcua.ProofResult([], "")
+      answer = {"type": "result", "id": m["id"], "error": "the worker stopped"}
+      try:
+         opcua.execute(r, m["conf"], m["targ"], m["timeout"], m["limit"],
+                       "_" + str(getpid()) + "_" + str(connection) + "_" + str(m["id"]), self.runner,
+                       (connection, m["id"]), m["watchdog"], m["early_abort"], m["dev"])
+         answer = {"type": "result", "id": m["id"], "result": r.to_dict()}
+      except Exception as e:
+         print("ERROR while running job " + str(m["id"]) + ": " + str(e))
+         answer["error"] = str(e) + ", " + str(type(e))
+      finally:
+         running.discard(m["id"])
+         try:
+            send(stream, lock, answer)
+         except OSError:
+            pass # the coordinator hands out this run again
+
+
+def main():
+   parser = ArgumentParser(
+      prog = 'cluster.py',
+      description = 'worker of a lattice exploration campaign of prove.py (see prove.py --serve)'
+   )
+   parser.add_argument('coordinator',   help='host:port of the coordinator')
+   parser.add_argument('-c', '--cores',  help='number of ProVerif runs at the same time (default: all the cores)', type=int)
+   parser.add_argument('-m', '--memory', help='memory for ProVerif, in GiB (default: 90%% of the available memory)', type=int)
+   parser.add_argument('-t', '--token',  help='token of the coordinator (default: $' + TOKEN + ')')
+   args = parser.parse_args()
+   host, _, port = args.coordinator.rpartition(':')
+   Worker(host or HOST, int(port or PORT), args.cores, args.memory, args.token).run()
+
+if __name__ == "__main__":
+   main()
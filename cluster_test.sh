@@ -0,0 +1,46 @@
+#!/bin/bash
+# usage ./cluster_test.sh [query configuration timeout workers]
+# Runs a small campaign twice, on this host then on workers started on localhost (see
+# cluster.py), and checks that both give the same minimal and maximal configurations.
+# The cache is not used, so that ProVerif really runs on the workers.
+
+q=${1:-"Conf[C]"}
+c=${2:-"RSA|ECC, None|Sign, reopen, SSec, anon|pwd, no_switch, lt_leaks"}
+t=${3:-60}
+n=${4:-2}
+port=7078
+tmp=$(mktemp -d)
+export PROVE_TOKEN=$(python3 -c "import secrets; print(secrets.token_hex(16))")
+
+frontier() { # the results, without the running times
+   sed -n '/^Minimal configurations/,/^Total/p' "$1" | grep -v '^Total' | sed 's/ *[0-9][0-9]m [0-9][0-9]s//'
+}
+
+echo "Local run...................."
+echo "" | python3 prove.py -q "$q" -c "$c" -t "$t" -p 4 --no_cache --store "$tmp/local.db" \
+   --snapshot "$tmp/local.json" > "$tmp/local.txt" || exit 1
+
+echo "Run on $n workers on localhost:$port...................."
+for i in $(seq "$n"); do
+   python3 cluster.py "localhost:$port" --cores 2 > "$tmp/worker_$i.txt" 2>&1 &
+done
+echo "" | python3 prove.py -q "$q" -c "$c" -t "$t" -p 4 --no_cache --store "$tmp/cluster.db" \
+   --snapshot "$tmp/cluster.json" --serve "$port" > "$tmp/cluster.txt"
+status=$?
+kill $(jobs -p) 2> /dev/null
+wait 2> /dev/null
+[ $status -eq 0 ] || exit 1
+
+if [ $(grep -c "connected:" "$tmp/cluster.txt") -ne "$n" ]
+then
+   echo "FAILED: the $n workers did not all connect, see $tmp"
+   exit 1
+fi
+if diff <(frontier "$tmp/local.txt") <(frontier "$tmp/cluster.txt")
+then
+   echo "OK: same results on this host and on the workers."
+   rm -rf "$tmp"
+else
+   echo "FAILED: different results, see $tmp"
+   exit 1
+fi
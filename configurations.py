@@ -91,39 +91,21 @@ class configuration:
 
    @classmethod
    def from_list(cls, lst):
-      crypto_list = []; mode_list   = []; reopen = False
-      smode_list  = []; utoken_list = []; switch = False
-      leak_list   = []
-      for e in lst:
-         match e:
-            case Crypto.RSA | Crypto.ECC:
-               crypto_list += [e]
-            case Mode.CNone | Mode.Sign | Mode.Encrypt:
-               mode_list += [e]
-            case Option.Reopen:
-               reopen = True
-            case Smode.SNoAA | Smode.AAuth:
-               smode_list += [e]
-            case Utoken.Anonymous | Utoken.Password | Utoken.Certificate:
-               utoken_list += [e]
-            case Option.Switch:
-               switch = True
-            case Leak.Channel | Leak.Long_term:
-               leak_list += [e]
-      if crypto_list == [] or\
-         mode_list   == [] or\
-         smode_list  == [] or\
-         utoken_list == []:
+      return cls.from_bits(bitconf.from_list(lst).bits)
+
+   @classmethod
+   def from_bits(cls, bits):
+      if not is_valid(bits):
          raise ConfigurationError
+      elements = elements_of(bits)
       return cls(
-         frozenset(crypto_list),
-         frozenset(mode_list),
-         reopen,
-         frozenset(smode_list),
-         frozenset(utoken_list),
-         switch,
-         frozenset(leak_list))
-
+         frozenset([ e for e in elements if isinstance(e, Crypto) ]),
+         frozenset([ e for e in elements if isinstance(e, Mode)   ]),
+         (bits & REOPEN_BIT) != 0,
+         frozenset([ e for e in elements if isinstance(e, Smode)  ]),
+         frozenset([ e for e in elements if isinstance(e, Utoken) ]),
+         (bits & SWITCH_BIT) != 0,
+         frozenset([ e for e in elements if isinstance(e, Leak)   ]))
 
    def __str__(self):
       line = ""
@@ -185,61 +167,188 @@ class configuration:
        
 
 # Convert a configuration to an ordered list of Elements
-# note we could make a class of element list...
 def elem_list_from(c):
-   l  = [Crypto.RSA]         if Crypto.RSA         in c.crypto else []
-   l += [Crypto.ECC]         if Crypto.ECC         in c.crypto else []
-   l += [Mode.CNone]         if Mode.CNone         in c.chmode else []
-   l += [Mode.Sign]          if Mode.Sign          in c.chmode else []
-   l += [Mode.Encrypt]       if Mode.Encrypt       in c.chmode else []
-   l += [Option.Reopen]      if                       c.reopen else []
-   l += [Smode.SNoAA]        if Smode.SNoAA        in c.semode else []
-   l += [Smode.AAuth]        if Smode.AAuth        in c.semode else []
-   l += [Utoken.Anonymous]   if Utoken.Anonymous   in c.utoken else []
-   l += [Utoken.Password]    if Utoken.Password    in c.utoken else []
-   l += [Utoken.Certificate] if Utoken.Certificate in c.utoken else []
-   l += [Option.Switch]      if                       c.switch else []
-   l += [Leak.Channel]       if Leak.Channel       in c.leaks  else []
-   l += [Leak.Long_term]     if Leak.Long_term     in c.leaks  else []
-   return l
-
-def elem_list_insert(l, e):
-   i = 0
-   while i < len(l):
-      if l[i] == e:
-         return l
-      elif order[l[i]] > order[e]:
-         return l[:i] + [e] + l[i:]
-      i += 1
-   return l + [e]
+   return list(bitconf.from_configuration(c).elements)
 
 def elem_list(s):
-   l = []
-   for e in s.replace(' ', '').split(','):
-      l += [Crypto.RSA]         if e == Crypto.RSA         else []
-      l += [Crypto.ECC]         if e == Crypto.ECC         else []
-      l += [Mode.CNone]         if e == Mode.CNone         else []
-      l += [Mode.Sign]          if e == Mode.Sign          else []
-      l += [Mode.Encrypt]       if e == Mode.Encrypt       else []
-      l += [Option.Reopen]      if e == Option.Reopen      else []
-      l += [Smode.SNoAA]        if e == Smode.SNoAA        else []
-      l += [Smode.AAuth]        if e == Smode.AAuth        else []
-      l += [Utoken.Anonymous]   if e == Utoken.Anonymous   else []
-      l += [Utoken.Password]    if e == Utoken.Password    else []
-      l += [Utoken.Certificate] if e == Utoken.Certificate else []
-      l += [Option.Switch]      if e == Option.Switch      else []
-      l += [Leak.channel]       if e == Leak.Channel       else []
-      l += [Leak.long_term]     if e == Leak.Long_term     else []
-   return l
-
-def str_of_elem_list(l):
-   line = ""
-   separator = ''
-   for element in l:
-      line += separator + str(element)
-      if separator == '':
-         separator = ', '
-   return line
+   return list(bitconf.from_list(s.replace(' ', '').split(',')).elements)
+
+
+# Bitmask encoding of configurations.
+# Each element of `order` is one bit of an integer, so that a configuration is an integer
+# of at most 14 bits, and the lattice operations are bit operations:
+#  a <= b  <=>  a & ~b == 0
+#  sup(a, b) =  a | b
+# bitconf objects are interned: there is at most one object per bitmask, that caches
+# its ordered list of elements and its string.
+
+ELEMENTS = sorted(order, key = lambda e: order[e])
+BIT      = { e: 1 << i for e, i in order.items() }
+ALL_BITS = (1 << len(ELEMENTS)) - 1
+# the bits strictly above a given element
+HIGHER   = { e: ALL_BITS & ~((BIT[e] << 1) - 1) for e in ELEMENTS }
+
+CRYPTO_BITS = BIT[Crypto.RSA]       | BIT[Crypto.ECC]
+MODE_BITS   = BIT[Mode.CNone]       | BIT[Mode.Sign]          | BIT[Mode.Encrypt]
+SMODE_BITS  = BIT[Smode.SNoAA]      | BIT[Smode.AAuth]
+UTOKEN_BITS = BIT[Utoken.Anonymous] | BIT[Utoken.Password]    | BIT[Utoken.Certificate]
+LEAK_BITS   = BIT[Leak.Channel]     | BIT[Leak.Long_term]
+REOPEN_BIT  = BIT[Option.Reopen]
+SWITCH_BIT  = BIT[Option.Switch]
+
+class ConfigurationError(Exception):
+   pass
+
+def elements_of(bits):
+   return tuple(e for e in ELEMENTS if bits & BIT[e])
+
+def is_valid(bits):
+   # a configuration needs at least one crypto, one mode, one session security mode and one user token.
+   return (bits & CRYPTO_BITS) != 0 and (bits & MODE_BITS)   != 0 and \
+          (bits & SMODE_BITS)  != 0 and (bits & UTOKEN_BITS) != 0
+
+# string of every subset of a dimension, as str_of_set would print it.
+def str_table(dimension):
+   table = {}
+   elements = [e for e in ELEMENTS if BIT[e] & dimension]
+   for r in range(len(elements) + 1):
+      for subset in combinations(elements, r):
+         table[sum(BIT[e] for e in subset)] = str_of_set(subset)
+   return table
+
+CRYPTO_STR = str_table(CRYPTO_BITS)
+MODE_STR   = str_table(MODE_BITS)
+SMODE_STR  = str_table(SMODE_BITS)
+UTOKEN_STR = str_table(UTOKEN_BITS)
+LEAK_STR   = str_table(LEAK_BITS)
+LEAK_STR[0] = Leak.No_leaks
+
+# element of each name of the string syntax, "no_xxx" and "SNone" have no bit.
+ELEMENT_OF_STR = { str(e): e for e in ELEMENTS }
+NO_ELEMENT     = ["no_reopen", "no_switch", Leak.No_leaks, Smode.SNone]
+
+class bitconf:
+   __slots__ = ('bits', 'elements', 'string')
+   interned  = {}
+
+   def __new__(cls, bits):
+      c = cls.interned.get(bits)
+      if c is None:
+         c = object.__new__(cls)
+         c.bits     = bits
+         c.elements = elements_of(bits)
+         c.string   = None
+         c = cls.interned.setdefault(bits, c)
+      return c
+
+   @classmethod
+   def from_list(cls, lst):
+      bits = 0
+      for name in lst:
+         e = ELEMENT_OF_STR.get(name)
+         if e != None:
+            bits |= BIT[e]
+         elif not name in NO_ELEMENT:
+            raise ValueError(repr(name) + " is not a valid element of a configuration")
+      return cls(bits)
+
+   @classmethod
+   def from_str(cls, line):
+      return cls.from_list(line.replace(' ', '').replace(',', '|').split('|'))
+
+   @classmethod
+   def from_configuration(cls, c):
+      bits  = sum(BIT[e] for e in c.crypto | c.chmode | c.semode | c.utoken | c.leaks)
+      bits |= REOPEN_BIT if c.reopen else 0
+      bits |= SWITCH_BIT if c.switch else 0
+      return cls(bits)
+
+   def configuration(self):
+      return configuration.from_list(self.elements)
+
+   def is_valid(self):
+      return is_valid(self.bits)
+
+   def __str__(self):
+      if self.string == None:
+         b = self.bits
+         self.string = CRYPTO_STR[b & CRYPTO_BITS] + ", " + MODE_STR[b & MODE_BITS] + ", " +\
+                       ("reopen, " if b & REOPEN_BIT else "no_reopen, ") +\
+                       SMODE_STR[b & SMODE_BITS] + ", " + UTOKEN_STR[b & UTOKEN_BITS] + ", " +\
+                       ("switch, " if b & SWITCH_BIT else "no_switch, ") +\
+                       LEAK_STR[b & LEAK_BITS]
+      return self.string
+
+   def __repr__(self):
+      return "bitconf(" + str(self) + ")"
+
+   def __hash__(self):
+      return self.bits
+
+   def __eq__(self, other):
+      return isinstance(other, bitconf) and self.bits == other.bits
+
+   def __len__(self):
+      return self.bits.bit_count()
+
+   def __contains__(self, element):
+      return (self.bits & BIT[element]) != 0
+
+   def __or__(self, other):
+      return bitconf(self.bits | other.bits)
+
+   def __and__(self, other):
+      return bitconf(self.bits & other.bits)
+
+   def __le__(self, other):
+      return (self.bits & ~other.bits) == 0
+
+   def __ge__(self, other):
+      return (other.bits & ~self.bits) == 0
+
+   def __lt__(self, other):
+      return self.bits != other.bits and (self.bits & ~other.bits) == 0
+
+   def __gt__(self, other):
+      return self.bits != other.bits and (other.bits & ~self.bits) == 0
+
+   def compare(self, other):
+      # same convention as configuration.compare
+      if (self.bits & ~other.bits) == 0:
+         return -1
+      elif (other.bits & ~self.bits) == 0:
+         return +1
+      else:
+         return 0
+
+   def add(self, element):
+      return bitconf(self.bits | BIT[element])
+
+   def remove(self, element):
+      return bitconf(self.bits & ~BIT[element])
+
+
+# All the configurations below a maximal configuration, as bitmasks, in the order of
+# the nested loops of Trie.from_conf. This order defines the order of the children
+# of the nodes of the Trie, and so the order of Trie.first().
+def power_set(sup):
+   def power_set_list(dimension):
+      # non empty subsets of the bits of a dimension, biggest first
+      elements = [BIT[e] for e in ELEMENTS if sup.bits & dimension & BIT[e]]
+      return [sum(c) for r in reversed(range(1, len(elements)+1)) for c in combinations(elements, r)]
+   def boolean_list(bit):
+      if sup.bits & bit:
+         return [0, bit]
+      else:
+         return [0]
+   for crypto in power_set_list(CRYPTO_BITS):
+      for chmode in power_set_list(MODE_BITS):
+         for reopen in boolean_list(REOPEN_BIT):
+            for semode in power_set_list(SMODE_BITS):
+               for utoken in power_set_list(UTOKEN_BITS):
+                  for switch in boolean_list(SWITCH_BIT):
+                     for leaks in (power_set_list(LEAK_BITS) + [0]):
+                        yield crypto | chmode | reopen | semode | utoken | switch | leaks
 
 
 # half-lattice of configurations
@@ -262,6 +371,7 @@ class Result(Enum):
    ERROR   = 5  # Proverif error
    UNKNOWN = 6  # remained to be tested
    PENDING = 7  # is currently tested
+   CANCELLED = 8  # the test was stopped, its result is no more needed
 
 # Trie structure
 
@@ -297,7 +407,105 @@ class TrieNode:
             r = False
       return r
 
-class Trie(object):
+# Operations common to all the lattice engines (Trie, lattice.DenseTrie).
+# An engine provides find, reserve, mark, result_of, delete_inf, delete_sup, unmark_inf, unmark_sup,
+# first, is_void and configurations, and keeps its maximal configuration in self.max.
+
+class Lattice(object):
+
+   # number of undecided configurations below conf, conf included (above it if up)
+   def count_undecided(self, conf, up = False):
+      free = (self.max.bits & ~conf.bits) if up else conf.bits
+      n = 0
+      s = free
+      while True:
+         bits = (conf.bits | s) if up else s
+         if is_valid(bits) and self.find(bitconf(bits)):
+            n += 1
+         if s == 0:
+            return n
+         s = (s - 1) & free
+
+   # find a "nearest" configuration in the lattice.
+   def mutate_up(self, conf):
+      debug("Mutate Up : " + str(conf))
+      elements  = [Mode.Encrypt, Mode.Sign, Mode.CNone,
+                   Utoken.Certificate, Utoken.Password, Utoken.Anonymous,
+                   Smode.AAuth, Smode.SNoAA]
+      elements += [Option.Reopen] if Option.Reopen in self.max else []
+      elements += [Option.Switch] if Option.Switch in self.max else []
+      # this will almost certainly result in a need to downgrade the configuration.
+      # shouldn't we try it before arriving with such a complete configuration ?
+      elements += [Leak.Long_term]
+      for e in elements:
+         if not e in conf:
+            result = conf.add(e)
+            if self.find(result):
+               return result
+
+      if Crypto.RSA in conf:
+         if not Crypto.ECC in conf:
+            result = conf.remove(Crypto.RSA).add(Crypto.ECC)
+            if self.find(result):
+               return result
+      else:
+         if Crypto.ECC in conf:
+            result = conf.add(Crypto.RSA)
+            if self.find(result):
+               return result
+
+      return None
+
+   def mutate_down(self, conf):
+     # Downgrade is brutal since it will very often be called after the setting of a strong option.
+     # the goal it to try to find a small configuration from which to restart the growing up.
+
+      def has(*elements):
+         return all(e in conf for e in elements)
+
+      debug("mutate down : " + str(conf))
+
+      if Option.Switch in self.max:
+         if has(Smode.SNoAA, Smode.AAuth):
+            conf = conf.remove(Smode.AAuth)
+            if self.find(conf):
+               return conf
+         if has(Utoken.Anonymous, Utoken.Password) or \
+            has(Utoken.Password,  Utoken.Certificate):
+            conf = conf.remove(Utoken.Password)
+            if self.find(conf):
+               return conf
+         if has(Utoken.Anonymous, Utoken.Certificate):
+            conf = conf.remove(Utoken.Certificate)
+            if self.find(conf):
+               return conf
+         if Option.Switch in conf:
+            conf = conf.remove(Option.Switch)
+            if self.find(conf):
+               return conf
+
+      if Option.Reopen in self.max:
+         if has(Crypto.RSA, Crypto.ECC):
+            conf = conf.remove(Crypto.ECC)
+            if self.find(conf):
+               return conf
+         if has(Mode.CNone, Mode.Encrypt) or \
+            has(Mode.CNone, Mode.Sign):
+            conf = conf.remove(Mode.CNone)
+            if self.find(conf):
+               return conf
+         if has(Mode.Sign, Mode.Encrypt):
+            conf = conf.remove(Mode.Sign)
+            if self.find(conf):
+               return conf
+         if Option.Reopen in conf:
+            conf = conf.remove(Option.Reopen)
+            if self.find(conf):
+               return conf
+
+      return None
+
+class Trie(Lattice):
 
    def __init__(self, sup):
       self.root = TrieNode(None)
@@ -312,7 +520,7 @@ class Trie(object):
    # insert a configuration
    def insert(self, conf):
       def find_or_add(n, l):
-         if l == []:
+         if l == ():
             n.result = Result.UNKNOWN
          else:
             for child in n.children:
@@ -325,28 +533,16 @@ class Trie(object):
                child.parent = n
                n.children  += [child]
                find_or_add(child, l[1:])
-      find_or_add(self.root, elem_list_from(conf))
+      find_or_add(self.root, conf.elements)
 
 
    @classmethod
    def from_conf(cls, sup):
+      if isinstance(sup, configuration):
+         sup = bitconf.from_configuration(sup)
       t = Trie(sup)
-      def power_set_list(s):
-         return list(chain.from_iterable(combinations(s,r) for r in reversed(range(1,len(s)+1))))
-      def boolean_list(b):
-         if b:
-            return [False, True]
-         else:
-            return [False]
-      for crypto in power_set_list(sup.crypto):
-         for chmode in power_set_list(sup.chmode):
-            for reopen in boolean_list(sup.reopen):
-               for semode in power_set_list(sup.semode):
-                  for utoken in power_set_list(sup.utoken):
-                     for switch in boolean_list(sup.switch):
-                        for leaks in (power_set_list(sup.leaks) + [set()]):
-                           c = configuration(set(crypto), set(chmode), reopen, set(semode), set(utoken), switch, set(leaks))
-                           t.insert(c)
+      for bits in power_set(sup):
+         t.insert(bitconf(bits))
       return t
 
    # First valid configuration in the Trie. When we parallelize we want to avoid
@@ -354,340 +550,205 @@ class Trie(object):
    # so we better stop searching down the Trie when we encounter a pending configuration.
    def first(self):
 
-      def rec_parallel_first(n, l):
+      def rec_parallel_first(n, bits):
          if n.is_valid_conf():
-            return l
+            return bits
          else:
             for c in n.children:
                if c.valid and not c.is_pending():
-                  r = rec_first(c, l + [c.element])
-                  if r != []:
+                  r = rec_first(c, bits | BIT[c.element])
+                  if r != None:
                      return r
-            return []
+            return None
 
-      def rec_first(n, l):
+      def rec_first(n, bits):
          if n.is_valid_conf():
-            return l
+            return bits
          else:
             for c in n.children:
                if c.valid:
-                  r = rec_first(c, l + [c.element])
-                  if r != []:
+                  r = rec_first(c, bits | BIT[c.element])
+                  if r != None:
                      return r
-            return []
+            return None
+
+      r = rec_parallel_first(self.root, 0)
+      if r == None:
+         r = rec_first(self.root, 0)
+      if r == None:
+         return None
+      return bitconf(r)
+
+   # The next n valid configurations, in the order of the Trie (without reserving them).
+   def upcoming(self, n):
+      r = []
+      def rec(node, bits):
+         if len(r) >= n:
+            return
+         if node.is_valid_conf():
+            r.append(bitconf(bits))
+         for c in node.children:
+            if c.valid:
+               rec(c, bits | BIT[c.element])
+      rec(self.root, 0)
+      return r
 
-      r = rec_parallel_first(self.root, [])
-      if r != []:
-         return r
-      else:
-         return rec_first(self.root, [])
+   # node of a configuration, if it is valid in the Trie
+   def node(self, conf):
+      n = self.root
+      for e in conf.elements:
+         for c in n.children:
+            if c.valid and c.element == e:
+               n = c
+               break
+         else:
+            return None
+      return n
 
    # check if a configuration is valid in the Trie
    def find(self, conf):
-      def rec_find(n, l):
-         if l==[]:
-            if n.is_valid_conf():
-               return True
-            else:
-               return False
-         for c in n.children:
-            if c.valid and c.element == l[0]:
-               return rec_find(c, l[1:])
-         else:
-            return False
-      return rec_find(self.root, conf)
+      n = self.node(conf)
+      return n != None and n.is_valid_conf()
+
+   # result of a configuration (None if it is no more in the Trie)
+   def result_of(self, conf):
+      n = self.node(conf)
+      return None if n == None else n.result
 
    # Reserve a valid configuration in the Trie to test it
    def reserve(self, conf):
-      def rec_find(n, l):
-         if l==[]:
-            if n.is_valid_conf():
-               n.result = Result.PENDING
-               return True
-            else:
-               return False
-         for c in n.children:
-            if c.valid and c.element == l[0]:
-               return rec_find(c, l[1:])
-         else:
-            return False
-      return rec_find(self.root, conf)
+      n = self.node(conf)
+      if n != None and n.is_valid_conf():
+         n.result = Result.PENDING
+         return True
+      return False
+
+   # Give back a reserved configuration that was not decided, so that it can be tested again.
+   def release(self, conf):
+      n = self.node(conf)
+      if n != None and n.is_pending():
+         n.result = Result.UNKNOWN
 
    # Mark only one configuration with the result of a run, but not as MIN or MAX.
    # Note carefully that it is possible that the configuration is no more PENDING
-   # because of race conditions with other threads, that have already propagated
-   # their results.
+   # because the results of other runs, that ended while it was tested, have
+   # already been propagated.
    def mark(self, conf, result, duration):
-      found = False
-
-      def rec_mark(n, l):
-         # search exactly the given list.
-         global found
-         debug("rec_mark(n, " + str(l) +")")
-         if l==[]:
-            if n.result == Result.UNKNOWN or n.result == Result.PENDING:
-               n.result = result
-               n.time = duration
-               if n.children == []:
-                  debug("found a final configuration node! (" + str(n.element) + ")")
-                  found = True
-                  return
-               else:
-                  debug("found an intermediary configuration node! (" + str(n.element) +")")
-                  found = True
-                  return
-            elif n.result == Result.TRUE and result == Result.FALSE:
-               print("'Mark' found "+str_of_elem_list(conf)+": TRUE but it is FALSE!")
-               raise
-            elif n.result == Result.FALSE and result == Result.TRUE:
-               print("'Mark' found "+str_of_elem_list(conf)+": FALSE but it is TRUE!")
-               raise
-            elif n.result != result:
-               print("'Mark' found "+str_of_elem_list(conf)+": "+str(n.result) +" but it is "+str(result)+"!")
-               n.result = result
-               n.time = duration
-               found = True
-         else:
-            for c in n.children:
-               if c.valid and c.element == l[0]:
-                  rec_mark(c, l[1:])
-                  break
-            if not found:
-               print("'Mark' couldn't find the configuration: "+ str_of_elem_list(conf))
-            return
-      _ = rec_mark(self.root, conf)
+      debug("mark(" + str(conf) + ")")
+      n = self.node(conf)
+      if n == None:
+         print("'Mark' couldn't find the configuration: " + str(conf))
+      elif n.result == Result.UNKNOWN or n.result == Result.PENDING:
+         n.result = result
+         n.time = duration
+      elif n.result == Result.TRUE and result == Result.FALSE:
+         print("'Mark' found " + str(conf) + ": TRUE but it is FALSE!")
+         raise
+      elif n.result == Result.FALSE and result == Result.TRUE:
+         print("'Mark' found " + str(conf) + ": FALSE but it is TRUE!")
+         raise
+      elif n.result != result:
+         print("'Mark' found " + str(conf) + ": " + str(n.result) + " but it is " + str(result) + "!")
+         n.result = result
+         n.time = duration
 
 
    # delete all valid configurations inferior or equal to the given one so that one can't select them
    # for a new computation run.
    def delete_inf(self, conf, result):
-      debug("Delete all configurations inferior or equal to: "+ str_of_elem_list(conf))
+      debug("Delete all configurations inferior or equal to: " + str(conf))
 
-      def del_inf(n, l):
-         # search for a a subtree that fits in the given list.
+      def del_inf(n, bits):
+         # search for a a subtree that fits in the given bits.
          # return true if the subtree must be cut, false otherwise.
-         debug("del_inf(n, " + str(l))
          if n.result == Result.UNKNOWN or n.result == Result.PENDING:
             n.result = result
             if n.children == []:
-               debug("Found a final configuration node! (" + str(n.element) + ")")
                return True
-            else:
-               debug("Found an intermediary configuration node! (" + str(n.element) +")")
          for c in n.children:
-            if not c.valid:
-               continue
-            for p in range(len(l)):
-               if c.element == l[p]:
-                  if del_inf(c, l[p+1:]):
-                     debug("Delete a node (" + str(c.element) + ")")
-                     c.valid = False
-                  break
+            if c.valid and bits & BIT[c.element]:
+               if del_inf(c, bits & HIGHER[c.element]):
+                  c.valid = False
          return n.is_orphan()
 
-      _ = del_inf(self.root, conf)
+      _ = del_inf(self.root, conf.bits)
 
 
    # unmark max flag for all configurations strictly inferior to the given one (supposed TRUE)
    def unmark_inf(self, conf):
-      def rec_unmark_inf(n, l, equal):
-         # search for a a subtree that fits in the given list.
-         debug("rec_unmark_inf(n, " + str(l))
+      def rec_unmark_inf(n, bits, equal):
+         # search for a a subtree that fits in the given bits.
          if n.result != None:
-            if not (equal and l == []):
+            if not (equal and bits == 0):
                n.max = False
                if n.children == []:
-                  debug("Unmark a final configuration node! (" + str(n.element) + ")")
                   return
-               else:
-                  debug("Unmark an intermediary configuration node! (" + str(n.element) +")")
+         lowest = bits & -bits
          for c in n.children:
-            for p in range(len(l)):
-               if c.element == l[p]:
-                  rec_unmark_inf(c, l[p+1:], equal and p == 0)
-                  break
-      _ = rec_unmark_inf(self.root, conf, True)
+            b = BIT[c.element]
+            if bits & b:
+               rec_unmark_inf(c, bits & HIGHER[c.element], equal and b == lowest)
+      _ = rec_unmark_inf(self.root, conf.bits, True)
 
 
     # delete all valid configurations superior or equal to the given one and propagate the result.
    def delete_sup(self, conf, result):
-      debug("Delete all configurations superior or equal to: "+ str_of_elem_list(conf))
+      debug("Delete all configurations superior or equal to: " + str(conf))
 
-      def del_sup(n, l):
-         # search for a a subtree that includes the given list.
+      def del_sup(n, bits):
+         # search for a a subtree that includes the given bits.
          # return True if the subtree must be cut, False otherwise.
-         debug("del_sup(n, " + str(l) +")")
-         if l==[] and (n.result == Result.UNKNOWN or n.result == Result.PENDING):
+         if bits == 0 and (n.result == Result.UNKNOWN or n.result == Result.PENDING):
             n.result = result
             if n.children == []:
-               debug("Found a final configuration node! (" + str(n.element) + ")")
                return True
-            else:
-               debug("Found an intermediary configuration node! (" + str(n.element) +")")
+         lowest = bits & -bits
          for c in n.children:
             if not c.valid:
                continue
-            if l == [] or c.element == l[0]:
-               if del_sup(c, l[1:]):
-                  debug("Delete a node (" + str(c.element) + ")")
+            b = BIT[c.element]
+            if bits == 0 or b == lowest:
+               if del_sup(c, bits & ~b):
                   c.valid = False
-            elif order[c.element] < order[l[0]]:
-               if del_sup(c, l):
-                  debug("Delete a node (" + str(c.element) + ")")
+            elif b < lowest:
+               if del_sup(c, bits):
                   c.valid = False
          return n.is_orphan()
 
-      _ = del_sup(self.root, conf)
+      _ = del_sup(self.root, conf.bits)
 
    # Unmark min flag for all configurations strictly superior to the given one.
    def unmark_sup(self, conf):
-      def rec_unmark_sup(n, l, equal):
-         # search for a a subtree that includes the given list.
-         debug("rec_unmark_sup(n, " + str(l) +")")
-         if l==[] and n.result != None:
+      def rec_unmark_sup(n, bits, equal):
+         # search for a a subtree that includes the given bits.
+         if bits == 0 and n.result != None:
             if not equal:
                n.min = False
             if n.children == []:
-               debug("Unmark a final configuration node! (" + str(n.element) + ")")
                return
-            else:
-               debug("Unmark an intermediary configuration node! (" + str(n.element) +")")
+         lowest = bits & -bits
          for c in n.children:
-            if equal and l != [] and c.element == l[0]:
-               rec_unmark_sup(c, l[1:], True)
-            elif l == [] or c.element == l[0]:
-               rec_unmark_sup(c, l[1:], False)
-            elif order[c.element] < order[l[0]]:
-               rec_unmark_sup(c, l, False)
-      _ = rec_unmark_sup(self.root, conf, True)
-
-
-   # find a "nearest" configuration in the trie.
-   def mutate_up(self, lst):
-      debug("Mutate Up : " + str(lst))
-      if not Mode.Encrypt in lst:
-         result = elem_list_insert(lst, Mode.Encrypt)
-         if self.find(result):
-            return result
-      if not Mode.Sign in lst:
-         result = elem_list_insert(lst, Mode.Sign)
-         if self.find(result):
-            return result
-      if not Mode.CNone in lst:
-         result = elem_list_insert(lst, Mode.CNone)
-         if self.find(result):
-            return result
-
-      if not Utoken.Certificate in lst:
-         result = elem_list_insert(lst, Utoken.Certificate)
-         if self.find(result):
-            return result
-      if not Utoken.Password in lst:
-         result = elem_list_insert(lst, Utoken.Password)
-         if self.find(result):
-            return result
-      if not Utoken.Certificate in lst:
-         result = elem_list_insert(lst, Utoken.Anonymous)
-         if self.find(result):
-            return result
-      if not Smode.AAuth in lst:
-         result = elem_list_insert(lst, Smode.AAuth)
-         if self.find(result):
-            return result
-      if not Smode.SNoAA in lst:
-         result = elem_list_insert(lst, Smode.SNoAA)
-         if self.find(result):
-            return result
-
-      if self.max.reopen:
-         if not Option.Reopen in lst:
-            result = elem_list_insert(lst, Option.Reopen)
-            if self.find(result):
-               return result
-
-      if self.max.switch:
-         if not Option.Switch in lst:
-            result = elem_list_insert(lst, Option.Switch)
-            if self.find(result):
-               return result
-
-      if not Leak.Long_term in lst:
-         # this will almost certainly result in a need to downgrade the configuration.
-         # shouldn't we try it before arriving with such a complete configuration ?
-         result = elem_list_insert(lst, Leak.Long_term)
-         if self.find(result):
-            return result
-
-      if Crypto.RSA in lst:
-         if not Crypto.ECC in lst:
-            result = [Crypto.ECC] + lst[1:]
-            if self.find(result):
-               return result
-      else:
-         if Crypto.ECC in lst:
-            result = [Crypto.RSA] + lst
-            if self.find(result):
-               return result
-
-      return None
-
-   def mutate_down(self, lst):
-     # Downgrade is brutal since it will very often be called after the setting of a strong option.
-     # the goal it to try to find a small configuration from which to restart the growing up.
-
-      def is_sublist(l, lst):
-         i = 0
-         for e in l:
-            while i < len(lst):
-                if lst[i] == e:
-                   break
-                else:
-                   i += 1
-            else:
-               return False
-         return True
+            b = BIT[c.element]
+            if equal and bits != 0 and b == lowest:
+               rec_unmark_sup(c, bits & ~b, True)
+            elif bits == 0 or b == lowest:
+               rec_unmark_sup(c, bits & ~b, False)
+            elif b < lowest:
+               rec_unmark_sup(c, bits, False)
+      _ = rec_unmark_sup(self.root, conf.bits, True)
+
+   # All the configurations of the Trie that have a result, in depth first order:
+   # (configuration, result, time, min, max)
+   def configurations(self):
+      def rec_configurations(n, bits):
+         bits |= BIT[n.element]
+         if n.result != None:
+            yield bitconf(bits), n.result, n.time, n.min, n.max
+         for c in n.children:
+            yield from rec_configurations(c, bits)
+      for c in self.root.children:
+         yield from rec_configurations(c, 0)
 
-      debug("mutate down : " + str(lst))
-
-      if self.max.switch:
-         if is_sublist([Smode.SNoAA, Smode.AAuth], lst):
-            lst.remove(Smode.AAuth)
-            if self.find(lst):
-               return lst
-         if is_sublist([Utoken.Anonymous, Utoken.Password],    lst) or \
-            is_sublist([Utoken.Password,  Utoken.Certificate], lst):
-            lst.remove(Utoken.Password)
-            if self.find(lst):
-               return lst
-         if is_sublist([Utoken.Anonymous, Utoken.Certificate], lst):
-            lst.remove(Utoken.Certificate)
-            if self.find(lst):
-               return lst
-         if Option.Switch in lst:
-            lst.remove(Option.Switch)
-            if self.find(lst):
-               return lst
-
-      if self.max.reopen:
-         if is_sublist([Crypto.RSA, Crypto.ECC], lst):
-            lst = [Crypto.RSA] + lst[2:]
-            if self.find(lst):
-               return lst
-         if is_sublist([Mode.CNone, Mode.Encrypt], lst) or \
-            is_sublist([Mode.CNone, Mode.Sign   ], lst):
-            lst.remove(Mode.CNone)
-            if self.find(lst):
-               return lst
-         if is_sublist([Mode.Sign, Mode.Encrypt], lst):
-            lst.remove(Mode.Sign)
-            if self.find(lst):
-               return lst
-         if Option.Reopen in lst:
-            lst.remove(Option.Reopen)
-            if self.find(lst):
-               return lst
-
-      return None
 
 def format_time(d):
    D = datetime.min + d
@@ -727,31 +788,16 @@ def Print_Full_Trie(t):
       rec_full_trace(c, ">")
 
 def Print_Min_Trie(t):
-   def rec_min_trace(n, tr):
-      if (n.result == Result.TIMEOUT or n.result == Result.MEM_OUT) and n.min == True:
-         print(str(configuration.from_list(tr + [n.element])) + ": " + str(n.result)[7:] + " " + format_time(n.time))
-      for c in n.children:
-         rec_min_trace(c, tr + [n.element])
-      return
-   for c in t.root.children:
-      rec_min_trace(c, [])
+   for conf, result, time, min, max in t.configurations():
+      if (result == Result.TIMEOUT or result == Result.MEM_OUT) and min == True:
+         print(str(conf) + ": " + str(result)[7:] + " " + format_time(time))
 
 def Print_False_Trie(t):
-   def rec_min_trace(n, tr):
-      if (n.result == Result.FALSE or n.result == Result.CANNOT) and n.min == True:
-         print(str(configuration.from_list(tr + [n.element])) + ": " + str(n.result)[7:] + " " + format_time(n.time))
-      for c in n.children:
-         rec_min_trace(c, tr + [n.element])
-      return
-   for c in t.root.children:
-      rec_min_trace(c, [])
+   for conf, result, time, min, max in t.configurations():
+      if (result == Result.FALSE or result == Result.CANNOT) and min == True:
+         print(str(conf) + ": " + str(result)[7:] + " " + format_time(time))
 
 def Print_Max_Trie(t):
-   def rec_max_trace(n, tr):
-      if n.result == Result.TRUE and n.max == True:
-         print(str(configuration.from_list(tr + [n.element])) + ": " + str(n.result)[7:] + " " + format_time(n.time))
-      for c in n.children:
-         rec_max_trace(c, tr + [n.element])
-      return
-   for c in t.root.children:
-      rec_max_trace(c, [])
+   for conf, result, time, min, max in t.configurations():
+      if result == Result.TRUE and max == True:
+         print(str(conf) + ": " + str(result)[7:] + " " + format_time(time))
@@ -0,0 +1,74 @@
+# Dependency graph of the formal model of opcua-jinja.pv (see dependencies.txt).
+# A property is proven only when all the queries below it in the graph are proven: the queries
+# of a property are thus the nodes of the graph reachable from it. Properties share nodes
+# (e.g. 3.1.A and 3.1.C for 3.1 and 3.2): their results are kept once per configuration in the
+# cache of proof results (see cache.py), so each campaign reuses those of the others, and
+# reproduce_proofs.py proves the nodes of several properties once (see union and derive).
+
+from configurations import Result
+
+# query -> its sub-queries, as (query, crypto) if needed only when the configuration allows crypto
+DEPENDENCIES = {
+   "3.1":   ["3.1.A", "3.1.B", "3.1.C", "3.1.D", "3.1.E", "3.1.axioms", "3.1.axioms.1", "3.1.conf"],
+   "3.1.A": ["3.1.C", ("3.1.axioms", "ECC")],
+   "3.1.B": ["3.1.C", "3.1.axioms", "3.1.axioms.1", "3.1.conf"],
+   "3.1.C": [("3.1.axioms", "ECC")],
+   "3.1.D": ["3.1.axioms", "3.1.axioms.1", "3.1.conf"],
+   "3.1.E": ["3.1.C", "3.1.axioms", "3.1.axioms.1", "3.1.conf"],
+   "3.2":   ["3.2.A", "3.2.axioms", "3.1.A", "3.1.C"], # 3.1.A is necessary for reopen
+}
+
+# names of the properties in prove.py and reproduce_proofs.py
+PROPERTIES = {
+   "3.1.all":    "3.1",
+   "3.2.all":    "3.2",
+   "Agr-[S->C]": "3.1",
+   "Agr-[C->S]": "3.2",
+}
+
+def sub_queries(query, config):
+   subs = []
+   for s in DEPENDENCIES.get(query, []):
+      if isinstance(s, tuple):
+         s, crypto = s
+         if not crypto in str(config):
+            continue
+      subs += [s]
+   return subs
+
+# The queries to prove for the property in the (maximal) configuration, the property first,
+# then the others breadth first.
+def queries(property, config):
+   nodes = [PROPERTIES.get(property, property)]
+   i = 0
+   while i < len(nodes):
+      for s in sub_queries(nodes[i], config):
+         if not s in nodes:
+            nodes += [s]
+      i += 1
+   return nodes
+
+# Is the name a property with sub-queries?
+def composite(property):
+   return PROPERTIES.get(property, property) in DEPENDENCIES
+
+# Length of the longest path from the query to a leaf of the graph (0 for an axiom)
+def height(query):
+   subs = [s[0] if isinstance(s, tuple) else s for s in DEPENDENCIES.get(query, [])]
+   return 1 + max(map(height, subs)) if subs != [] else 0
+
+# The queries to prove for several properties in the configuration: each node of the union of
+# their graphs once, in the order of the properties.
+def union(properties, config):
+   nodes = []
+   for p in properties:
+      nodes += [q for q in queries(p, config) if not q in nodes]
+   return nodes
+
+# The result of the property from those of its queries (query -> Result): false as soon as one
+# of them is false, proven when all of them are, otherwise the first that is not proven.
+def derive(property, config, results):
+   rs = [results.get(q, Result.UNKNOWN) for q in queries(property, config)]
+   if Result.FALSE in rs:
+      return Result.FALSE
+   return next((r for r in rs if r != Result.TRUE), Result.TRUE)
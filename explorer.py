@@ -0,0 +1,594 @@
+# Coordinator of a lattice exploration campaign (see prove.py).
+# Only the coordinator, i.e. the thread that calls Explorer.run, reads or updates the lattice:
+# it reserves configurations, hands them out to the workers as jobs, and applies the results
+# that the workers report. The workers only run jobs and never touch the lattice, so that
+# no configuration can be tested twice and the min/max flags cannot be corrupted,
+# whatever the number of workers.
+
+from configurations import *
+from lazy import trie_key
+from strategy import Greedy
+
+from itertools import count
+from os import sysconf
+from queue import Queue
+from threading import Thread
+
+JOB_IDS = count()
+GiB     = 1024*1024*1024 # Bytes
+
+
+# Raised by test() when the whole campaign must stop, e.g. when ProVerif rejects the model:
+# Explorer.run stops the other tests and raises it again.
+class Abort(Exception):
+   pass
+
+
+class Job:
+   def __init__(self, conf, timeout, chain = False, expected = None, warning = ""):
+      self.id       = next(JOB_IDS)
+      self.conf     = conf
+      self.timeout  = timeout
+      # if the result is TRUE, continue with a mutation up of the configuration
+      self.chain    = chain
+      # print the warning if the result contradicts the expected one
+      self.expected = expected
+      self.warning  = warning
+      self.result    = None
+      self.duration  = None
+      self.cancelled = False
+      self.round     = 0 # of the escalation, see Explorer.escalate
+      # memory limit of the test in GiB, set by the scheduler (None: the default one)
+      self.limit     = None
+      self.peak      = None # peak memory of the test in bytes
+      self.speculative = False # see Explorer.speculation
+      self.attempts  = 1 # tests of the configuration that ended in an ERROR, plus this one
+      self.abort     = None # the Abort raised by its test
+
+   def unexpected(self):
+      if self.expected == Result.TRUE:
+         return self.result in [Result.FALSE, Result.CANNOT, Result.TIMEOUT, Result.MEM_OUT]
+      elif self.expected == Result.FALSE:
+         return self.result == Result.TRUE
+      return False
+
+
+# Memory available on the host, in bytes
+def available_memory():
+   try:
+      with open("/proc/meminfo", "r") as f:
+         for line in f:
+            if line.startswith("MemAvailable:"):
+               return int(line.split()[1]) * 1024
+   except OSError:
+      pass
+   return sysconf('SC_AVPHYS_PAGES') * sysconf('SC_PAGE_SIZE')
+
+# Admission of jobs against the memory of the host.
+# need(conf) predicts the peak resident memory of the test of a configuration, in bytes. A job is
+# admitted if the memory kept for the running jobs and for itself fits in the memory that was
+# available when the scheduler was created (or the given capacity): its prediction with a
+# margin, or the default limit (in GiB) for each of its `runs` ProVerif processes without
+# prediction.
+# The memory limit of a job is the default one, unless the limit is on the resident memory
+# (watchdog): then it is the memory kept for the job. A limit of the address space (RLIMIT_AS)
+# is reached well before the resident memory, and would give spurious MEM_OUT results.
+# A job that does not fit is held, and the memory it needs is kept aside for it: lighter jobs
+# may still run next to the running ones, but only in the rest of the memory.
+class Scheduler:
+   MARGIN    = 1.5
+   MIN_LIMIT = 1 # GiB
+
+   def __init__(self, need, default_limit, runs = 1, capacity = None, watchdog = False):
+      self.need_of  = need
+      self.default  = default_limit
+      self.runs     = runs
+      self.capacity = capacity if capacity != None else available_memory() * 9 // 10
+      self.watchdog = watchdog
+      self.reserved = {} # job id -> bytes
+
+   # memory kept for a process predicted to need m bytes (None if unknown), in GiB
+   def kept(self, m):
+      if m == None:
+         return self.default
+      return min(max(m * self.MARGIN / GiB, self.MIN_LIMIT), self.capacity / GiB)
+
+   # memory limit of a process predicted to need m bytes (None if unknown), in GiB
+   def limit_of(self, m):
+      return self.kept(m) if self.watchdog else self.default
+
+   # memory limit of a job, in GiB
+   def limit(self, job):
+      return self.limit_of(self.need_of(job.conf))
+
+   # memory kept for a job, in bytes
+   def need(self, job):
+      m = self.need_of(job.conf)
+      if m == None:
+         return int(self.default * self.runs * GiB)
+      return int(self.kept(m) * GiB)
+
+   # admit the job if it fits beside the running jobs and the memory kept aside
+   def admit(self, job, aside = 0):
+      n = self.need(job)
+      if self.reserved != {} and sum(self.reserved.values()) + aside + n > self.capacity:
+         return False
+      job.limit = self.limit(job)
+      self.reserved[job.id] = n
+      return True
+
+   def release(self, job):
+      self.reserved.pop(job.id, None)
+
+
+# Antichains of the frontiers of the exploration, kept like the min and max flags of the lattice
+# (see unmark_sup and unmark_inf): bits -> (result, duration) of its configurations, or None
+# when the lattice did not take the result (e.g. the configuration had been decided meanwhile).
+# A configuration enters the antichain unless one of it is strictly below it (above it if
+# maximal), and removes those strictly above it (below it).
+def add_minimal(antichain, conf, entry):
+   for b in antichain:
+      if (b & ~conf.bits) == 0 and b != conf.bits:
+         return
+   for b in [b for b in antichain if (conf.bits & ~b) == 0 and b != conf.bits]:
+      del antichain[b]
+   antichain[conf.bits] = entry
+
+def add_maximal(antichain, conf, entry):
+   for b in antichain:
+      if (conf.bits & ~b) == 0 and b != conf.bits:
+         return
+   for b in [b for b in antichain if (b & ~conf.bits) == 0 and b != conf.bits]:
+      del antichain[b]
+   antichain[conf.bits] = entry
+
+# The configurations of an antichain with one of the results, in the order of the lattice:
+# (configuration, result, duration)
+def frontier_of(antichain, results):
+   return [(bitconf(b), antichain[b][0], antichain[b][1])
+           for b in sorted(antichain, key = trie_key) if antichain[b] != None and antichain[b][0] in results]
+
+
+class Explorer:
+
+   # test(job) runs the prover on job.conf within job.timeout (and job.limit) and returns
+   # (result, duration), it is called by the workers.
+   # cancel(id), if given, stops the test of the job id, whose result is no more needed: then
+   # test returns Result.CANCELLED (or the result it found meanwhile).
+   # scheduler (a Scheduler), if given, admits the jobs according to the memory they need:
+   # then up to `processes` jobs run at the same time.
+   # prefetch(confs), if given, is told the configurations that will probably be tested next,
+   # e.g. to render their input files while the workers are busy.
+   # predictor (a predictor.Predictor), if given, picks the cheapest of the next configurations
+   # of the lattice, and gives a short timeout to those that will time out for sure (except in
+   # the final round): a TIMEOUT within a short timeout is tested again with the whole timeout.
+   # strategy (a strategy.Strategy) picks the configurations of the lattice to test, by default
+   # the greedy walk of the Trie.
+   CANDIDATES = 16
+   ATTEMPTS   = 3 # tests of a configuration before it is left with an ERROR
+   NEIGHBOURS = 8 # results that vote for the verdict of a configuration, without predictor
+
+   def __init__(self, lattice, test, processes = 1, timeout = 0, final = False, prefetch = None,
+                cancel = None, scheduler = None, predictor = None, strategy = None):
+      self.T         = lattice
+      self.test      = test
+      self.processes = processes
+      self.timeout   = timeout
+      # final run: we do not avoid configurations above one that has TIMED OUT
+      self.final     = final
+      self.jobs      = Queue() # coordinator -> workers
+      self.results   = Queue() # workers -> coordinator
+      self.queue     = []
+      self.use_first = False
+      self.prefetch  = prefetch
+      self.cancel    = cancel
+      self.running   = {} # jobs being tested: id -> job
+      self.scheduler = scheduler
+      self.predictor = predictor
+      self.strategy  = strategy or Greedy()
+      self.held      = [] # jobs waiting for memory
+      # configurations that get the same result (see opcua.classes): conf -> list
+      self.classes   = {}
+      # journal(job), if set, records the result of each job (see store.py)
+      self.journal   = None
+      # escalation (see escalate): the results that do not depend on the timeout, to carry
+      # them over to the lattice of the next round
+      self.rebuild   = None
+      self.maximum   = None
+      self.round     = 0
+      self.facts     = []
+      self.timeouts  = [] # TIMEOUT results of this round, for the snapshots
+      # frontiers of the lattice (see frontier())
+      self.minimal   = {} # configurations with a result that prunes up
+      self.maximal   = {} # TRUE configurations
+      self.errors    = [] # (configuration, duration) of the ERROR after ATTEMPTS tests (see errored())
+      # checkpoint(), if set, is called after each result, e.g. to save a snapshot (see state())
+      self.checkpoint = None
+      # speculate, if set, lets the strategy hand out only the configurations comparable to
+      # none being tested, the others are tested as speculative jobs (see speculation())
+      self.speculate = False
+      self.ready     = None # job waiting for a speculative one to be stopped (see make_room())
+
+   # Mark a configuration, and those of its class that are not decided meanwhile, with the
+   # result of a run and propagate it in the lattice.
+   def mark(self, conf, result, duration):
+      for c in self.classes.get(conf, [conf]):
+         if c != conf and not self.T.result_of(c) in [Result.UNKNOWN, Result.PENDING]:
+            continue
+         if result in [Result.TRUE, Result.FALSE, Result.CANNOT, Result.MEM_OUT]:
+            self.facts.append((c, result, duration))
+         self.mark_one(c, result, duration)
+
+   def mark_one(self, conf, result, duration):
+      T = self.T
+      if result == Result.TIMEOUT:
+         self.timeouts.append((conf, duration))
+      if result == Result.TRUE:
+         T.mark(conf, result, duration)
+         add_maximal(self.maximal, conf, self.entry(conf, result, duration))
+         T.delete_inf(conf, result)
+         T.unmark_inf(conf)
+      elif result == Result.FALSE or result == Result.CANNOT or result == Result.MEM_OUT or\
+          (result == Result.TIMEOUT and not self.final):
+         T.mark(conf, result, duration)
+         add_minimal(self.minimal, conf, self.entry(conf, result, duration))
+         T.delete_sup(conf, result)
+         T.unmark_sup(conf)
+      elif result == Result.TIMEOUT and self.final:
+         T.mark(conf, result, duration)
+         add_minimal(self.minimal, conf, self.entry(conf, result, duration))
+         T.unmark_sup(conf)
+      elif result == Result.ERROR:
+         # left reserved, so that it is no more handed out, unless another result decides it
+         self.errors.append((conf, duration))
+      self.preempt(conf, result)
+
+   # Probability that the configuration is TRUE: predicted from the history, or from the results
+   # of the nearest configurations tested in this run (1/2 if unknown).
+   def verdict(self, conf):
+      p = None if self.predictor == None else self.predictor.verdict(conf)
+      if p != None:
+         return p
+      def weight(c):
+         return 1 / (1 + (c.bits ^ conf.bits).bit_count())
+      near = sorted(self.facts, key = lambda f: (f[0].bits ^ conf.bits).bit_count())[:self.NEIGHBOURS]
+      if near == []:
+         return 0.5
+      return sum(weight(c) for c, r, d in near if r == Result.TRUE) / sum(weight(c) for c, r, d in near)
+
+   def entry(self, conf, result, duration):
+      return (result, duration) if self.T.result_of(conf) == result else None
+
+   # The frontiers of the exploration so far, in the order of the lattice, as lists of
+   # (configuration, result, duration): the minimal unproved configurations (TIMEOUT, MEM_OUT),
+   # the minimal FALSE (or CANNOT) ones and the maximal TRUE ones.
+   def frontier(self):
+      return frontier_of(self.minimal, [Result.TIMEOUT, Result.MEM_OUT]), \
+             frontier_of(self.minimal, [Result.FALSE, Result.CANNOT]), \
+             frontier_of(self.maximal, [Result.TRUE])
+
+   # The configurations left with an ERROR and not decided by another result, in the order of
+   # the lattice: (configuration, result, duration)
+   def errored(self):
+      return [(c, Result.ERROR, d) for c, d in sorted(self.errors, key = lambda e: trie_key(e[0].bits))
+              if self.T.result_of(c) == Result.PENDING]
+
+   def progress(self):
+      unproved, false, true = self.frontier()
+      return str(len(false)) + " minimal FALSE, " + str(len(unproved)) + " minimal unproved and " + \
+             str(len(true)) + " maximal TRUE configurations, " + str(len(self.running)) + " being tested" + \
+             ("" if self.errored() == [] else ", " + str(len(self.errored())) + " with errors")
+
+   # Stop the jobs whose configuration has just been decided by the result of conf.
+   def preempt(self, conf, result):
+      def decided(job):
+         return job.conf != conf and \
+            ((result == Result.TRUE and job.conf <= conf) or \
+             ((result in [Result.FALSE, Result.CANNOT, Result.MEM_OUT] or
+              (result == Result.TIMEOUT and not self.final)) and job.conf >= conf))
+      self.held = [job for job in self.held if not decided(job)]
+      if self.cancel == None:
+         return
+      for job in self.running.values():
+         if not job.cancelled and decided(job):
+            debug("Cancel " + str(job.conf) + ", decided by " + str(conf) + ": " + str(result))
+            job.cancelled = True
+            self.cancel(job.id)
+
+   # Reserve a configuration, and the rest of its class that is proved with it.
+   def reserve(self, conf):
+      if not self.T.reserve(conf):
+         return False
+      for c in self.classes.get(conf, []):
+         if c != conf:
+            self.T.reserve(c)
+      return True
+
+   # Give back a configuration that was not decided, and the rest of its class (except the
+   # configurations of the class that are tested on their own).
+   def release_conf(self, conf):
+      tested = [job.conf for job in self.running.values()]
+      for c in self.classes.get(conf, [conf]):
+         if c == conf or not c in tested:
+            self.T.release(c)
+
+   # Next job: the given jobs first, then the first configuration of the lattice.
+   def next_job(self):
+      while self.queue != []:
+         job = self.queue.pop(0)
+         if self.reserve(job.conf):
+            return job
+      if self.use_first and not self.T.is_void():
+         conf = self.strategy.next(self)
+         debug("Next configuration of the lattice: " + str(conf))
+         if conf != None and self.reserve(conf):
+            return Job(conf, self.budget(conf))
+      return None
+
+   # The cheapest of the next configurations of the lattice (the unknown ones last).
+   def cheapest(self):
+      confs = self.T.upcoming(self.CANDIDATES)
+      if confs == []:
+         return self.T.first()
+      def key(conf):
+         c = self.predictor.cost(conf)
+         return (c == None, c or 0)
+      return min(confs, key = key)
+
+   # timeout of a new job
+   def budget(self, conf):
+      if self.predictor == None or self.final:
+         return self.timeout
+      timeout = self.predictor.timeout(conf, self.timeout)
+      if timeout != self.timeout:
+         debug("Short timeout for " + str(conf) + ": " + str(timeout))
+      return timeout
+
+   # Next job that the scheduler admits: the held ones first. When the first held job does not
+   # fit, the memory it needs is kept aside for it, and other jobs are tried.
+   def admitted_job(self):
+      S = self.scheduler
+      if S == None:
+         return self.next_job()
+      aside = 0
+      if self.held != []:
+         if S.admit(self.held[0]):
+            return self.held.pop(0)
+         aside = S.need(self.held[0])
+      while len(self.held) < self.processes:
+         job = self.next_job()
+         if job == None:
+            return None
+         if S.admit(job, aside):
+            return job
+         debug("Hold " + str(job.conf) + " until " + str(S.need(job) // GiB) + " GiB are free")
+         self.held.append(job)
+      return None
+
+   # Is conf comparable to none of the configurations being tested, so that its result will
+   # be needed whatever theirs?
+   def independent(self, conf):
+      return not any(conf <= job.conf or job.conf <= conf for job in self.running.values())
+
+   # Probability that the result of conf is still needed when the configurations being tested
+   # are decided: those below it must be TRUE, and those above it must not.
+   def needed(self, conf):
+      p = 1
+      for job in self.running.values():
+         if job.conf <= conf:
+            p *= self.verdict(job.conf)
+         elif conf <= job.conf:
+            p *= 1 - self.verdict(job.conf)
+      return p
+
+   # Speculation, when a worker is idle and only configurations comparable to those being
+   # tested are left: the most probably needed one is tested, typically an up mutation of a
+   # configuration that will probably be TRUE (the greedy strategy tests it next). When a
+   # result makes it useless, preempt() stops the speculative job, and when an independent
+   # configuration is ready meanwhile, make_room() does. Otherwise its result counts like any
+   # other.
+   def speculation(self):
+      confs = [self.T.mutate_up(job.conf) for job in self.running.values()] + self.T.upcoming(self.CANDIDATES)
+      confs = [c for c in confs if c != None]
+      if confs == []:
+         return None
+      conf = max(confs, key = self.needed)
+      if not self.reserve(conf):
+         return None
+      job = Job(conf, self.budget(conf))
+      job.speculative = True
+      if self.scheduler != None and not self.scheduler.admit(job):
+         self.release_conf(conf)
+         return None
+      debug("Speculate " + str(conf) + " (needed with probability " + str(round(self.needed(conf), 2)) + ")")
+      return job
+
+   # When all the workers are busy, a job that is ready stops the last speculative job whose
+   # result is still uncertain to be needed.
+   def make_room(self):
+      speculative = [job for job in self.running.values()
+                     if job.speculative and not job.cancelled and not self.independent(job.conf)]
+      if speculative == [] or self.cancel == None:
+         return
+      self.ready = self.admitted_job()
+      if self.ready != None:
+         job = max(speculative, key = lambda job: job.id)
+         debug("Stop the speculative " + str(job.conf) + " for " + str(self.ready.conf))
+         job.cancelled = True
+         self.cancel(job.id)
+
+   # The next n configurations that next_job() would probably hand out.
+   def upcoming(self, n):
+      confs = [job.conf for job in self.held]
+      confs = (confs + [job.conf for job in self.queue if self.T.find(job.conf)])[:n]
+      if self.use_first and len(confs) < n:
+         confs += [c for c in self.T.upcoming(n) if not c in confs][:n - len(confs)]
+      return confs
+
+   def apply(self, job):
+      if job.result == Result.TIMEOUT and job.round == self.round and job.timeout < self.timeout:
+         # out of a short timeout: not a decision, tested again with the whole timeout
+         self.release_conf(job.conf)
+         self.queue.append(Job(job.conf, self.timeout, job.chain, job.expected, job.warning))
+         return
+      if self.journal != None:
+         self.journal(job)
+      if job.round < self.round and job.result == Result.TIMEOUT:
+         # out of time in a previous round: it is tested again in this one
+         self.release_conf(job.conf)
+         return
+      if job.result == Result.CANCELLED:
+         # stopped: either decided meanwhile, or a speculative job to be tested again later
+         self.release_conf(job.conf)
+         return
+      if job.result == Result.ERROR and job.attempts < self.ATTEMPTS:
+         # e.g. a crash of the prover or of the worker: tested again after the other jobs
+         self.release_conf(job.conf)
+         retry = Job(job.conf, job.timeout, job.chain, job.expected, job.warning)
+         retry.attempts = job.attempts + 1
+         self.queue.append(retry)
+         return
+      self.mark(job.conf, job.result, job.duration)
+      if job.unexpected():
+         print(job.warning)
+      conf = self.strategy.follow(self, job)
+      if conf != None:
+         self.queue.insert(0, Job(conf, self.budget(conf), chain = True))
+
+   def worker(self):
+      while True:
+         job = self.jobs.get()
+         if job == None:
+            return
+         try:
+            job.result, job.duration = self.test(job)
+         except Abort as e:
+            job.result, job.duration = Result.ERROR, timedelta(seconds=0)
+            job.abort = e
+         except Exception as e:
+            print("ERROR while testing " + str(job.conf) + ": " + str(e))
+            job.result, job.duration = Result.ERROR, timedelta(seconds=0)
+         self.results.put(job)
+
+   # Escalation, instead of running prove.py again and again with a larger timeout (prove.sh):
+   # after the given jobs and the configurations of the lattice, those that timed out are tested
+   # again with twice the timeout, until it exceeds `maximum`, then in a final round with twice
+   # more. rebuild() gives a new lattice for each round, where the decided results are carried
+   # over. A round starts as soon as the previous one has nothing left to hand out, while its
+   # last jobs run, so that the workers are not idle between the rounds.
+   def escalate(self, rebuild, maximum, jobs = []):
+      self.rebuild = rebuild
+      self.maximum = maximum
+      self.run(jobs, use_first = True)
+      self.rebuild = None
+
+   # Start the next round of the escalation, if the current one has nothing left to hand out.
+   def next_round(self):
+      if self.rebuild == None or self.final or self.timeout == 0 or \
+         self.queue != [] or self.held != [] or self.T.upcoming(1) != []:
+         return False
+      timeouts = [c for c, r, t in frontier_of(self.minimal, [Result.TIMEOUT])]
+      if timeouts == []:
+         return False
+      if self.timeout > self.maximum:
+         self.final = True
+      self.timeout *= 2
+      self.round += 1
+      print("-- round " + str(self.round) + ": " + str(len(timeouts)) + " minimal unproved configurations, with a timeout of " +
+            str(self.timeout) + " seconds" + (" (final)" if self.final else "") + ".")
+      self.T = self.rebuild()
+      self.timeouts = []
+      self.minimal  = {}
+      self.maximal  = {}
+      self.errors   = []
+      for conf, result, duration in self.facts:
+         if self.T.find(conf):
+            self.mark_one(conf, result, duration)
+      # the jobs of the previous round that still run keep their configuration
+      for job in self.running.values():
+         self.reserve(job.conf)
+      self.queue = [Job(conf, self.budget(conf), chain = True) for conf in timeouts]
+      return True
+
+   # The state of the exploration, to restart it after a crash: the results that were marked
+   # (those that do not depend on the timeout, and the TIMEOUT of this round) and the
+   # configurations being tested, that will be tested again.
+   def state(self):
+      return {
+         "timeout":  self.timeout,
+         "round":    self.round,
+         "final":    self.final,
+         "facts":    [[c.bits, r.name, d.total_seconds()] for c, r, d in self.facts],
+         "timeouts": [[c.bits, d.total_seconds()] for c, d in self.timeouts],
+         "pending":  [job.conf.bits for job in self.running.values()] + [job.conf.bits for job in self.held] }
+
+   def restore(self, state):
+      self.timeout = state["timeout"]
+      self.round   = state["round"]
+      self.final   = state["final"]
+      for bits, result, seconds in state["facts"]:
+         if self.T.find(bitconf(bits)):
+            self.mark(bitconf(bits), Result[result], timedelta(seconds=seconds))
+      for bits, seconds in state["timeouts"]:
+         if self.T.find(bitconf(bits)):
+            self.mark(bitconf(bits), Result.TIMEOUT, timedelta(seconds=seconds))
+
+   # Run the given jobs, then (if use_first) all the remaining configurations of the lattice,
+   # with at most self.processes jobs at the same time.
+   def run(self, jobs, use_first = False):
+      self.queue     = list(jobs)
+      self.use_first = use_first
+      workers = [Thread(target = self.worker) for i in range(self.processes)]
+      for w in workers:
+         w.start()
+      idle = self.processes
+      while True:
+         while idle > 0:
+            if self.ready != None:
+               job, self.ready = self.ready, None
+               if self.T.result_of(job.conf) != Result.PENDING:
+                  # decided while it waited
+                  if self.scheduler != None:
+                     self.scheduler.release(job)
+                  continue
+            else:
+               job = self.admitted_job()
+            if job == None and self.next_round():
+               continue
+            if job == None and self.speculate:
+               job = self.speculation()
+            if job == None:
+               break
+            job.round = self.round
+            self.running[job.id] = job
+            self.jobs.put(job)
+            idle -= 1
+         if idle == 0 and self.speculate and self.ready == None:
+            self.make_room()
+         if self.prefetch != None:
+            self.prefetch(self.upcoming(self.processes))
+         if idle == self.processes:
+            # nothing is running and nothing is left to be done.
+            break
+         job = self.results.get()
+         del self.running[job.id]
+         if job.abort != None:
+            if self.cancel != None:
+               for j in [job] + list(self.running.values()):
+                  self.cancel(j.id)
+            self.stop(workers)
+            raise job.abort
+         if self.scheduler != None:
+            self.scheduler.release(job)
+         idle += 1
+         self.apply(job)
+         if self.checkpoint != None:
+            self.checkpoint()
+      self.stop(workers)
+
+   # Stop the workers, once they have finished their jobs.
+   def stop(self, workers):
+      for w in workers:
+         self.jobs.put(None)
+      for w in workers:
+         w.join()
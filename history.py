@@ -0,0 +1,154 @@
+# History of the ProVerif runs, to predict the needs of the next ones.
+# Each run (see opcua.prove) appends a record to HISTORY_FILE: queries, configuration, result,
+# running time, peak memory, budget, settings of ProVerif and options of the model. The file is
+# kept across campaigns (e.g. the rounds of prove.sh), so that each round knows more than the
+# previous one. Only the runs of the same model (e.g. fixed, without the oracle) predict the
+# next ones: the others are kept in the file, but not used.
+#
+# The prediction for a query and a configuration relies on the lattice: adding options to a
+# configuration adds behaviours to the model, so ProVerif is expected to need at most as much
+# memory as for a larger configuration that it proved, and at least as much as for a smaller
+# one (even when it did not conclude).
+
+from configurations import bitconf, Result
+
+import json
+from os import path
+from threading import Lock
+
+HISTORY_FILE = ".proof_history.jsonl"
+COMPLETE     = [Result.TRUE, Result.FALSE, Result.CANNOT]
+GROWTH       = 2 # a configuration above a known one may need that much more memory
+GiB          = 1024*1024*1024 # Bytes
+
+
+class Record:
+   def __init__(self, queries, configuration, result, duration, peak, timeout, limit,
+                user = None, system = None, cause = None, prover = None, model = None):
+      self.queries       = queries
+      self.configuration = configuration
+      self.result        = result
+      self.duration      = duration # seconds
+      self.peak          = peak     # bytes
+      self.timeout       = timeout  # seconds
+      self.limit         = limit    # GiB
+      self.user          = user     # CPU seconds
+      self.system        = system
+      self.cause         = cause    # see opcua.ProofResult.end_cause
+      self.prover        = prover   # settings of ProVerif, see cache.settings
+      self.model         = model    # options of the model, see opcua.model_settings
+      self.bits          = bitconf.from_str(configuration).bits
+
+   # complete runs give upper bounds of the needs of the configurations below
+   def complete(self):
+      return self.result in COMPLETE and self.peak != None and self.cause != "verdict"
+
+   # what the run needed, at least
+   def memory(self):
+      if self.result == Result.MEM_OUT and self.limit != None:
+         return max(self.peak or 0, self.limit * GiB)
+      return self.peak
+
+   def to_json(self):
+      return json.dumps({
+         "queries":       self.queries,
+         "configuration": self.configuration,
+         "result":        self.result.name,
+         "duration":      self.duration,
+         "peak":          self.peak,
+         "timeout":       self.timeout,
+         "limit":         self.limit,
+         "user":          self.user,
+         "system":        self.system,
+         "cause":         self.cause,
+         "prover":        self.prover,
+         "model":         self.model })
+
+   @classmethod
+   def from_json(cls, line):
+      e = json.loads(line)
+      return Record(e["queries"], e["configuration"], Result[e["result"]], e["duration"],
+                    e["peak"], e["timeout"], e["limit"], e.get("user"), e.get("system"), e.get("cause"),
+                    e.get("prover"), e.get("model"))
+
+
+class History:
+   # model: the options of the model of the predictions (see opcua.model_settings), None for
+   # the runs of any model.
+   def __init__(self, file = HISTORY_FILE, model = None):
+      self.file    = file
+      self.model   = model
+      self.records = {} # query -> list of records of the model
+      self.count   = 0  # number of records, to know when predictions are outdated
+      self.lock    = Lock()
+      if file != None and path.exists(file):
+         with open(file, "r") as f:
+            for line in f:
+               try:
+                  self.add(Record.from_json(line))
+               except (ValueError, KeyError):
+                  pass
+
+   def add(self, r):
+      if self.model != None and r.model != self.model:
+         return
+      for q in r.queries:
+         self.records.setdefault(q, []).append(r)
+      self.count += 1
+
+   # Record a run of ProVerif (r is an opcua.ProofResult), but not the results from the cache.
+   def record(self, r, timeout, limit, prover = None, model = None):
+      if r.cached or r.result in [Result.ERROR, Result.UNKNOWN, Result.CANCELLED]:
+         return
+      rec = Record(list(r.queries), str(r.configuration), r.result, r.duration.total_seconds(),
+                   r.peak, timeout, limit, r.user, r.system, r.cause, prover, model)
+      with self.lock:
+         self.add(rec)
+         if self.file != None:
+            with open(self.file, "a") as f:
+               f.write(rec.to_json() + "\n")
+
+   # Prediction of value(record) for a query and a configuration, None if unknown.
+   def predict(self, query, conf, value):
+      if not isinstance(conf, bitconf):
+         conf = bitconf.from_str(str(conf))
+      upper = None
+      lower = None
+      with self.lock:
+         records = list(self.records.get(query, []))
+      for r in records:
+         m = value(r)
+         if m == None:
+            continue
+         if r.complete() and (conf.bits & ~r.bits) == 0:
+            upper = m if upper == None else min(upper, m)
+         if (r.bits & ~conf.bits) == 0:
+            lower = m if lower == None else max(lower, m)
+      if upper != None and (lower == None or upper >= lower):
+         return upper
+      if lower != None:
+         return lower * GROWTH
+      return None
+
+   # Predicted peak memory (in bytes) of ProVerif for a query and a configuration, None if unknown.
+   def memory(self, query, conf):
+      return self.predict(query, conf, Record.memory)
+
+   # Predicted running time (in seconds), None if unknown.
+   def duration(self, query, conf):
+      return self.predict(query, conf, lambda r: r.duration)
+
+   # Is the query known to be false (or not provable) in a configuration below conf?
+   def refuted(self, query, conf):
+      if not isinstance(conf, bitconf):
+         conf = bitconf.from_str(str(conf))
+      with self.lock:
+         records = list(self.records.get(query, []))
+      return any(r.result in [Result.FALSE, Result.CANNOT] and (r.bits & ~conf.bits) == 0 for r in records)
+
+   # Predicted peak memory for several queries run one after the other (or at the same time).
+   def memory_all(self, queries, conf, parallel = False):
+      m = [self.memory(q, conf) for q in queries]
+      if None in m:
+         return None
+      return sum(m) if parallel else max(m)
@@ -0,0 +1,167 @@
+# Dense lattice engine.
+# The state of all the 2^14 configurations is kept in flat NumPy arrays indexed by the bitmask
+# of the configuration (see bitconf in configurations.py), and results are propagated to the
+# subsets or supersets of a configuration with vectorized masks instead of walking the Trie.
+#
+# DenseTrie has the same interface as configurations.Trie, so that prove.py can use either:
+#  $ python3 prove.py --engine dense ...
+# It requires NumPy:
+#  $ pip3 install numpy
+
+from configurations import *
+
+import numpy as np
+
+
+SIZE      = 1 << len(ELEMENTS)
+INDEX     = np.arange(SIZE, dtype=np.int32)
+NO_RESULT = -1 # not a configuration below the maximal one
+
+UNKNOWN = Result.UNKNOWN.value
+PENDING = Result.PENDING.value
+
+
+# The configurations below sup, in the depth first order of the Trie built by Trie.from_conf,
+# so that DenseTrie.first() and the print routines follow the same order as the Trie.
+def dfs_order(sup):
+   root = [None, {}] # [configuration ending here, children]
+   for bits in power_set(sup):
+      n = root
+      for e in elements_of(bits):
+         n = n[1].setdefault(e, [None, {}])
+      n[0] = bits
+   order = []
+   stack = [root]
+   while stack != []:
+      n = stack.pop()
+      if n[0] != None:
+         order += [n[0]]
+      stack += reversed(n[1].values())
+   return np.array(order, dtype=np.int32)
+
+
+class DenseTrie(Lattice):
+
+   def __init__(self, sup):
+      self.max    = sup
+      self.order  = dfs_order(sup)
+      self.result = np.full(SIZE, NO_RESULT, dtype=np.int8)
+      self.result[self.order] = UNKNOWN
+      self.time   = np.full(SIZE, np.nan)
+      # if this configuration is a FALSE one, may it be a minimal configuration? if TRUE, a maximal one?
+      self.is_min = np.ones(SIZE, dtype=bool)
+      self.is_max = np.ones(SIZE, dtype=bool)
+      # the result has been propagated from another configuration (the Trie deletes those nodes)
+      self.pruned = np.zeros(SIZE, dtype=bool)
+
+   @classmethod
+   def from_conf(cls, sup):
+      if isinstance(sup, configuration):
+         sup = bitconf.from_configuration(sup)
+      return DenseTrie(sup)
+
+   # vectorized masks of the configurations below or above conf, and of the undecided ones
+   def subsets(self, conf):
+      return (INDEX & ~conf.bits) == 0
+
+   def supersets(self, conf):
+      return (INDEX & conf.bits) == conf.bits
+
+   def undecided(self):
+      return (self.result == UNKNOWN) | (self.result == PENDING)
+
+   # number of undecided configurations below conf, conf included (above it if up)
+   def count_undecided(self, conf, up = False):
+      s = self.supersets(conf) if up else self.subsets(conf)
+      return int((s & (self.result == UNKNOWN)).sum())
+
+   def is_void(self):
+      return not self.undecided().any()
+
+   # First valid configuration, in the order of the Trie.
+   def first(self):
+      r = self.result[self.order] == UNKNOWN
+      i = int(np.argmax(r))
+      if not r[i]:
+         return None
+      return bitconf(int(self.order[i]))
+
+   # The next n valid configurations, in the order of the Trie (without reserving them).
+   def upcoming(self, n):
+      order = self.order[self.result[self.order] == UNKNOWN]
+      return [bitconf(bits) for bits in order[:n].tolist()]
+
+   # check if a configuration is valid
+   def find(self, conf):
+      return self.result[conf.bits] == UNKNOWN
+
+   # result of a configuration (None if it is not below the maximal one)
+   def result_of(self, conf):
+      r = int(self.result[conf.bits])
+      return None if r == NO_RESULT else Result(r)
+
+   # Reserve a valid configuration to test it
+   def reserve(self, conf):
+      if self.result[conf.bits] == UNKNOWN:
+         self.result[conf.bits] = PENDING
+         return True
+      return False
+
+   # Give back a reserved configuration that was not decided, so that it can be tested again.
+   def release(self, conf):
+      if self.result[conf.bits] == PENDING:
+         self.result[conf.bits] = UNKNOWN
+
+   # Mark only one configuration with the result of a run, but not as MIN or MAX.
+   def mark(self, conf, result, duration):
+      debug("mark(" + str(conf) + ")")
+      r = self.result[conf.bits]
+      if r == NO_RESULT or self.pruned[conf.bits]:
+         print("'Mark' couldn't find the configuration: " + str(conf))
+      elif r == UNKNOWN or r == PENDING:
+         self.result[conf.bits] = result.value
+         self.time[conf.bits] = duration.total_seconds()
+      elif r == Result.TRUE.value and result == Result.FALSE:
+         print("'Mark' found " + str(conf) + ": TRUE but it is FALSE!")
+         raise
+      elif r == Result.FALSE.value and result == Result.TRUE:
+         print("'Mark' found " + str(conf) + ": FALSE but it is TRUE!")
+         raise
+      elif r != result.value:
+         print("'Mark' found " + str(conf) + ": " + str(Result(r)) + " but it is " + str(result) + "!")
+         self.result[conf.bits] = result.value
+         self.time[conf.bits] = duration.total_seconds()
+
+   # give all undecided configurations inferior or equal to the given one the result.
+   def delete_inf(self, conf, result):
+      debug("Delete all configurations inferior or equal to: " + str(conf))
+      s = self.subsets(conf) & self.undecided()
+      self.result[s] = result.value
+      self.pruned[s] = True
+
+   # unmark max flag for all configurations strictly inferior to the given one (supposed TRUE)
+   def unmark_inf(self, conf):
+      s = self.subsets(conf) & (self.result != NO_RESULT)
+      s[conf.bits] = False
+      self.is_max[s] = False
+
+   # give all undecided configurations superior or equal to the given one the result.
+   def delete_sup(self, conf, result):
+      debug("Delete all configurations superior or equal to: " + str(conf))
+      s = self.supersets(conf) & self.undecided()
+      self.result[s] = result.value
+      self.pruned[s] = True
+
+   # Unmark min flag for all configurations strictly superior to the given one.
+   def unmark_sup(self, conf):
+      s = self.supersets(conf) & (self.result != NO_RESULT)
+      s[conf.bits] = False
+      self.is_min[s] = False
+
+   # All the configurations, in the order of the Trie: (configuration, result, time, min, max)
+   def configurations(self):
+      for bits in self.order.tolist():
+         t = self.time[bits]
+         yield bitconf(bits), Result(int(self.result[bits])), \
+               None if np.isnan(t) else timedelta(seconds=float(t)), \
+               bool(self.is_min[bits]), bool(self.is_max[bits])
@@ -0,0 +1,217 @@
+# Lazy lattice engine.
+# The lattice is defined by its maximal configuration: no node is built in advance. Only the
+# configurations that were reserved or tested are kept, with the antichains of the results
+# that were propagated (delete_inf, delete_sup) and of the min and max flags that were
+# cleared (unmark_inf, unmark_sup). The state of any other configuration is derived from them
+# when it is asked for, and the undecided configurations are generated in the order of the
+# Trie, skipping the sub-lattices that are already decided. Startup is thus immediate, and
+# memory is proportional to the configurations actually touched.
+# A decided configuration stays decided: the results derived from the antichains and the
+# decided sub-lattices are thus cached, and the configurations and sub-lattices that are not
+# are only checked again against the results propagated since.
+#
+# LazyTrie has the same interface as configurations.Trie and lattice.DenseTrie:
+#  $ python3 prove.py --engine lazy ...
+
+from configurations import *
+
+
+# dimensions of a configuration, in the order of the Trie; those in REQUIRED need an element
+DIMENSIONS = [CRYPTO_BITS, MODE_BITS, REOPEN_BIT, SMODE_BITS, UTOKEN_BITS, SWITCH_BIT, LEAK_BITS]
+REQUIRED   = [CRYPTO_BITS, MODE_BITS, SMODE_BITS, UTOKEN_BITS]
+DIMENSION  = { e: i for i, d in enumerate(DIMENSIONS) for e in ELEMENTS if BIT[e] & d }
+
+# Rank of the child e of a node of the Trie whose last element is last: the Trie inserts the
+# configurations in the order of power_set, so the following elements of the same dimension
+# come first, then those of the following dimensions, the last ones first (an unset option
+# comes before a set one). The configuration of the node itself comes before its children.
+def rank(last, e):
+   if last != None and DIMENSION[e] == DIMENSION[last]:
+      return (0, order[e])
+   return (1, -DIMENSION[e], order[e])
+
+# key to sort configurations (bitmasks) in the order of the Trie
+def trie_key(bits):
+   k = []
+   last = None
+   for e in elements_of(bits):
+      k.append(rank(last, e))
+      last = e
+   return k + [(-1,)]
+
+
+class LazyTrie(Lattice):
+
+   def __init__(self, sup):
+      self.max      = sup
+      self.results  = {}    # bits -> (result, time) of the configurations that were marked
+      self.pending  = set() # bits of the reserved configurations
+      self.pruned   = []    # (bits, result, up) of delete_inf (up = False) and delete_sup (up = True)
+      self.above    = []    # antichain of unmark_inf: no max flag strictly below
+      self.below    = []    # antichain of unmark_sup: no min flag strictly above
+      self.children_of = {} # (last, required dimensions set) -> children, in the order of the Trie
+      self.derived  = {}    # bits -> result given by delete_inf or delete_sup
+      self.closed   = set() # prefixes of the Trie whose sub-lattice is decided
+      self.checked  = {}    # bits -> number of self.pruned that do not decide it (configuration)
+      self.open     = {}    #         or its whole sub-lattice (prefix)
+
+   @classmethod
+   def from_conf(cls, sup):
+      if isinstance(sup, configuration):
+         sup = bitconf.from_configuration(sup)
+      return LazyTrie(sup)
+
+   def is_member(self, bits):
+      return (bits & ~self.max.bits) == 0 and is_valid(bits)
+
+   # the elements that extend a prefix of the Trie towards a configuration
+   def children(self, bits, last):
+      required = tuple(bits & d != 0 for d in REQUIRED)
+      k = (last, required)
+      if not k in self.children_of:
+         start = 0 if last == None else order[last] + 1
+         c = [e for e in ELEMENTS[start:] if self.max.bits & BIT[e] and
+              all(bits & d != 0 for d in REQUIRED if DIMENSION[e] > DIMENSIONS.index(d))]
+         self.children_of[k] = sorted(c, key = lambda e: rank(last, e))
+      return self.children_of[k]
+
+   # the result given to the configuration by delete_inf or delete_sup, the first one wins
+   def pruned_result(self, bits):
+      r = self.derived.get(bits)
+      if r != None:
+         return r
+      for b, result, up in self.pruned[self.checked.get(bits, 0):]:
+         if (up and (b & ~bits) == 0) or (not up and (bits & ~b) == 0):
+            self.derived[bits] = result
+            self.checked.pop(bits, None)
+            return result
+      self.checked[bits] = len(self.pruned)
+      return None
+
+   def state(self, bits):
+      r = self.results.get(bits)
+      if r != None:
+         return r[0]
+      r = self.pruned_result(bits)
+      if r != None:
+         return r
+      return Result.PENDING if bits in self.pending else Result.UNKNOWN
+
+   # Is the whole sub-lattice of the configurations with this prefix decided?
+   def is_decided(self, bits, last):
+      if bits in self.closed:
+         return True
+      largest = bits | (self.max.bits & (ALL_BITS if last == None else HIGHER[last]))
+      for b, result, up in self.pruned[self.open.get(bits, 0):]:
+         if (up and (b & ~bits) == 0) or (not up and (largest & ~b) == 0):
+            self.closed.add(bits)
+            self.open.pop(bits, None)
+            return True
+      self.open[bits] = len(self.pruned)
+      return False
+
+   # The configurations of the sub-lattice with this prefix, in the order of the Trie: with
+   # skip, those of the sub-lattices that are not decided. A sub-lattice that was walked
+   # through and found decided is closed.
+   def walk(self, bits = 0, last = None, skip = True):
+      if skip and self.is_decided(bits, last):
+         return
+      decided = True
+      if bits != 0 and is_valid(bits):
+         yield bits
+         decided = self.state(bits) not in [Result.UNKNOWN, Result.PENDING]
+      children = self.children(bits, last)
+      for e in children:
+         yield from self.walk(bits | BIT[e], e, skip)
+      if skip and decided and all(bits | BIT[e] in self.closed for e in children):
+         self.closed.add(bits)
+         self.open.pop(bits, None)
+
+   def undecided(self):
+      for bits in self.walk():
+         if self.state(bits) == Result.UNKNOWN:
+            yield bitconf(bits)
+
+   def is_void(self):
+      return self.first() == None
+
+   # First valid configuration, in the order of the Trie.
+   def first(self):
+      return next(self.undecided(), None)
+
+   # The next n valid configurations, in the order of the Trie (without reserving them).
+   def upcoming(self, n):
+      r = []
+      for conf in self.undecided():
+         if len(r) >= n:
+            break
+         r.append(conf)
+      return r
+
+   # check if a configuration is valid
+   def find(self, conf):
+      return self.is_member(conf.bits) and self.state(conf.bits) == Result.UNKNOWN
+
+   # result of a configuration (None if it is not below the maximal one)
+   def result_of(self, conf):
+      return self.state(conf.bits) if self.is_member(conf.bits) else None
+
+   # Reserve a valid configuration to test it
+   def reserve(self, conf):
+      if self.find(conf):
+         self.pending.add(conf.bits)
+         return True
+      return False
+
+   # Give back a reserved configuration that was not decided, so that it can be tested again.
+   def release(self, conf):
+      self.pending.discard(conf.bits)
+
+   # Mark only one configuration with the result of a run, but not as MIN or MAX.
+   def mark(self, conf, result, duration):
+      debug("mark(" + str(conf) + ")")
+      r = self.results.get(conf.bits)
+      self.pending.discard(conf.bits)
+      if not self.is_member(conf.bits) or (r == None and self.pruned_result(conf.bits) != None):
+         print("'Mark' couldn't find the configuration: " + str(conf))
+      elif r == None:
+         self.results[conf.bits] = (result, duration)
+      elif r[0] == Result.TRUE and result == Result.FALSE:
+         print("'Mark' found " + str(conf) + ": TRUE but it is FALSE!")
+         raise
+      elif r[0] == Result.FALSE and result == Result.TRUE:
+         print("'Mark' found " + str(conf) + ": FALSE but it is TRUE!")
+         raise
+      elif r[0] != result:
+         print("'Mark' found " + str(conf) + ": " + str(r[0]) + " but it is " + str(result) + "!")
+         self.results[conf.bits] = (result, duration)
+
+   # give all undecided configurations inferior or equal to the given one the result.
+   def delete_inf(self, conf, result):
+      debug("Delete all configurations inferior or equal to: " + str(conf))
+      if not any(not up and (conf.bits & ~b) == 0 for b, r, up in self.pruned):
+         self.pruned.append((conf.bits, result, False))
+
+   # unmark max flag for all configurations strictly inferior to the given one (supposed TRUE)
+   def unmark_inf(self, conf):
+      if not any((conf.bits & ~b) == 0 for b in self.above):
+         self.above = [b for b in self.above if (b & ~conf.bits) != 0] + [conf.bits]
+
+   # give all undecided configurations superior or equal to the given one the result.
+   def delete_sup(self, conf, result):
+      debug("Delete all configurations superior or equal to: " + str(conf))
+      if not any(up and (b & ~conf.bits) == 0 for b, r, up in self.pruned):
+         self.pruned.append((conf.bits, result, True))
+
+   # Unmark min flag for all configurations strictly superior to the given one.
+   def unmark_sup(self, conf):
+      if not any((b & ~conf.bits) == 0 for b in self.below):
+         self.below = [b for b in self.below if (conf.bits & ~b) != 0] + [conf.bits]
+
+   # All the configurations, in the order of the Trie: (configuration, result, time, min, max)
+   def configurations(self):
+      for bits in self.walk(skip = False):
+         r = self.results.get(bits)
+         yield bitconf(bits), self.state(bits), None if r == None else r[1], \
+               not any(b != bits and (b & ~bits) == 0 for b in self.below), \
+               not any(b != bits and (bits & ~b) == 0 for b in self.above)
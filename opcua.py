@@ -2,21 +2,38 @@
 # This is a test script for opcua.pv on ProVerif.
 # usage :
 #  $ python3 opcua.py [options]
+#
+# It can also be imported, to prepare and run proof jobs without starting a new interpreter:
+#  import opcua
+#  r = opcua.prove(["3.1.A"], "ECC, Encrypt, no_reopen, SNoAA, cert, no_switch, lt_leaks", timeout = 300)
+#  print(r.result, r.verdicts, r.duration)
 
+from cache import Cache, key as cache_key, settings as prover_settings
 from config import *
+from configurations import Result
 from argparse import ArgumentParser
 from datetime import datetime, timedelta
-from jinja2 import Template, Environment
-from os import makedirs, path
-import platform
-import resource
-from subprocess import run, CalledProcessError, TimeoutExpired, Popen, PIPE
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from itertools import count
+import json
+from multiprocessing import Pool
+from os import close, makedirs, path, remove
+from hashlib import sha256
+from re import finditer, search, split, sub, DOTALL
+from runner import Runner
+from signal import SIGKILL
+from tempfile import mkstemp
+from threading import Lock
 
 CONF_TEMPLATE = "config-jinja.pvl"
 TARG_TEMPLATE = "opcua-jinja.pv"
 CONF = "tmp_conf"
 TARG = "tmp_opcua"
+OUT  = "tmp_out"
 OUTDIR = "output"
+GiB = 1024*1024*1024 # Bytes
 
 def str_of_bool(b):
    if b:
@@ -24,38 +41,41 @@ def str_of_bool(b):
    else:
       return "false"
 
-def generate_conf(conf_file, config, proverif, rnd_ext):
-   with open(CONF_TEMPLATE, "r") as ctf:
-      tmpl = Template(
-         ctf.read(),
-         block_start_string    = '(*{',
-         block_end_string      = '}*)',
-         variable_start_string = '(*<',
-         variable_end_string   = '>*)',
-         comment_start_string  = '(*#',
-         comment_end_string    = '#*)')
-   conf_file = CONF + rnd_ext + ".pvl"
-   cf = open(conf_file, "w")
-   cf.write(tmpl.render(
+# Templates are loaded through a shared Environment, that keeps the compiled templates in memory
+# (reloaded when the file changes) and their bytecode on disk, in JINJA_CACHE, keyed by a hash
+# of their source.
+JINJA_CACHE = ".jinja_cache"
+ENVIRONMENT = None
+ENV_LOCK = Lock()
+
+def environment():
+   global ENVIRONMENT
+   with ENV_LOCK:
+      if ENVIRONMENT == None:
+         makedirs(JINJA_CACHE, exist_ok = True)
+         ENVIRONMENT = Environment(
+            loader                = FileSystemLoader('/'),
+            bytecode_cache        = FileSystemBytecodeCache(JINJA_CACHE),
+            auto_reload           = True,
+            block_start_string    = '(*{',
+            block_end_string      = '}*)',
+            variable_start_string = '(*<',
+            variable_end_string   = '>*)',
+            comment_start_string  = '(*#',
+            comment_end_string    = '#*)')
+   return ENVIRONMENT
+
+def template(name):
+   return environment().get_template(path.abspath(name))
+
+def render_conf(config, proverif):
+   return template(CONF_TEMPLATE).render(
       config=config,
       proverif=proverif,
-      str_of_bool=str_of_bool))
-   cf.close
-   return conf_file
+      str_of_bool=str_of_bool)
 
-def generate_targ(pv_file, config, proverif, queries, rnd_ext, auth, fixed, KCI, oracle):
-   with open(TARG_TEMPLATE, "r") as ctf:
-      tmpl = Template(
-         ctf.read(),
-         block_start_string    = '(*{',
-         block_end_string      = '}*)',
-         variable_start_string = '(*<',
-         variable_end_string   = '>*)',
-         comment_start_string  = '(*#',
-         comment_end_string    = '#*)')
-   pv_file = TARG + rnd_ext + ".pv"
-   cf = open(pv_file, "w")
-   cf.write(tmpl.render(
+def render_targ(config, proverif, queries, auth, fixed, KCI, oracle, model = None):
+   return template(model or TARG_TEMPLATE).render(
       config=config,
       proverif=proverif,
       queries=queries,
@@ -63,8 +83,18 @@ def generate_targ(pv_file, config, proverif, queries, rnd_ext, auth, fixed, KCI,
       authenticated=auth,
       fixed=fixed,
       KCI=KCI,
-      oracle=oracle))
-   cf.close
+      oracle=oracle)
+
+def generate_conf(conf_file, config, proverif, rnd_ext, text = None):
+   conf_file = CONF + rnd_ext + ".pvl"
+   with open(conf_file, "w") as cf:
+      cf.write(text if text != None else render_conf(config, proverif))
+   return conf_file
+
+def generate_targ(pv_file, config, proverif, queries, rnd_ext, auth, fixed, KCI, oracle, model = None, text = None):
+   pv_file = TARG + rnd_ext + ".pv"
+   with open(pv_file, "w") as cf:
+      cf.write(text if text != None else render_targ(config, proverif, queries, auth, fixed, KCI, oracle, model))
    return pv_file
 
 def summary(config):
@@ -86,7 +116,7 @@ def summary(config):
    if not config["reopen"]:
       test_case += "no_"
    test_case += "reopen, "
-   
+
    separator = ""
    for mode in config["semode"]:
       test_case += separator + mode
@@ -113,130 +143,598 @@ def summary(config):
 
    return test_case
 
+# -- Library ---
+
+# Parse a configuration such as "ECC, None, no_reopen, SSec, pwd, no_switch, no_leaks"
+def parse_config(configuration):
+   c = dict(config)
+   if configuration != None and configuration != "":
+      cfg_lst = configuration.replace(' ', '').split(',')
+      c["crypto"] = cfg_lst[0].split('|')
+      c["chmode"] = cfg_lst[1].split('|')
+      c["reopen"] = cfg_lst[2] == 'reopen'
+      c["semode"] = cfg_lst[3].split('|')
+      c["utoken"] = cfg_lst[4].split('|')
+      c["switch"] = cfg_lst[5] == 'switch'
+      c["leaks"]  = cfg_lst[6].split('|')
+   return c
+
+# Options of the templates for the given queries, configuration and flags.
+def options(query_list, configuration,
+            authenticated = authenticated, fixed = fixed, KCI = KCI, oracle = oracle,
+            sanity = False, unconditioned = False, reconstruct = True, verbose = False,
+            dev = False, model = None):
+   cfg = parse_config(configuration)
+   prv = dict(proverif)
+   prv["dev"] = prv["dev"] or dev
+   prv["reconstructTrace"] = prv["reconstructTrace"] and reconstruct
+   if verbose:
+      prv["verboseClauses"] = "short"
+      prv["verboseRules"]   = True
+   qrs = dict(queries)
+   qrs["list"]          = list(query_list)
+   qrs["Sanity"]        = sanity
+   qrs["Unconditioned"] = unconditioned
+   return cfg, prv, qrs, authenticated, fixed, KCI, oracle, model
+
+# Render the input files of ProVerif: (library, model)
+def render(query_list, configuration, **flags):
+   cfg, prv, qrs, auth, fixed, KCI, oracle, model = options(query_list, configuration, **flags)
+   return render_conf(cfg, prv), render_targ(cfg, prv, qrs, auth, fixed, KCI, oracle, model)
+
+# Input files without their comments and with blanks collapsed, so that files that differ only
+# there get the same hash. ProVerif comments do not nest.
+def normalize(text):
+   return " ".join(sub(r"\(\*.*?\*\)", " ", text, flags=DOTALL).split())
+
+def model_hash(query_list, configuration, **flags):
+   h = sha256()
+   for text in render(query_list, configuration, **flags):
+      h.update(normalize(text).encode('utf-8'))
+      h.update(b'\0')
+   return h.hexdigest()
+
+# Short name of the options of the model, that is all that is rendered but the queries and the
+# configuration (e.g. authenticated, fixed, KCI, oracle), for the history: the runs of another
+# model predict nothing.
+def model_settings(**flags):
+   cfg, prv, qrs, auth, fixed, KCI, oracle, model = options([], None, **flags)
+   del qrs["list"]
+   return sha256(json.dumps([prv, qrs, auth, fixed, KCI, oracle, model or TARG_TEMPLATE],
+                            sort_keys = True).encode('utf-8')).hexdigest()[:16]
+
+# The normalized library without the definitions (letfun) that neither the model nor the rest
+# of the library use: the dimensions of the configuration that they spell out do not change
+# the result of ProVerif for this model.
+LETFUN = r"letfun (\w+)\s*\([^)]*\)\s*=[^.]*\."
+
+def used_library(library, model):
+   unused = [d for d in finditer(LETFUN, library)
+             if search(r"\b" + d.group(1) + r"\s*\(", library[:d.start()] + library[d.end():] + model) == None]
+   for d in reversed(unused):
+      library = library[:d.start()] + library[d.end():]
+   return library
+
+# Hash of the input files for the queries, where the library keeps only what the model uses:
+# configurations with the same hash get the same result.
+def class_hash(query_list, configuration, **flags):
+   library, model = [normalize(text) for text in render(query_list, configuration, **flags)]
+   h = sha256()
+   for text in [used_library(library, model), model]:
+      h.update(text.encode('utf-8'))
+      h.update(b'\0')
+   return h.hexdigest()
+
+def class_key(task):
+   configuration, query_list, flags = task
+   return tuple(class_hash([q], configuration, **flags) for q in query_list)
+
+# Group the configurations with the same hash (see class_hash) for each query: only one of
+# each group has to be proved. The input files are rendered by `processes` processes.
+# Return a dictionary that maps each configuration to its group (a list).
+def classes(configurations, query_list, processes = 1, **flags):
+   configurations = list(configurations)
+   tasks = [(str(c), list(query_list), flags) for c in configurations]
+   if processes > 1:
+      with Pool(processes) as pool:
+         keys = pool.map(class_key, tasks, chunksize = 16)
+   else:
+      keys = map(class_key, tasks)
+   groups = {}
+   for c, k in zip(configurations, keys):
+      groups.setdefault(k, []).append(c)
+   return {c: g for g in groups.values() for c in g}
+
+# Render the input files of ProVerif, or take them from the renderer (a Prerenderer) if given.
+def texts(query_list, configuration, renderer = None, keep = False, **flags):
+   if renderer != None:
+      return renderer.get(query_list, configuration, keep, **flags)
+   return render(query_list, configuration, **flags)
+
+# Write the input files of ProVerif and return their names.
+def write(conf_text, targ_text, rnd_ext = ''):
+   conf_file = generate_conf(CONF, None, None, rnd_ext, conf_text)
+   targ_file = generate_targ(TARG, None, None, None, rnd_ext, None, None, None, None, text = targ_text)
+   return conf_file, targ_file
+
+# Generate the input files of ProVerif for the given queries and configuration,
+# and return their names. If a renderer is given, the files may have been rendered in advance.
+def prepare(query_list, configuration, rnd_ext = '', renderer = None, **flags):
+   return write(*texts(query_list, configuration, renderer, **flags), rnd_ext)
+
+# Renders the input files of the next jobs in the background, while ProVerif is running,
+# so that a job does not have to wait for its files when a prover is free.
+# At most `depth` rendered jobs are kept, the oldest ones are dropped.
+class Prerenderer:
+   def __init__(self, depth = 8, threads = 1):
+      self.depth    = depth
+      self.executor = ThreadPoolExecutor(threads)
+      self.futures  = {}
+      self.lock     = Lock()
+
+   def key(self, query_list, configuration, flags):
+      return (tuple(query_list), str(configuration), tuple(sorted(flags.items())))
+
+   def submit(self, query_list, configuration, **flags):
+      k = self.key(query_list, configuration, flags)
+      with self.lock:
+         if k in self.futures:
+            return
+         while len(self.futures) >= self.depth:
+            oldest = next(iter(self.futures))
+            self.futures.pop(oldest).cancel()
+         self.futures[k] = self.executor.submit(render, list(query_list), str(configuration), **flags)
+
+   # With keep, the files stay here for the next get.
+   def get(self, query_list, configuration, keep = False, **flags):
+      if keep:
+         self.submit(query_list, configuration, **flags)
+      with self.lock:
+         k = self.key(query_list, configuration, flags)
+         f = self.futures.get(k) if keep else self.futures.pop(k, None)
+      if f != None and not f.cancelled():
+         return f.result()
+      return render(query_list, configuration, **flags)
+
+# Command line of ProVerif
+def prover(conf_file, targ_file, dev = False, html = None):
+   exe = ["proverif-dev"] if (dev or proverif["dev"]) else ["proverif"]
+   if html != None:
+      exe += ['-html'] + [html]
+   return exe + ['-lib', conf_file, targ_file]
+
+# ProVerif processes are run by a runner (see runner.py), shared by default.
+RUNNER = None
+RUNNER_LOCK = Lock()
+JOB_IDS = count()
+
+def default_runner():
+   global RUNNER
+   with RUNNER_LOCK:
+      if RUNNER == None:
+         RUNNER = Runner()
+      return RUNNER
+
+OUTPUT_TAIL = 1 << 20 # characters of the output of ProVerif kept in memory, before its summary
+
+# The output of ProVerif in the file, as kept in memory: its verification summary, after at most
+# OUTPUT_TAIL characters of what comes before (e.g. an error or the last steps). The whole
+# output is copied to log (a file opened in text mode), if given.
+def read_output(file, log = None):
+   tail = deque()
+   size = 0
+   summary = None
+   with open(file, "r", encoding='utf-8', errors='replace') as f:
+      for line in f:
+         if log != None:
+            log.write(line)
+         if summary != None:
+            summary.append(line)
+         elif line.startswith("Verification summary:"):
+            summary = [line]
+         else:
+            tail.append(line)
+            size += len(line)
+            while size > OUTPUT_TAIL and len(tail) > 1:
+               size -= len(tail.popleft())
+   return "".join(tail) + "".join(summary or [])
+
+# Run ProVerif, with a timeout in seconds and a memory limit in GiB, as the job `id` of the runner.
+# Return its output (None if not captured, echoed on stdout if echo; see read_output) and the Run
+# (see runner.py): running time, whether it ran out of time or was cancelled, its peak memory...
+# With the watchdog, the memory limit is on the resident memory of ProVerif (see runner.py).
+# on_line, if given, gets the lines of the output as soon as they are printed.
+# log, if given, gets the whole output.
+def run_prover(exe, timeout = None, limit = None, capture = True, echo = False, runner = None, id = None,
+               watchdog = False, on_line = None, log = None):
+   if runner == None:
+      runner = default_runner()
+   if id == None:
+      id = ("opcua", next(JOB_IDS))
+   out_file = None
+   if capture:
+      fd, out_file = mkstemp(prefix = OUT, suffix = ".txt", dir = ".")
+      close(fd)
+   if on_line == None and echo:
+      on_line = lambda line: print(line, end='', flush=True)
+   try:
+      run = runner.run(id, exe, timeout, limit, out_file, on_line, watchdog)
+      outs = None
+      if capture:
+         outs = read_output(out_file, log)
+   finally:
+      if out_file != None and path.exists(out_file):
+         remove(out_file)
+   return outs, run
+
+VERDICTS = {
+   "is true.":          Result.TRUE,
+   "is false.":         Result.FALSE,
+   "cannot be proved.": Result.CANNOT }
+
+# Results of the queries in the verification summary of ProVerif (None for a query that can't be parsed),
+# or None if there is no summary.
+def parse_summary(output):
+   n = output.find("Verification summary:\n")
+   if n < 0:
+      return None
+   m = output.find("\n\n--------------------------------------------------------------", n)
+   verdicts = []
+   for res in split(" - Query", output[n+35:m])[1:]:
+      r = search("is true.|is false.|cannot be proved.", res)
+      verdicts += [None if r == None else VERDICTS[r.group(0)]]
+   return verdicts
+
+# Incremental parser of the output of ProVerif: it gets the verdict of each query from the
+# "RESULT" lines as soon as ProVerif prints them. Once a query is false, the result of the job
+# is certain (see ProofResult.conclude): then abort() is called, e.g. to stop ProVerif.
+class StreamParser:
+   def __init__(self, abort = None):
+      self.verdicts = []
+      self.abort    = abort
+      self.aborted  = False
+
+   def line(self, line):
+      if not line.startswith("RESULT"):
+         return
+      r = search("is true|is false|cannot be proved", line)
+      if r == None:
+         return
+      v = VERDICTS[r.group(0) + "."]
+      self.verdicts += [v]
+      if v == Result.FALSE and self.abort != None and not self.aborted:
+         self.aborted = True
+         self.abort()
+
+# The result of a proof job
+class ProofResult:
+   def __init__(self, query_list, configuration):
+      self.queries       = query_list
+      self.configuration = configuration
+      self.result        = Result.UNKNOWN
+      self.verdicts      = None
+      self.output        = ""
+      self.duration      = timedelta(0)
+      self.timed_out     = False
+      self.peak          = None  # bytes
+      self.cancelled     = False
+      self.cached        = False # the result comes from the cache
+      self.lower_bound   = None  # ProVerif is known to need more time than that
+      # telemetry of the run
+      self.user          = None  # CPU time in seconds
+      self.system        = None
+      self.signal        = None  # signal that killed ProVerif
+      self.exit_code     = None
+      self.cause         = None  # of the end of ProVerif: see conclude()
+      self.memory_exceeded = False # killed by the watchdog
+      self.aborted       = None  # verdicts, if ProVerif was stopped after a false query
+
+   # The fields of the result, e.g. to send it to another host (see cluster.py), with the end
+   # of the output only.
+   FIELDS = ["result", "verdicts", "output", "duration", "timed_out", "peak", "cancelled", "user", "system",
+             "signal", "exit_code", "cause", "memory_exceeded", "aborted"]
+
+   def to_dict(self):
+      d = {f: getattr(self, f) for f in self.FIELDS}
+      d["result"]   = self.result.name
+      d["verdicts"] = None if self.verdicts == None else [None if v == None else v.name for v in self.verdicts]
+      d["aborted"]  = None if self.aborted == None else [v.name for v in self.aborted]
+      d["duration"] = self.duration.total_seconds()
+      d["output"]   = self.output[-OUTPUT_TAIL:]
+      return d
+
+   def from_dict(self, d):
+      for f in self.FIELDS:
+         setattr(self, f, d[f])
+      self.result   = Result[d["result"]]
+      self.verdicts = None if d["verdicts"] == None else [None if v == None else Result[v] for v in d["verdicts"]]
+      self.aborted  = None if d["aborted"] == None else [Result[v] for v in d["aborted"]]
+      self.duration = timedelta(seconds=d["duration"])
+
+   def set_run(self, run):
+      if run.duration != None: # None if cancelled before it started
+         self.duration = run.duration
+      self.timed_out = run.timed_out
+      self.cancelled = run.cancelled
+      self.peak      = run.peak()
+      self.user      = run.user()
+      self.system    = run.system()
+      self.signal    = run.signal()
+      self.exit_code = run.exit_code()
+      self.memory_exceeded = run.memory_exceeded
+
+   # What ended ProVerif: "timeout", "cancelled", "verdict" (a query is false, see StreamParser),
+   # "memory" (the memory limit, or the system out of memory), or "prover" (it ended by itself,
+   # maybe crashed).
+   def end_cause(self):
+      if self.aborted != None:
+         return "verdict"
+      if self.cancelled:
+         return "cancelled"
+      if self.timed_out:
+         return "timeout"
+      if self.memory_exceeded:
+         return "memory"
+      if search("(?i)out.of.memory|Cannot allocate memory", self.output[-10000:]) != None or \
+         self.signal == SIGKILL:
+         return "memory"
+      return "prover"
+
+   def crashed(self):
+      return self.cause == "prover" and (self.signal != None or (self.exit_code or 0) != 0)
+
+   # ProVerif reported an error instead of a summary, e.g. in the model
+   def rejected(self):
+      return parse_summary(self.output) == None and search("Error:.*.", self.output) != None
+
+   # One line of telemetry for the logs
+   def telemetry(self):
+      def secs(t):
+         return "?" if t == None else "%.1fs" % t
+      return "wall " + secs(self.duration.total_seconds()) + \
+             ", user " + secs(self.user) + ", system " + secs(self.system) + \
+             ", peak " + ("?" if self.peak == None else "%.2f GiB" % (self.peak / GiB)) + \
+             (", signal " + str(self.signal) if self.signal != None else ", exit " + str(self.exit_code)) + \
+             ", cause " + str(self.cause)
+
+   # Deduce the result from the output of ProVerif:
+   # all queries must be true for the result to be true.
+   # Without summary, ProVerif ran out of memory only if it says so or if it was killed
+   # (e.g. by the OOM killer), otherwise it crashed: that is an error.
+   def conclude(self):
+      self.verdicts = parse_summary(self.output)
+      self.cause = self.end_cause()
+      if self.aborted != None:
+         self.verdicts = self.aborted
+         self.result = Result.FALSE
+      elif self.cancelled:
+         self.result = Result.CANCELLED
+      elif self.timed_out:
+         self.result = Result.TIMEOUT
+      elif self.verdicts == None:
+         if self.rejected():
+            self.result = Result.ERROR
+         elif self.cause == "memory" or (self.signal == None and self.exit_code == None):
+            self.result = Result.MEM_OUT
+         else:
+            self.result = Result.ERROR
+      else:
+         self.result = Result.UNKNOWN
+         for v in self.verdicts:
+            if v == None:
+               self.result = Result.ERROR
+               break
+            elif v == Result.TRUE:
+               if self.result == Result.UNKNOWN:
+                  self.result = Result.TRUE
+            elif v == Result.FALSE:
+               self.result = Result.FALSE
+            elif v == Result.CANNOT:
+               if self.result != Result.FALSE:
+                  self.result = Result.CANNOT
+      return self.result
+
+   # The output of ProVerif from its verification summary
+   def summary(self):
+      n = self.output.find("Verification summary:\n")
+      return self.output[n:] if n >= 0 else ""
+
+# The result of the queries in the given configuration from the cache (cache.Cache), if it
+# answers a job with this budget, None otherwise. The input files rendered to look it up stay
+# in the renderer, if given, for prove().
+def lookup(query_list, configuration, cache, timeout = None, limit = None, renderer = None,
+           partial = False, **flags):
+   r = ProofResult(query_list, configuration)
+   conf_text, targ_text = texts(query_list, configuration, renderer, keep = True, **flags)
+   options = prover("", "", flags.get("dev", False))[:-3]
+   if cache.load(cache_key(options, conf_text, targ_text), r, timeout, limit, partial):
+      return r
+   return None
+
+# Prove the queries in the given configuration: generate the input files, run ProVerif
+# and parse its results. Flags are those of prepare(), the timeout is in seconds and
+# the memory limit in GiB. The input files are taken from the renderer (a Prerenderer) if given.
+# If a cache (cache.Cache) is given, ProVerif is not run when it already knows the answer.
+# ProVerif runs as the job `job_id` of the runner, that may cancel it.
+# The run is recorded in the history (history.History) if given.
+# With the watchdog, the memory limit is on the resident memory of ProVerif.
+# With early_abort, ProVerif is stopped as soon as it finds a false query.
+# ProVerif is run by executor, execute() by default (see cluster.py for another one).
+# log, if given, is a file (opened in text mode) that gets the whole output of ProVerif, while
+# the result keeps only its summary and the end before it (see read_output).
+def prove(query_list, configuration, timeout = None, limit = None, rnd_ext = None, renderer = None,
+          cache = None, runner = None, job_id = None, history = None, watchdog = False,
+          early_abort = False, executor = None, log = None, **flags):
+   r = ProofResult(query_list, configuration)
+   if rnd_ext == None:
+      rnd_ext = datetime.now().strftime("_%Y-%m-%d-%Hh%Mm%Ss%f")
+   conf_text, targ_text = texts(query_list, configuration, renderer, **flags)
+   options = prover("", "", flags.get("dev", False))[:-3]
+   if cache != None:
+      key = cache_key(options, conf_text, targ_text)
+      if cache.load(key, r, timeout, limit, partial = early_abort):
+         if log != None:
+            log.write(r.output)
+         return r
+   if executor == None:
+      executor = execute
+   executor(r, conf_text, targ_text, timeout, limit, rnd_ext, runner, job_id, watchdog, early_abort,
+            flags.get("dev", False), log)
+   if cache != None:
+      cache.store(key, r, timeout, limit)
+   if history != None:
+      history.record(r, timeout, limit, prover_settings(options), model_settings(**flags))
+   return r
+
+# Run ProVerif on the given input files, and fill the proof result r with its results.
+def execute(r, conf_text, targ_text, timeout = None, limit = None, rnd_ext = '', runner = None,
+            job_id = None, watchdog = False, early_abort = False, dev = False, log = None):
+   conf_file = CONF + rnd_ext + ".pvl"
+   targ_file = TARG + rnd_ext + ".pv"
+   try:
+      conf_file, targ_file = write(conf_text, targ_text, rnd_ext)
+      exe = prover(conf_file, targ_file, dev)
+      parser = None
+      if early_abort:
+         if runner == None:
+            runner = default_runner()
+         if job_id == None:
+            job_id = ("opcua", next(JOB_IDS))
+         parser = StreamParser(abort = lambda: runner.cancel(job_id))
+      r.output, run = run_prover(exe, timeout, limit, runner = runner, id = job_id, watchdog = watchdog,
+                                 on_line = parser.line if parser != None else None, log = log)
+      r.set_run(run)
+      # unless ProVerif ended by itself meanwhile
+      if parser != None and parser.aborted and run.cancelled:
+         r.aborted = parser.verdicts
+   finally:
+      for f in [conf_file, targ_file]:
+         if path.exists(f):
+            remove(f)
+   r.conclude()
+
 # -- Main program ---
 
-# Parse arguments:
-parser = ArgumentParser(
-   prog = 'opcua.py',
-   description = 'launch proverif on opcua.pv with the given configuration'
-)
-parser.add_argument('-a', '--authenticated', action='store_true')
-parser.add_argument('-c', '--config')
-parser.add_argument('-d', '--development',   help='use customized proverif',           action='store_true')
-parser.add_argument(      '--html',          help='put results in directory "output"', action='store_true')
-parser.add_argument('-l', '--limit')
-parser.add_argument('-m', '--model',         help='location and name of the main proverif file')
-parser.add_argument('-n', '--not_fixed',     action='store_true')
-parser.add_argument(   '--no_reconstruction',action='store_true')
-parser.add_argument('-o', '--oracle',        action='store_true')
-parser.add_argument('-q', '--query')
-parser.add_argument('-r', '--random')
-parser.add_argument('-s', '--sanity_checks', action='store_true')
-parser.add_argument('-t', '--timeout')
-parser.add_argument('-u', '--unconditioned', action='store_true')
-parser.add_argument('-v', '--verbose',       action='store_true')
-
-args = parser.parse_args()
-if args.authenticated:
-   authenticated = True
-if args.config != None:
-   configuration = args.config
-if args.development:
-   proverif["dev"] = True
-GiB = 1024*1024*1024 # Bytes
-if args.limit != None:
-   DATA_LIMIT = int(args.limit) * GiB
-else:
-   DATA_LIMIT = 100 * GiB
-if args.model:
-   TARG_TEMPLATE = args.model
-if args.no_reconstruction:
-   proverif["reconstructTrace"] = False
-if args.not_fixed:
-   fixed = False
-if args.oracle:
-   oracle = True
-if args.query != None:
-   queries["list"] = args.query.replace(' ', '').split(',')
-   queries["Sanity"]          = False
-if args.random != None:
-   rnd_ext = args.random
-else:
-   rnd_ext = ''
-if args.sanity_checks:
-   queries["Sanity"]          = True
-if args.timeout != None:
-      TIMEOUT = int(args.timeout)
-else:
-      TIMEOUT = 7 * 24 * 3600 # 7 days
-if args.unconditioned:
-   queries["Unconditioned"]   = True
-else:
-   queries["Unconditioned"]   = False
-if args.verbose:
-   proverif["verboseClauses"] = "short"
-   proverif["verboseRules"]   = True
-
-# Parse configuration:
-if configuration != None and configuration != "":
-   cfg_lst = configuration.replace(' ', '').split(',')
-   config["crypto"] = cfg_lst[0].split('|')
-   config["chmode"] = cfg_lst[1].split('|')
-   config["reopen"] = cfg_lst[2] == 'reopen'
-   config["semode"] = cfg_lst[3].split('|')
-   config["utoken"] = cfg_lst[4].split('|')
-   config["switch"] = cfg_lst[5] == 'switch'
-   config["leaks"]  = cfg_lst[6].split('|')
-
-# Generate input files:
-conf_file = generate_conf(CONF, config, proverif, rnd_ext)
-targ_file = generate_targ(TARG, config, proverif, queries, rnd_ext, authenticated, fixed, KCI, oracle)
-
-# Choose prover:
-exe = ["proverif-dev"] if proverif["dev"] else ["proverif"]
-
-if args.html or proverif["html"]:
-   OUTDIR += rnd_ext
-   if not path.isdir(OUTDIR):
-      makedirs(OUTDIR)
-   exe += ['-html'] + [OUTDIR]
-
-exe += ['-lib', conf_file, targ_file]
-
-# Run prover:
-try:
-   t = datetime.now()
-   p = Popen(exe, start_new_session=False, stdin=PIPE, encoding='utf-8')
-   if args.limit != None and platform.system() == "Linux":
-      resource.prlimit(p.pid, resource.RLIMIT_AS, (DATA_LIMIT*8//10, DATA_LIMIT))
+def main():
+   global TARG_TEMPLATE, OUTDIR
+
+   # Parse arguments:
+   parser = ArgumentParser(
+      prog = 'opcua.py',
+      description = 'launch proverif on opcua.pv with the given configuration'
+   )
+   parser.add_argument('-a', '--authenticated', action='store_true')
+   parser.add_argument('-c', '--config')
+   parser.add_argument('-d', '--development',   help='use customized proverif',           action='store_true')
+   parser.add_argument(      '--html',          help='put results in directory "output"', action='store_true')
+   parser.add_argument('-l', '--limit')
+   parser.add_argument('-m', '--model',         help='location and name of the main proverif file')
+   parser.add_argument('-n', '--not_fixed',     action='store_true')
+   parser.add_argument(      '--no_cache',      help='do not use the cache of proof results', action='store_true')
+   parser.add_argument(   '--no_reconstruction',action='store_true')
+   parser.add_argument('-o', '--oracle',        action='store_true')
+   parser.add_argument('-q', '--query')
+   parser.add_argument('-r', '--random')
+   parser.add_argument('-s', '--sanity_checks', action='store_true')
+   parser.add_argument('-t', '--timeout')
+   parser.add_argument('-u', '--unconditioned', action='store_true')
+   parser.add_argument('-v', '--verbose',       action='store_true')
+   parser.add_argument('-w', '--watchdog',      help='limit the resident memory, instead of the address space', action='store_true')
+
+   args = parser.parse_args()
+   cfg = configuration
+   if args.config != None:
+      cfg = args.config
+   if args.model:
+      TARG_TEMPLATE = args.model
+   query_list = queries["list"]
+   sanity     = queries["Sanity"]
+   if args.query != None:
+      query_list = args.query.replace(' ', '').split(',')
+      sanity     = False
+   if args.sanity_checks:
+      sanity     = True
+   if args.random != None:
+      rnd_ext = args.random
+   else:
+      rnd_ext = ''
+   if args.limit != None:
+      DATA_LIMIT = int(args.limit)
+   else:
+      DATA_LIMIT = 100
    if args.timeout != None:
-      outs, errs = p.communicate(timeout = TIMEOUT)
+      TIMEOUT = int(args.timeout)
    else:
-      outs, errs = p.communicate()
-except TimeoutExpired:
-    print("\nOut of time!\n")
-    p.kill()
-    outs, errs = p.communicate()
-except CalledProcessError as e:
-    print("Failed with ProVerif error.")
-    p.kill()
-    outs, errs = p.communicate()
-
-d = datetime.now() - t
-D = datetime.min + d
-
-# Conclude:
-if queries["list"] != []:
-   if len(queries["list"]) > 1:
-      print("Queries: " + ", ".join(queries["list"]))
+      TIMEOUT = None # no timeout
+
+   # Generate input files:
+   flags = dict(
+      authenticated = authenticated or args.authenticated,
+      fixed         = fixed and not args.not_fixed,
+      KCI           = KCI,
+      oracle        = oracle or args.oracle,
+      sanity        = sanity,
+      unconditioned = args.unconditioned,
+      reconstruct   = not args.no_reconstruction,
+      verbose       = args.verbose,
+      dev           = args.development)
+   conf_text, targ_text = render(query_list, cfg, **flags)
+
+   # Choose prover:
+   html = None
+   if args.html or proverif["html"]:
+      OUTDIR += rnd_ext
+      if not path.isdir(OUTDIR):
+         makedirs(OUTDIR)
+      html = OUTDIR
+   options = prover("", "", args.development, html)[:-3]
+   limit   = DATA_LIMIT if args.limit != None else None
+
+   conf_file, targ_file = write(conf_text, targ_text, rnd_ext)
+
+   # The cache can't give the html output of ProVerif
+   cache = None
+   r = ProofResult(query_list, cfg)
+   if not args.no_cache and html == None:
+      cache = Cache()
+      key = cache_key(options, conf_text, targ_text)
+      if cache.load(key, r, TIMEOUT, limit):
+         print(r.output)
+         print("(cached result)")
+   if r.lower_bound != None:
+      print("ProVerif is known to need more than " + str(r.lower_bound) + "\n")
+
+   # Run prover:
+   if not r.cached:
+      exe = prover(conf_file, targ_file, args.development, html)
+      r.output, run = run_prover(exe, TIMEOUT, limit, capture = True, echo = True, watchdog = args.watchdog)
+      r.set_run(run)
+      r.conclude()
+      if cache != None:
+         cache.store(key, r, TIMEOUT, limit)
+   if rnd_ext != '':
+      remove(conf_file)
+      remove(targ_file)
+   if r.timed_out:
+      print("\nOut of time!\n")
+   d = r.duration
+   D = datetime.min + d
+
+   # Conclude:
+   if query_list != []:
+      if len(query_list) > 1:
+         print("Queries: " + ", ".join(query_list))
+      else:
+         print("Query: " +  query_list[0])
+   print("Configuration: " + summary(parse_config(cfg)))
+
+   print("Running time: ", end='')
+   if d >= timedelta(hours=1):
+      print(D.strftime("%Hh %Mm"))
    else:
-      print("Query: " +  queries["list"][0])
-print("Configuration: " + summary(config))
-
-print("Running time: ", end='')
-if d >= timedelta(hours=1):
-   print(D.strftime("%Hh %Mm"))
-else:
-   print(D.strftime("%Mm %Ss"))
-if rnd_ext != '':
-   _ = run(['rm', conf_file, targ_file], capture_output=False, encoding='utf-8')
+      print(D.strftime("%Mm %Ss"))
+   if not r.cached:
+      print("Resources: " + r.telemetry())
+
+if __name__ == "__main__":
+   main()
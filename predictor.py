@@ -0,0 +1,147 @@
+# Prediction of the running time of ProVerif from the history of the previous runs (see
+# history.py): the explorer uses it to test the cheapest configurations first, and to give a
+# short timeout to the configurations that will time out for sure.
+#
+# For a query and a configuration, the runs of the same query on the nearest configurations
+# (with the fewest different options) vote, the nearest ones more, and the runs with other
+# settings of ProVerif less. The runs of another model (e.g. not fixed, or with the oracle) do
+# not vote. The lattice bounds the prediction: a configuration needs at least
+# the time of a smaller one (even if it timed out), and at most the time of a larger one that
+# ProVerif decided.
+# The verdicts of the nearest runs vote the same way for the probability that a configuration
+# is TRUE, within the bounds of the lattice: 1 below a TRUE one, 0 above a FALSE one.
+
+from configurations import Result
+from history import COMPLETE
+
+from heapq import nsmallest
+from math import exp, log
+
+NEIGHBOURS   = 8    # runs that vote
+OTHER_PROVER = 0.5  # weight of the runs with other settings of ProVerif
+PROBE        = 8    # a configuration that will time out gets the timeout divided by PROBE
+
+
+def distance(r, conf):
+   return (r.bits ^ conf.bits).bit_count()
+
+# time that the run needed, at least
+def needed(r):
+   if r.result == Result.TIMEOUT:
+      return max(r.duration, r.timeout or 0)
+   return r.duration
+
+
+class Predictor:
+
+   # queries: those of a job, run at the same time if parallel, otherwise one after the other.
+   # prover: the settings of ProVerif (see cache.settings).
+   # model: the options of the model (see opcua.model_settings), None for any model.
+   def __init__(self, history, queries, parallel = False, prover = None, model = None):
+      self.history  = history
+      self.queries  = queries
+      self.parallel = parallel
+      self.prover   = prover
+      self.model    = model
+      self.known    = {} # (what, bits, timeout) -> prediction, while the history does not change
+      self.count    = None
+
+   def records(self, query):
+      with self.history.lock:
+         records = list(self.history.records.get(query, []))
+      return [r for r in records if r.duration != None and (r.result in COMPLETE or r.result == Result.TIMEOUT)
+              and (self.model == None or r.model == self.model)]
+
+   def weight(self, r, conf):
+      w = 1 / (1 + distance(r, conf))
+      if self.prover != None and r.prover != self.prover:
+         w *= OTHER_PROVER
+      return w
+
+   # bounds of the running time given by the lattice, from the runs with the same settings
+   def bounds(self, records, conf):
+      lower = 0
+      upper = None
+      for r in records:
+         if self.prover != None and r.prover != self.prover:
+            continue
+         if (r.bits & ~conf.bits) == 0:
+            lower = max(lower, needed(r))
+         if r.complete() and (conf.bits & ~r.bits) == 0:
+            upper = r.duration if upper == None else min(upper, r.duration)
+      return lower, upper
+
+   # Predicted running time of the query in seconds, None if unknown.
+   def duration(self, query, conf):
+      records = self.records(query)
+      if records == []:
+         return None
+      near = nsmallest(NEIGHBOURS, records, key = lambda r: distance(r, conf))
+      w = sum(self.weight(r, conf) for r in near)
+      d = exp(sum(self.weight(r, conf) * log(max(needed(r), 0.001)) for r in near) / w)
+      lower, upper = self.bounds(records, conf)
+      if upper != None and upper >= lower:
+         d = min(d, upper)
+      return max(d, lower)
+
+   # Probability that ProVerif proves the query, None if unknown.
+   def true(self, query, conf):
+      records = [r for r in self.records(query) if r.result in COMPLETE]
+      if any(r.result != Result.TRUE and (r.bits & ~conf.bits) == 0 for r in records):
+         return 0
+      if any(r.result == Result.TRUE and (conf.bits & ~r.bits) == 0 for r in records):
+         return 1
+      near = nsmallest(NEIGHBOURS, records, key = lambda r: distance(r, conf))
+      w = sum(self.weight(r, conf) for r in near)
+      if w == 0:
+         return None
+      return sum(self.weight(r, conf) for r in near if r.result == Result.TRUE) / w
+
+   def memo(self, what, conf, timeout, predict):
+      if self.count != self.history.count:
+         self.known = {}
+         self.count = self.history.count
+      k = (what, conf.bits, timeout)
+      if not k in self.known:
+         self.known[k] = predict()
+      return self.known[k]
+
+   # Predicted cost of a job in seconds, None if unknown.
+   def cost(self, conf):
+      return self.memo("cost", conf, None, lambda: self.job_cost(conf))
+
+   def job_cost(self, conf):
+      d = [self.duration(q, conf) for q in self.queries]
+      d = [x for x in d if x != None]
+      if d == []:
+         return None
+      return max(d) if self.parallel else sum(d)
+
+   # Probability that a job is TRUE (all its queries are), None if unknown.
+   def verdict(self, conf):
+      return self.memo("verdict", conf, None, lambda: self.job_verdict(conf))
+
+   def job_verdict(self, conf):
+      p = [self.true(q, conf) for q in self.queries]
+      p = [x for x in p if x != None]
+      if p == []:
+         return None
+      true = 1
+      for x in p:
+         true *= x
+      return true
+
+   # Timeout of a job: a fraction of the given one if it will time out for sure, that is if a
+   # smaller configuration already needed the whole timeout for one of the queries (the vote
+   # of the nearest runs is not enough).
+   def timeout(self, conf, timeout):
+      if timeout == None or timeout == 0:
+         return timeout
+      return self.memo("timeout", conf, timeout, lambda: self.job_timeout(conf, timeout))
+
+   def job_timeout(self, conf, timeout):
+      for q in self.queries:
+         lower, upper = self.bounds(self.records(q), conf)
+         if lower >= timeout:
+            return max(timeout // PROBE, 1)
+      return timeout
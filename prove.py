@@ -1,27 +1,36 @@
 # This is a proof script for OPC UA on ProVerif, that performs a lattice exploration of the given configuration.
-# It calls opcua.py to generate the input files and launch ProVerif.
+# It uses opcua.py to generate the input files, then launches ProVerif.
 #
 # usage:
 #  $ python3 prove.py -q "3.2" -c "RSA|ECC, None|Sign|Encrypt, no_reopen, SNone|SSec, anon|pwd|cert, no_switch, lt_leaks" -t 300 -p 5 | tee results.txt
 #  $ cat results.txt
 
 from configurations import *
+import dependencies
+from cache import prover_version as cache_version, settings as prover_settings
+from cluster import Coordinator
+from explorer import Abort, Explorer, Job, Scheduler
+from history import History
+from lazy import LazyTrie
+from predictor import Predictor
+import snapshot
+from strategy import STRATEGIES
+from store import Store, STORE_FILE, is_store
+import opcua
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from hashlib import sha256
 from multiprocessing import Pool
 from os import urandom
 from re import search, split
-from subprocess import run, PIPE, STDOUT
+from subprocess import run
 from sys import stdout
-from threading import Thread
 from time import strptime
 
 
 HEADER    = "commit-info.txt"
 OUTPUT    = "log"
-CONF      = "tmp_conf"
-TARG      = "tmp_opcua"
 QUERY     = ""
 ERROR     = ""
 PROCESSES = 5
@@ -34,14 +43,29 @@ parser = ArgumentParser(
    description = 'launch proverif to prove a query on different configurations'
 )
 parser.add_argument('-c', '--config',     help='maximal configuration')
+parser.add_argument(      '--classes',    help='prove only one configuration of those that ProVerif cannot tell apart (see opcua.classes)', action='store_true')
+parser.add_argument(      '--escalate',   help='then test the unproved configurations again with twice the timeout, until it exceeds this one (in seconds), and finish with a final run', type=int)
+parser.add_argument('-e', '--engine',     help='lattice engine: "lazy" (default), "trie" or "dense" (requires NumPy)', choices=['lazy', 'trie', 'dense'], default='lazy')
 parser.add_argument('-f', '--final',      help='final run: we do not avoid configurations above one that has TIMED OUT', action='store_true')
 parser.add_argument('-g', '--git',        help='get git commit', action = 'store_true')
 parser.add_argument('-l', '--logs'       ,help='record complete proverif output', action = 'store_true')
+parser.add_argument(      '--no_cache',   help='do not use the cache of proof results', action='store_true')
+parser.add_argument(      '--no_predict', help='do not predict the running times: test the configurations in the order of the lattice, with the same timeout', action='store_true')
 parser.add_argument('-p', '--processes',  help='parallelize calls to proverif', type=int, const=PROCESSES, nargs='?')
 parser.add_argument('-q', '--query')
+parser.add_argument('-r', '--resume',     help='restart an interrupted run from its snapshot and the store of decisions', action='store_true')
+parser.add_argument(      '--sequential', help='prove the queries of a configuration one after the other', action='store_true')
+parser.add_argument(      '--snapshot',   help='snapshot of the run, to resume it (default: snapshot_QUERY.json)')
 parser.add_argument(      '--skip',       help='skip recomputing maximal TRUE or maximal FALSE configurations', action='store_true')
-parser.add_argument('-s', '--start',      help='last results file to start from')
+parser.add_argument(      '--serve',      help='run ProVerif on the workers that connect to this port (see cluster.py)', type=int)
+parser.add_argument(      '--bind',       help='address where --serve listens (default: localhost)', default='localhost')
+parser.add_argument(      '--token',      help='token that the workers of --serve must give (default: $PROVE_TOKEN, or a random one, printed)')
+parser.add_argument('-s', '--start',      help='last results file, or store of decisions, to start from')
+parser.add_argument(      '--store',      help='store of the decisions (default: ' + STORE_FILE + ')', default=STORE_FILE)
+parser.add_argument(      '--speculate',  help='test the configurations comparable to one being tested only speculatively, when no other is left (see explorer.py)', action='store_true')
+parser.add_argument(      '--strategy',   help='exploration strategy: "greedy" (default) walk of the lattice, "bisect" (binary search along chains) or "gain" (the configurations that decide the most first)', choices=list(STRATEGIES), default='greedy')
 parser.add_argument('-t', '--timeout',    help='timeout in seconds',  type=int)
+parser.add_argument('-w', '--watchdog',   help='limit the resident memory of ProVerif, instead of its address space', action='store_true')
 args = parser.parse_args()
 
 # Get commit:
@@ -54,22 +78,28 @@ else:
 # query and maximal configuration
 QUERY  = args.query
 print("Proving quer", end='')
-if  QUERY == "3.1.all":
-   QUERIES = ["3.1", "3.1.A", "3.1.B", "3.1.C", "3.1.D", "3.1.E", "3.1.axioms", "3.1.axioms.1", "3.1.conf"]
-   print("ies: " + ', '.join(QUERIES), end='')
-elif QUERY == "3.2.all":
-   QUERIES = ["3.2", "3.2.A", "3.2.axioms", "3.1.A", "3.1.C"]
-   if "ECC" in args.config:
-      QUERIES += ["3.1.axioms"]
+# the queries of a property are given by its dependencies (see dependencies.py)
+QUERIES = dependencies.queries(QUERY, args.config)
+if dependencies.composite(QUERY):
    print("ies: " + ', '.join(QUERIES), end='')
 else:
-   QUERIES = [QUERY]
    print("y: " + QUERY, end='')
 print(" in version " + REVISION)
 
-CONFIG = configuration.from_str(args.config)
-T = Trie.from_conf(CONFIG)
-if DEBUG:
+CONFIG = bitconf.from_str(args.config)
+if args.engine == 'dense':
+   from lattice import DenseTrie
+
+# The lazy engine builds the nodes of the lattice only when they are tested (see lazy.py).
+def lattice():
+   if args.engine == 'dense':
+      return DenseTrie.from_conf(CONFIG)
+   if args.engine == 'trie':
+      return Trie.from_conf(CONFIG)
+   return LazyTrie.from_conf(CONFIG)
+
+T = lattice()
+if DEBUG and args.engine == 'trie':
    Print_Trie(T)
 print("With maximal configuration: " + str(CONFIG))
 
@@ -90,18 +120,57 @@ else:
 # processes and memory
 # at most:   4 x 100 GiB during 2h or more
 # at least: 20 x  20 GiB during 7m or less
+# With several processes, the jobs are admitted according to the memory that they are predicted
+# to need from the history of the previous runs (see history.py and explorer.Scheduler), and a
+# job without prediction is counted for DATA_LIMIT. With --watchdog, the memory limit of a job
+# follows its prediction; otherwise it is DATA_LIMIT, on the address space of ProVerif.
 GiB = 1 # Gi Bytes
 if args.processes != None:
-   PROCESSES = min(args.processes, max(20 - 8*TIMEOUT // 3600, 4))
-   DATA_LIMIT = 4 * 100 * GiB // PROCESSES
+   PROCESSES = args.processes
+   DATA_LIMIT = 4 * 100 * GiB // min(PROCESSES, max(20 - 8*TIMEOUT // 3600, 4))
 else:
    PROCESSES = 1
    DATA_LIMIT = 15 * GiB
 
+# With several processes, the queries of a configuration are proved at the same time (at most
+# PROCESSES ProVerif in all): a job then needs the memory of all its queries, and each ProVerif
+# is limited to the memory predicted for its query.
+# With --serve, ProVerif runs on the workers (see cluster.py), that admit the runs according
+# to their own memory, and PROCESSES is the number of configurations tested at the same time.
+PARALLEL  = PROCESSES > 1 and len(QUERIES) > 1 and not args.sequential
+MODEL     = opcua.model_settings(reconstruct = False) # the options of the model in test()
+HISTORY   = History(model = MODEL)
+SCHEDULER = None
+if PROCESSES > 1 and args.serve == None:
+   SCHEDULER = Scheduler(lambda conf: HISTORY.memory_all(QUERIES, conf, PARALLEL), DATA_LIMIT,
+                         len(QUERIES) if PARALLEL else 1, watchdog = args.watchdog)
+if PARALLEL:
+   opcua.RUNNER = opcua.Runner(PROCESSES)
+   QUERY_POOL   = ThreadPoolExecutor(PROCESSES * len(QUERIES))
+CLUSTER = None
+if args.serve != None:
+   CLUSTER = Coordinator(args.serve, args.bind, args.token)
+
+# Stop a run of ProVerif
+def cancel_run(id):
+   if CLUSTER != None:
+      CLUSTER.cancel(id)
+   else:
+      opcua.default_runner().cancel(id)
+
+# A run that was cancelled before it started, and that will not be started
+def forget_run(id):
+   if CLUSTER != None:
+      CLUSTER.forget(id)
+   else:
+      opcua.default_runner().forget(id)
+
 
 print("Computations with a timeout of " + str(TIMEOUT) + " seconds and a limit of " + str(DATA_LIMIT) + " GiB", end='')
-if PROCESSES > 1:
-   print(' using ' + str(PROCESSES) + " parallel processes", end='')
+if SCHEDULER != None:
+   print(' using up to ' + str(PROCESSES) + " parallel processes within " + str(SCHEDULER.capacity // opcua.GiB) + " GiB", end='')
+if CLUSTER != None:
+   print(' on the workers that connect to port ' + str(args.serve), end='')
 print(".")
 
 DATE_OF_START = datetime.now()
@@ -119,7 +188,35 @@ MIN_CFG_LIST       = []
 MIN_FALSE_CFG_LIST = []
 MIN_OOM_CFG_LIST   = []
 
-if args.start != None and args.start != '':
+# The hash of the input files of ProVerif for the queries of a configuration, and the version
+# of ProVerif, that the store records with each decision. Rendering the files takes time: the
+# hash of each configuration is computed once (by the workers, see test).
+VERSION = cache_version("proverif")
+HASHES  = {} # bits -> hash
+
+def model_hash(conf):
+   h = HASHES.get(conf.bits)
+   if h == None:
+      h = sha256()
+      for query in QUERIES:
+         h.update(opcua.model_hash([query], str(conf), reconstruct = False).encode('utf-8'))
+      h = HASHES.setdefault(conf.bits, h.hexdigest())
+   return h
+
+# Is a decision of the store taken on the same model with the same ProVerif?
+def current(bits, hash, version):
+   return version == VERSION and hash == model_hash(bitconf(bits))
+
+if args.start != None and args.start != '' and is_store(args.start):
+   # the decisions of the previous runs of this campaign, on the same model with the same ProVerif
+   start = Store(args.start)
+   MIN_CFG_LIST, MIN_OOM_CFG_LIST, MIN_FALSE_CFG_LIST, MAX_CFG_LIST = \
+      start.resume(QUERY, CONFIG, args.skip, current)
+   if start.ignored > 0:
+      print("Warning: " + str(start.ignored) + " decisions of " + args.start +
+            " are ignored, they were taken on another model or with another version of ProVerif.")
+
+elif args.start != None and args.start != '':
    with open(args.start, "r") as f:
 
       # We want to start our new computations from the minimal UNPROVED configurations,
@@ -132,9 +229,9 @@ if args.start != None and args.start != '':
          comma = line.find(':')
          if (args.skip and line.find('MEM_OUT') != -1):
             t = get_time (line[comma+9:-1].replace(' ', ''))
-            MIN_OOM_CFG_LIST += [( configuration.from_str(line[:comma]), timedelta(hours=t.tm_hour, minutes=t.tm_min, seconds=t.tm_sec) )]
+            MIN_OOM_CFG_LIST += [( bitconf.from_str(line[:comma]), timedelta(hours=t.tm_hour, minutes=t.tm_min, seconds=t.tm_sec) )]
          else:
-            MIN_CFG_LIST += [configuration.from_str(line[:comma])]
+            MIN_CFG_LIST += [bitconf.from_str(line[:comma])]
          line = f.readline()
 
       # Then either we skip or we retest the minimal FALSE (or CANNOT BE PROVED) configurations
@@ -149,7 +246,7 @@ if args.start != None and args.start != '':
          else:
             result = Result.CANNOT
          t = get_time (line[comma+8:-1].replace(' ', ''))
-         MIN_FALSE_CFG_LIST += [( configuration.from_str(line[:comma]), result, timedelta(hours=t.tm_hour, minutes=t.tm_min, seconds=t.tm_sec) )]
+         MIN_FALSE_CFG_LIST += [( bitconf.from_str(line[:comma]), result, timedelta(hours=t.tm_hour, minutes=t.tm_min, seconds=t.tm_sec) )]
          line = f.readline()
 
       # Then either we skip or we retest the maximal TRUE configurations
@@ -160,12 +257,14 @@ if args.start != None and args.start != '':
          comma = line.find(': TRUE')
          end_of_line = line[comma+6:-1].replace(' ', '')
          t = get_time(end_of_line)
-         MAX_CFG_LIST += [( configuration.from_str(line[:comma]), timedelta(hours=t.tm_hour, minutes=t.tm_min, seconds=t.tm_sec) )]
+         MAX_CFG_LIST += [( bitconf.from_str(line[:comma]), timedelta(hours=t.tm_hour, minutes=t.tm_min, seconds=t.tm_sec) )]
          line = f.readline()
 
 
 
-# call "opcua.py" to generate the files and call proverif, then parse the results.
+# use "opcua.py" to generate the files, call proverif, then parse the results.
+# Results already known from this run or an earlier one are taken from the cache (see cache.py).
+CACHE = None if args.no_cache else opcua.Cache()
 
 def SHA256(m):
     ctx = sha256()
@@ -176,24 +275,33 @@ def SHA256(m):
        s += hex(int(b))[2:]
     return s
 
-def run_proverif(query, config, timeout):
+# memory limit of ProVerif for a query of the job, in GiB
+def query_limit(query, job):
+   if PARALLEL and SCHEDULER != None:
+      return SCHEDULER.limit_of(HISTORY.memory(query, job.conf))
+   return job.limit or DATA_LIMIT
+
+def run_proverif(query, job):
    global REVISION
    global ERROR
-   config = str(config)
+   config = str(job.conf)
+   timeout = job.timeout
    t = datetime.now()
    random_ext = f"_{query}_" + SHA256(config) # t.strftime("_%Y-%m-%d-%Hh%Mm%Ss%f")
    outfile = open(OUTPUT + random_ext + ".txt", "w")
    outfile.write("TEST CASE:\nQuery: " + query + "\nConfiguration: " + config + "\n")
    outfile.flush()
-   result = Result.MEM_OUT # Out of Memory is the worst case, because we may not be able to get an output file, nor clean the temporary files.
    separator = query + ": " + config + ': '
+   limit = query_limit(query, job)
    try:
-      prover  = ['python3', 'opcua.py', '-q', query, '-c', config, '-l', str(DATA_LIMIT)]
-      prover += ['-t', str(timeout)] if timeout != 0 else []
-      prover += ['-r', random_ext, '--no_reconstruction']
       t = datetime.now()
-      p = run(prover, check=True, stdout=PIPE, stderr=STDOUT, encoding='utf-8')
-      d = datetime.now() - t
+      p = opcua.prove([query], config, timeout if timeout != 0 else None, limit,
+                      rnd_ext = random_ext, renderer = RENDERER, cache = CACHE, job_id = (job.id, query),
+                      history = HISTORY, watchdog = args.watchdog, early_abort = True,
+                      executor = CLUSTER.execute if CLUSTER != None else None,
+                      log = outfile if args.logs else None, reconstruct = False)
+      d = p.duration
+      job.peak = max(job.peak or 0, p.peak or 0) or None
 
    except Exception as e:
       d = datetime.now() - t
@@ -202,98 +310,228 @@ def run_proverif(query, config, timeout):
       outfile.write(error +"\n")
       outfile.flush()
       outfile.close()
-      _ = run(['rm', '-f', CONF+random_ext+".pvl", TARG+random_ext+".pv"])
       return Result.ERROR, d
 
-   if "Out of time!" in p.stdout:
-      d = datetime.now() - t
-      error = "OOT ERROR >" + format_time(d)
+   if p.result == Result.CANCELLED:
+      print(separator + "cancelled after" + format_time(d))
+      outfile.write("CANCELLED\n")
+      outfile.close()
+      return Result.CANCELLED, d
+
+   cached = " (cached)" if p.cached else ""
+   if not p.cached:
+      outfile.write("Resources: " + p.telemetry() + "\n")
+   if p.result == Result.TIMEOUT:
+      error = "OOT ERROR >" + format_time(d) + cached
       print(separator + error)
       outfile.write(error +"\n")
       outfile.flush()
       outfile.close()
-      _ = run(['rm', '-f', CONF+random_ext+".pvl", TARG+random_ext+".pv"])
       return Result.TIMEOUT, d
 
-   n = p.stdout.find("Verification summary:\n")
-   if n > 0:
-      m = p.stdout.find("\n\n--------------------------------------------------------------", n)
-      results = split(" - Query",  p.stdout[n+35:m])
-      result = Result.UNKNOWN
-      for res in results[1:]:
-         r = search("is true.|is false.|cannot be proved.", res)
-         if r == None:
-            print(separator + "Internal error")
-            result = Result.ERROR
-            ERROR = "Error while parsing ProVerif’s output"
-            break
-         elif r.group(0) == "is true.":
-            print(separator + "true", end='')
-            separator = ', '
-            # for the result to be true all queries must be true.
-            if result == Result.UNKNOWN: # unchanged if result == Result.TRUE
-               result = Result.TRUE
-         elif r.group(0) == "is false.":
-            print(separator + "FALSE", end='')
-            separator = ', '
-            result = Result.FALSE
-         elif r.group(0) == "cannot be proved.":
-            print(separator + "?????", end = '')
-            separator = ','
-            if result != Result.FALSE:
-               result = Result.CANNOT
-
-   if result == Result.MEM_OUT:
-      r = search("Error:.*.", p.stdout)
-      if r != None:
+   # ProVerif crashed (without running out of memory, and without rejecting the model): this
+   # configuration is tested again, and reported if it keeps crashing (see Explorer.ATTEMPTS)
+   if p.crashed() and p.verdicts == None and not p.rejected():
+      error = "CRASH (" + p.telemetry() + ")"
+      print(separator + error)
+      outfile.write(error + "\n" + p.output[-10000:])
+      outfile.close()
+      return Result.ERROR, d
+
+   result = p.result
+   for v in p.verdicts or []:
+      if v == None:
+         print(separator + "Internal error")
+         ERROR = "Error while parsing ProVerif’s output"
+         break
+      elif v == Result.TRUE:
+         print(separator + "true", end='')
+         separator = ', '
+      elif v == Result.FALSE:
+         print(separator + "FALSE", end='')
+         separator = ', '
+      elif v == Result.CANNOT:
+         print(separator + "?????", end = '')
+         separator = ','
+
+   if p.verdicts == None:
+      if result == Result.ERROR:
          print(separator + "ERROR", end='')
-         result = Result.ERROR
       else:
          print(separator + "OOM ERROR", end = '')
-         result = Result.MEM_OUT
 
    if result == Result.ERROR or result == Result.UNKNOWN:
-      print("\nERROR: opcua.py says: <<\n" + p.stdout[-1000:] + ">> Unable to parse. Aborting.\n")
-      raise
+      print("\nERROR: ProVerif says: <<\n" + p.output[-1000:] + ">> Unable to parse. Aborting.\n")
+      outfile.close()
+      raise Abort("ProVerif failed on " + query + ": " + config)
 
    # running time
-   print(format_time(d))
-   # logs
-   if args.logs:
-      outfile.write(p.stdout)
-   else:
-      outfile.write(p.stdout[n:]) # restricted logs
+   print(format_time(d) + cached)
+   # restricted logs, the complete ones were copied during the run
+   if not args.logs:
+      outfile.write(p.summary())
    outfile.close()
-   _ = run(['rm', '-f', "tmp_conf"+random_ext+".pvl", "tmp_opcua"+random_ext+".pv"])
    return result, d
 
 
-def test(config, timeout):
+# Is the result of the query known without running ProVerif: from the cache (e.g. a query
+# shared with another property), or because it is false below the configuration?
+def settled(query, job):
+   if HISTORY.refuted(query, job.conf):
+      return True
+   return CACHE != None and \
+          opcua.lookup([query], str(job.conf), CACHE, job.timeout if job.timeout != 0 else None,
+                       query_limit(query, job), RENDERER, partial = True, reconstruct = False) != None
+
+# The settled queries go first, then the fastest ones, then the lemmas before the properties
+# that depend on them.
+def order(queries, job, known):
+   def key(query):
+      d = HISTORY.duration(query, job.conf)
+      return (not query in known, d == None, d or 0, dependencies.height(query))
+   return sorted(queries, key = key)
+
+# A configuration is TRUE if all the queries are true: we stop at the first one that is not.
+def test(job):
+   try:
+      model_hash(job.conf) # for the journal, see journal
+      return test_queries(job)
+   finally:
+      # the queries that were not run may have been cancelled
+      for query in QUERIES:
+         forget_run((job.id, query))
+
+def test_queries(job):
    global QUERIES
    result = Result.TRUE
    duration = timedelta(seconds=0)
-   for query in QUERIES:
-      result, d = run_proverif(query, config, timeout)
+   known = [query for query in QUERIES if settled(query, job)]
+   queries = order(QUERIES, job, known)
+   # the settled queries are taken alone first: they may decide the configuration at once
+   while queries != [] and (not PARALLEL or queries[0] in known):
+      result, d = run_proverif(queries.pop(0), job)
       duration += d
       if result != Result.TRUE:
-         break
-   return result, duration
-
-
-def mark_trie(cfg_lst, result, duration):
-   if result == Result.TRUE:
-      T.mark(cfg_lst, result, duration)
-      T.delete_inf(cfg_lst, result)
-      T.unmark_inf(cfg_lst)
-   elif result == Result.FALSE or result == Result.CANNOT or result == Result.MEM_OUT or\
-       (result == Result.TIMEOUT and not args.final):
-      T.mark(cfg_lst, result, duration)
-      T.delete_sup(cfg_lst, result)
-      T.unmark_sup(cfg_lst)
-   elif result == Result.TIMEOUT and args.final:
-      T.mark(cfg_lst, result, duration)
-      T.unmark_sup(cfg_lst)
-
+         return result, duration
+   if queries == []:
+      return result, duration
+
+   # the queries are submitted in order, the runner starts them as processes are free
+   running = {QUERY_POOL.submit(run_proverif, query, job): query for query in queries}
+   cancelled = False
+   decisive = timedelta(seconds=0)
+   while running != {}:
+      done, _ = wait(running, return_when = FIRST_COMPLETED)
+      for f in done:
+         running.pop(f)
+         try:
+            r, d = f.result()
+         except Abort:
+            # the campaign stops: so do the other queries of the configuration
+            for g, query in running.items():
+               g.cancel()
+               cancel_run((job.id, query))
+            raise
+         if r == Result.CANCELLED:
+            cancelled = True
+         elif r == Result.TRUE:
+            duration += d
+         # a FALSE (or CANNOT) result is better than a TIMEOUT found meanwhile
+         elif result == Result.TRUE or (r in [Result.FALSE, Result.CANNOT] and \
+                                        not result in [Result.FALSE, Result.CANNOT]):
+            if result == Result.TRUE:
+               for query in running.values():
+                  cancel_run((job.id, query))
+            result = r
+            decisive = d
+   if cancelled and result == Result.TRUE:
+      result = Result.CANCELLED
+   return result, duration + decisive
+
+
+# The input files of the next configurations are rendered in the background while ProVerif runs.
+RENDERER = opcua.Prerenderer(depth = 2 * PROCESSES * len(QUERIES))
+
+def prefetch(confs):
+   for conf in confs:
+      for query in QUERIES:
+         RENDERER.submit([query], str(conf), reconstruct = False)
+
+# The explorer is the only one to update the Trie, the threads only run the tests.
+# Tests made useless by the results of other tests are cancelled.
+def cancel(id):
+   for query in QUERIES:
+      cancel_run((id, query))
+
+# The running times predicted from the history order the configurations, and those that will
+# time out for sure get a short timeout (see predictor.py).
+PREDICTOR = None
+if not args.no_predict:
+   PREDICTOR = Predictor(HISTORY, QUERIES, PARALLEL, prover_settings(opcua.prover("", "")[:-3]), MODEL)
+
+E = Explorer(T, test, PROCESSES, TIMEOUT, args.final, prefetch, cancel, SCHEDULER, PREDICTOR,
+             STRATEGIES[args.strategy]())
+E.speculate = args.speculate
+
+# Every result is recorded in the store as soon as it is known.
+STORE = Store(args.store)
+
+def journal(job):
+   if job.result in [Result.ERROR, Result.UNKNOWN, Result.CANCELLED]:
+      return
+   STORE.record(QUERY, job.conf, job.result, job.timeout, job.duration, job.peak, model_hash(job.conf),
+                VERSION, E.final)
+
+E.journal = journal
+
+# The state of the run is saved regularly, to restart it after a crash (see snapshot.py),
+# and the progress of the exploration is printed at the same time.
+SNAPSHOT_FILE = args.snapshot or snapshot.file_name(QUERY)
+
+def state():
+   print("-- " + datetime.now().strftime("%H:%M") + ": " + E.progress() + ".")
+   s = E.state()
+   s["query"]   = QUERY
+   s["config"]  = str(CONFIG)
+   s["journal"] = STORE.last(QUERY)
+   return s
+
+E.checkpoint = snapshot.Snapshots(SNAPSHOT_FILE, state)
+
+# Configurations whose input files are the same for all the queries, once the library keeps
+# only what the model uses, get the same result: they are proved once and marked together.
+if args.classes:
+   E.classes = opcua.classes([c for c, r, t, min, max in T.configurations() if r == Result.UNKNOWN],
+                             QUERIES, PROCESSES, reconstruct = False)
+   print(str(len(set(map(id, E.classes.values())))) + " classes of input files for " + str(len(E.classes)) + " configurations.")
+
+# Restart from the snapshot, then replay the decisions recorded after it.
+# A TIMEOUT recorded with a smaller timeout than the current one belongs to a previous round.
+RESUMED = False
+if args.resume:
+   s = snapshot.load(SNAPSHOT_FILE)
+   if s == None:
+      print("No snapshot " + SNAPSHOT_FILE + ": starting from scratch.")
+   elif s["query"] != QUERY or s["config"] != str(CONFIG):
+      print("Error: the snapshot " + SNAPSHOT_FILE + " is for " + s["query"] + " in " + s["config"] + ".")
+      exit(1)
+   else:
+      RESUMED = True
+      E.restore(s)
+      replayed = 0
+      for bits, result, timeout, duration in STORE.since(QUERY, s["journal"], current):
+         if result == Result.TIMEOUT and timeout != None and 0 < timeout < E.timeout:
+            continue
+         if E.T.find(bitconf(bits)):
+            E.mark(bitconf(bits), result, duration)
+            replayed += 1
+      TIMEOUT = E.timeout
+      print("Resuming from " + SNAPSHOT_FILE + " (round " + str(E.round) + ", timeout " + str(E.timeout) + " seconds): " +
+            str(len(s["facts"]) + len(s["timeouts"])) + " results, " + str(replayed) + " replayed from the store, " +
+            str(len(s["pending"])) + " configurations to test again.")
+      if STORE.ignored > 0:
+         print("Warning: " + str(STORE.ignored) + " decisions of " + args.store +
+               " are not replayed, they were taken on another model or with another version of ProVerif.")
 
 # Skip the previous results:
 if args.skip and args.start != None:
@@ -304,9 +542,8 @@ if args.skip and args.start != None:
    while MIN_FALSE_CFG_LIST != []:
       min_cfg, result, duration = MIN_FALSE_CFG_LIST.pop(0)
       debug(str(min_cfg) + " " + str(result) + " " + str(duration))
-      cfg_lst = elem_list_from(min_cfg)
-      if T.find(cfg_lst):
-         mark_trie(cfg_lst, result, duration)
+      if T.find(min_cfg):
+         E.mark(min_cfg, result, duration)
 
    # Get rid of maximal TRUE configurations
    if MAX_CFG_LIST != []:
@@ -314,9 +551,8 @@ if args.skip and args.start != None:
    while MAX_CFG_LIST != []:
     max_cfg, duration = MAX_CFG_LIST.pop(0)
     debug(str(max_cfg) + " " + str(duration))
-    cfg_lst = elem_list_from(max_cfg)
-    if T.find(cfg_lst):
-       mark_trie(cfg_lst, Result.TRUE, duration)
+    if T.find(max_cfg):
+       E.mark(max_cfg, Result.TRUE, duration)
 
    # Get rid of Out of Memory configurations
    if MIN_OOM_CFG_LIST != []:
@@ -324,130 +560,53 @@ if args.skip and args.start != None:
    while MIN_OOM_CFG_LIST != []:
       oom_cfg, duration = MIN_OOM_CFG_LIST.pop(0)
       debug(str(oom_cfg) + " " + str(duration))
-      cfg_lst = elem_list_from(oom_cfg)
-      if T.find(cfg_lst):
-         mark_trie(cfg_lst, Result.MEM_OUT, duration)
+      if T.find(oom_cfg):
+         E.mark(oom_cfg, Result.MEM_OUT, duration)
 
 # Start from a known high configuration, without timeout:
-if not args.skip and not args.final:
+if not args.skip and not args.final and not RESUMED:
    entry = input("Enter a configuration to start from, without timeout, or simply press ENTER: ")
    if entry != "":
-      input_cfg = configuration.from_str(entry)
-      cfg_lst = elem_list_from(input_cfg)
-      if T.find(cfg_lst):
+      input_cfg = bitconf.from_str(entry)
+      if T.find(input_cfg):
          # Starting from a supposed maximal true configuration we hope to prune down the Trie.
          debug(str(input_cfg) + " no timeout!")
-         if T.reserve(cfg_lst):
-            result, duration = test(configuration.from_list(cfg_lst), 0)
-            mark_trie(cfg_lst, result, duration)
-            if result == Result.FALSE   or result == Result.CANNOT or\
-               result == Result.TIMEOUT or result == Result.MEM_OUT:
-               print("Warning: this input configuration is not true! ")
+         E.run([Job(input_cfg, 0, expected = Result.TRUE, warning = "Warning: this input configuration is not true! ")])
       else:
          print("Sorry, the input configuration is not included in the maximal configuration!\n")
 
 # --- Prover's loop: ---
 
-def test_loop_A():
-   result = Result.UNKNOWN
-   finished = False
-   cfg_lst = []
-   while not finished:
-      # start with false (or cannot be proved) configurations
-      if cfg_lst == [] and MIN_FALSE_CFG_LIST != []:
-        min_cfg, result, duration = MIN_FALSE_CFG_LIST.pop(0)
-        debug(str(min_cfg) + " " + str(result) + " " + str(duration))
-        cfg_lst = elem_list_from(min_cfg)
-        if T.reserve(cfg_lst):
-           result, duration = test(min_cfg, max(2*duration.seconds, TIMEOUT))
-           mark_trie(cfg_lst, result, duration)
-           if result == Result.TRUE:
-              print("Warning: this supposed minimal false configuration above is now TRUE! ")
-
-      # Then starting from known proved maximal configurations we prune down the Trie.
-      elif cfg_lst == [] and MAX_CFG_LIST != []:
-        max_cfg, duration = MAX_CFG_LIST.pop(0)
-        debug(str(max_cfg) + " " + str(duration))
-        cfg_lst = elem_list_from(max_cfg)
-        if T.reserve(cfg_lst):
-           result, duration = test(configuration.from_list(cfg_lst), max(2*duration.seconds, TIMEOUT))
-           mark_trie(cfg_lst, result, duration)
-           if result == Result.FALSE   or result == Result.CANNOT or\
-              result == Result.TIMEOUT or result == Result.MEM_OUT:
-              print("Warning: this supposed maximal true configuration above is not true anymore! ")
-      # Nothing left to be done.
-      else:
-         finished = True
-      cfg_lst = []
-
-
-def test_loop_B():
-   result = Result.UNKNOWN
-   finished = False
-   cfg_lst = []
-   while not finished:
-      # Starting from known minimal unproved configurations, we prune up the Trie
-      # and hope to prune it down if we manage to prove the property in a new configuration.
-      if cfg_lst == [] and MIN_CFG_LIST != []:
-        min_cfg = MIN_CFG_LIST.pop(0)
-        debug(str(min_cfg));
-        cfg_lst = elem_list_from(min_cfg)
-        if T.reserve(cfg_lst):
-           result, duration = test(min_cfg, TIMEOUT)
-           mark_trie(cfg_lst, result, duration)
-           while result == Result.TRUE:
-              cfg_lst = T.mutate_up(cfg_lst)
-              if (cfg_lst == None or cfg_lst == []):
-                 break
-              if T.reserve(cfg_lst):
-                 result, duration = test(configuration.from_list(cfg_lst), TIMEOUT)
-                 mark_trie(cfg_lst, result, duration)
-              else:
-                 break
-
-      # In the end, we directly pick a configuration from the trie.
-      elif cfg_lst == [] and not T.is_void():
-         cfg_lst = T.first()
-         debug("First configuration of the Trie: " + str(cfg_lst))
-         if cfg_lst == []:
-            finished = True
-            break
-         if T.reserve(cfg_lst):
-            result, duration = test(configuration.from_list(cfg_lst), TIMEOUT)
-            mark_trie(cfg_lst, result, duration)
-
-      # Nothing left to be done.
-      else:
-         finished = True
-
-      # Should we try to mutate up or down?
-      cfg_lst = []
-
+if args.processes != None:
+   print("-- loop A: false and known proved configurations.")
 
-# --- Threading ----
+# start with false (or cannot be proved) configurations,
+# then starting from known proved maximal configurations we prune down the Trie.
+jobs = []
+for min_cfg, result, duration in MIN_FALSE_CFG_LIST:
+   jobs += [Job(min_cfg, max(2*duration.seconds, TIMEOUT), expected = Result.FALSE,
+                warning = "Warning: this supposed minimal false configuration above is now TRUE! ")]
+for max_cfg, duration in MAX_CFG_LIST:
+   jobs += [Job(max_cfg, max(2*duration.seconds, TIMEOUT), expected = Result.TRUE,
+                warning = "Warning: this supposed maximal true configuration above is not true anymore! ")]
+E.run(jobs)
 
-#Print_Trie(T)
-tasks = []
 if args.processes != None:
-   print("-- loop A: false and known proved configurations.")
-   for i in range(PROCESSES):
-      t = Thread(target = test_loop_A)
-      t.start()
-      tasks += [t]
-   while tasks != []:
-      t = tasks.pop()
-      t.join()
    print("-- loop B: unproved configurations.")
-   for i in range(PROCESSES):
-      t = Thread(target = test_loop_B)
-      t.start()
-      tasks += [t]
-   while tasks != []:
-      t = tasks.pop()
-      t.join()
+
+# Starting from known minimal unproved configurations, we prune up the Trie
+# and hope to prune it down if we manage to prove the property in a new configuration.
+# In the end, we directly pick a configuration from the trie.
+# With --escalate, the unproved configurations are then tested again with larger timeouts,
+# in the same run (see Explorer.escalate).
+jobs = [Job(min_cfg, TIMEOUT, chain = True) for min_cfg in MIN_CFG_LIST]
+if args.escalate != None:
+   E.escalate(lattice, args.escalate, jobs)
 else:
-   test_loop_A()
-   test_loop_B()
+   E.run(jobs, use_first = True)
+T = E.T
+TIMEOUT = E.timeout
+E.checkpoint(force = True)
 
 # --- results: ---
 
@@ -459,14 +618,25 @@ run_info = " for " + QUERY
 if args.git:
    run_info += " in version " + REVISION[:7]
 run_info += ", as of " + day
+def print_frontier(frontier):
+   for conf, result, time in frontier:
+      print(str(conf) + ": " + str(result)[7:] + " " + format_time(time))
+
+MIN_UNPROVED, MIN_FALSE, MAX_TRUE = E.frontier()
 print("\nMinimal configurations:")
-Print_Min_Trie(T)
+print_frontier(MIN_UNPROVED)
 print("\nMinimal FALSE configurations" + run_info + ":")
-Print_False_Trie(T)
+print_frontier(MIN_FALSE)
 # Greatest configuration with TRUE
 print("\nMaximal configurations (<", end='')
 print(format_time(timedelta(hours=(TIMEOUT//3600), seconds=TIMEOUT%3600)) +")" + run_info + ":")
-Print_Max_Trie(T)
+print_frontier(MAX_TRUE)
+
+# Configurations that could not be tested (see Explorer.ATTEMPTS)
+ERRORS = E.errored()
+if ERRORS != []:
+   print("\nConfigurations with errors (" + str(E.ATTEMPTS) + " attempts)" + run_info + ":")
+   print_frontier(ERRORS)
 
 print("\nTotal time: " + format_time(now - DATE_OF_START) + run_info, end='')
 if args.processes != None:
@@ -1,13 +1,16 @@
-# This script calls opuca.py to make proofs on security properties over the model of the OPC UA protocol with ProVerif.
+# This script uses opcua.py to make proofs on security properties over the model of the OPC UA protocol with ProVerif.
 # usage :
 #  $ python3 reproduce_proofs.py -q <property> -c <configuration>
+# Several properties, separated by commas, share the proofs of their common queries.
 
 
+from configurations import Result
+import dependencies
+import opcua
+
 from argparse import ArgumentParser
 from datetime import datetime, timedelta
 from os import remove
-from re import search, split
-from subprocess import run, PIPE, STDOUT
 import sys
 
 DEBUG = False
@@ -20,10 +23,11 @@ TIMEOUT = 0 # No timeout by default
 # Parse arguments:
 parser = ArgumentParser(
    prog = 'reproduce_proofs.py',
-   description = "This script calls opuca.py to make proofs on security properties over the model of the OPC UA protocol with ProVerif."
+   description = "This script uses opcua.py to make proofs on security properties over the model of the OPC UA protocol with ProVerif."
 )
 parser.add_argument('-c', '--config')
 parser.add_argument('-l', '--limit')
+parser.add_argument(      '--no_cache', help='do not use the cache of proof results', action='store_true')
 parser.add_argument('-q', '--query')
 parser.add_argument('-r', '--reverse', action='store_true')
 parser.add_argument('-t', '--timeout')
@@ -36,25 +40,22 @@ if args.limit:
 if args.timeout:
    TIMEOUT = int(args.timeout)
    
-# Queries
-if args.query == "Agr-[S->C]":
-   query_list = ["3.1", "3.1.A", "3.1.B", "3.1.C", "3.1.D", "3.1.E", "3.1.axioms", "3.1.axioms.1", "3.1.conf"]
-   SHORT = True
-elif args.query == "Agr-[C->S]":
-   query_list = ["3.2", "3.2.A", "3.2.axioms", "3.1.A", "3.1.C"]
-   if "ECC" in args.config:
-      query_list += ["3.1.axioms"]
-   SHORT = True
-elif args.query in ["Conf[C]", "Conf[S]", "Conf[Pwd]"]:
-   query_list = [args.query]
-else:
-   print("Unknown property.")
-   exit(1)
+# Queries, from their dependencies (see dependencies.py): each query shared by the properties
+# is proven once
+properties = args.query.split(",")
+for property in properties:
+   if not property in ["Agr-[S->C]", "Agr-[C->S]", "Conf[C]", "Conf[S]", "Conf[Pwd]"]:
+      print("Unknown property: " + property)
+      exit(1)
+query_list = dependencies.union(properties, args.config)
+SHORT = len(properties) > 1 or dependencies.composite(properties[0])
 if args.reverse:
    query_list.reverse()
 # Configuration
 if SHORT:
    print("Config: " + args.config)
+# Cache of proof results (see cache.py)
+CACHE = None if args.no_cache else opcua.Cache()
 
 def select(query):
    global QUERY
@@ -75,55 +76,49 @@ def test(config):
    outfile.write("TEST CASE:\nQuery: " + QUERY + "\nConfiguration: " + config + "\n\n")
    outfile.flush()
    try:
-      t = datetime.now()
-      exe = ["python3", "opcua.py", '-q', QUERY, '-c', config, '-l', str(LIMIT), '-r', random_ext]
-      exe += ["--no_reconstruction"]
-      if TIMEOUT > 0:
-         exe += ['-t', str(TIMEOUT)]
       if DEBUG:
-         print(exe)
-      p = run(exe, check=True, stdout=PIPE, stderr=STDOUT, encoding='utf-8')
-      d = datetime.now() - t
+         print(QUERY, config, LIMIT, TIMEOUT)
+      p = opcua.prove([QUERY], config, TIMEOUT if TIMEOUT > 0 else None, LIMIT,
+                      rnd_ext = random_ext, cache = CACHE, reconstruct = False)
+      d = p.duration
 
    except Exception as error:
       runtime = 'ERROR'
       print(runtime)
       outfile.flush()
       outfile.close()
-      return
+      return Result.ERROR
 
+   if not p.cached:
+      outfile.write("Resources: " + p.telemetry() + "\n")
    # parse result
-   n = p.stdout.find("Verification summary:\n")
-   if n < 1:
-      if "Error:" in p.stdout:
+   if p.verdicts == None:
+      if p.result == Result.ERROR:
          print("ERROR", end='')
-         outfile.write(p.stdout)
+         outfile.write(p.output)
          outfile.close()
-      elif "Out of time!" in p.stdout:
+      elif p.result == Result.TIMEOUT:
          print("OOT >", end = '')
          outfile.close()
          remove(outfile.name)
       else:
          print("OOM > " + str(LIMIT), end = ' GiB')
-         outfile.write(p.stdout[-10000:])
+         outfile.write(p.output[-10000:])
          outfile.write("\nOut of memory!\n")
          outfile.close()
    else:
-      m = p.stdout.find("\n\n--------------------------------------------------------------", n)
-      results = split(" - Query",  p.stdout[n+35:m])
       separator = ''
-      for result in results:
-         r = search("is true.|is false.|cannot be proved.", result)
-         if r == None:
+      for v in p.verdicts:
+         if v == None:
             continue
-         elif r.group(0) == "is true.":
+         elif v == Result.TRUE:
             print(separator + "true", end='')
-         elif r.group(0) == "is false.":
+         elif v == Result.FALSE:
             print(separator + "FALSE", end='')
-         elif r.group(0) == "cannot be proved.":
+         elif v == Result.CANNOT:
             print(separator + "????", end = '')
          separator = ', '
-      outfile.write(p.stdout[n:])
+      outfile.write(p.summary())
       outfile.close()
 
    # running time
@@ -132,10 +127,18 @@ def test(config):
       runtime = D.strftime(" %Hh %Mm")
    else:
       runtime = D.strftime(" %Mm %Ss")
-   print(runtime)
+   print(runtime + (" (cached)" if p.cached else ""))
+   return p.result
 
 # ------------------------------------------------
 
+results = {}
 for query in query_list:
    select(query)
-   test(args.config)
+   results[query] = test(args.config)
+
+# the properties, from the results of their queries
+if SHORT:
+   for property in properties:
+      r = dependencies.derive(property, args.config, results)
+      print(property + ": " + ("proven" if r == Result.TRUE else r.name))
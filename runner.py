@@ -0,0 +1,302 @@
+# Asynchronous runner of ProVerif processes (see opcua.run_prover).
+# The runner owns every process it starts: an event loop, in its own thread, starts them in
+# their own process group, streams their output to a file (and to an optional callback, line
+# by line) instead of keeping it in memory, kills the whole group when the job runs out of time
+# or is cancelled, and reaps the process with wait4 to get its resource usage.
+#
+# The memory of a process is limited either by its address space (RLIMIT_AS), or, with the
+# watchdog, by the resident memory of its process tree, sampled from /proc (Linux only).
+#
+# It can be used from ordinary threads:
+#  r = Runner(processes = 4)
+#  run = r.run("job 1", ["proverif", "-lib", "tmp_conf.pvl", "tmp_opcua.pv"], timeout = 60, output = "out.txt")
+# and a job can be cancelled from any thread with r.cancel("job 1").
+
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+import os
+from os import close, killpg, wait4, waitstatus_to_exitcode, WIFSIGNALED
+import platform
+import resource
+from signal import SIGKILL
+from subprocess import Popen, PIPE, STDOUT, DEVNULL
+from threading import Lock, Thread
+
+GiB = 1024*1024*1024 # Bytes
+CHUNK = 1 << 16
+WATCH_PERIOD = 0.5 # seconds between two samples of the watchdog
+ENDED = 1 << 12 # ended jobs remembered, to ignore their late cancellations
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+# Processes of the tree rooted at pid
+def process_tree(pid):
+   tree = [pid]
+   i = 0
+   while i < len(tree):
+      try:
+         for task in os.listdir("/proc/" + str(tree[i]) + "/task"):
+            with open("/proc/" + str(tree[i]) + "/task/" + task + "/children", "r") as f:
+               tree += [int(c) for c in f.read().split()]
+      except OSError:
+         pass
+      i += 1
+   return tree
+
+# Resident memory of the tree rooted at pid, in bytes
+def tree_rss(pid):
+   rss = 0
+   for p in process_tree(pid):
+      try:
+         with open("/proc/" + str(p) + "/statm", "r") as f:
+            rss += int(f.read().split()[1]) * PAGE_SIZE
+      except (OSError, IndexError, ValueError):
+         pass
+   return rss
+
+
+# A process run by the runner
+class Run:
+   def __init__(self, id, exe):
+      self.id        = id
+      self.exe       = exe
+      self.pid       = None
+      self.status    = None  # exit code, negative if killed by a signal
+      self.signaled  = False
+      self.usage     = None  # resource usage, from wait4
+      self.duration  = None
+      self.timed_out = False
+      self.cancelled = False
+      self.memory_exceeded = False # killed by the watchdog
+      self.rss_peak  = None # largest resident memory of the tree seen by the watchdog, in bytes
+
+   # CPU time of the process in seconds
+   def user(self):
+      return None if self.usage == None else self.usage.ru_utime
+
+   def system(self):
+      return None if self.usage == None else self.usage.ru_stime
+
+   # signal that killed the process, None if it exited
+   def signal(self):
+      return -self.status if self.signaled else None
+
+   def exit_code(self):
+      return None if self.signaled else self.status
+
+   # peak memory (resident set size) in bytes
+   def peak(self):
+      if self.usage == None:
+         return self.rss_peak
+      return max(self.usage.ru_maxrss * (1 if platform.system() == "Darwin" else 1024), self.rss_peak or 0)
+
+
+class Runner:
+
+   # At most `processes` processes at the same time (None: no limit).
+   def __init__(self, processes = None):
+      self.processes = processes
+      self.loop      = asyncio.new_event_loop()
+      self.thread    = Thread(target = self.loop.run_forever, daemon = True)
+      self.thread.start()
+      self.semaphore = None if processes == None else \
+                       asyncio.run_coroutine_threadsafe(self.new_semaphore(processes), self.loop).result()
+      self.tasks     = {} # job id -> task
+      self.doomed    = set() # jobs cancelled before they were submitted
+      self.ended     = OrderedDict() # the last ENDED jobs, in the order they ended
+      self.lock      = Lock()
+
+   async def new_semaphore(self, n):
+      return asyncio.Semaphore(n)
+
+   # Wait for the end of the process, and reap it.
+   async def reap(self, run):
+      loop = self.loop
+      try:
+         fd = os.pidfd_open(run.pid) # Linux only
+      except (AttributeError, OSError):
+         fd = None
+      if fd == None:
+         _, status, usage = await loop.run_in_executor(None, wait4, run.pid, 0)
+      else:
+         ended = loop.create_future()
+         loop.add_reader(fd, lambda: ended.done() or ended.set_result(None))
+         try:
+            await ended
+         finally:
+            loop.remove_reader(fd)
+            close(fd)
+         _, status, usage = wait4(run.pid, 0)
+      run.status   = waitstatus_to_exitcode(status)
+      run.signaled = WIFSIGNALED(status)
+      run.usage    = usage
+
+   # Copy the output of the process to the file, and give its lines to on_line.
+   async def stream(self, pipe, output, on_line):
+      reader = asyncio.StreamReader(limit = CHUNK)
+      transport, _ = await self.loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+      rest = b""
+      try:
+         while True:
+            chunk = await reader.read(CHUNK)
+            if chunk == b"":
+               break
+            if output != None:
+               output.write(chunk)
+            if on_line != None:
+               lines = (rest + chunk).split(b"\n")
+               rest = lines.pop()
+               for line in lines:
+                  on_line(line.decode('utf-8', 'replace') + "\n")
+         if on_line != None and rest != b"":
+            on_line(rest.decode('utf-8', 'replace'))
+      finally:
+         transport.close()
+
+   # Wait for a killed process, even if the job is cancelled (again) meanwhile.
+   async def finish(self, work, run):
+      while not work.done():
+         try:
+            await asyncio.shield(work)
+         except asyncio.CancelledError:
+            run.cancelled = True
+      return work.result()
+
+   # Kill the process tree when its resident memory exceeds the limit (in GiB).
+   async def watch(self, run, limit):
+      while True:
+         await asyncio.sleep(WATCH_PERIOD)
+         rss = tree_rss(run.pid)
+         run.rss_peak = max(run.rss_peak or 0, rss)
+         if rss > limit * GiB:
+            run.memory_exceeded = True
+            self.kill(run)
+            return
+
+   def kill(self, run):
+      try:
+         killpg(run.pid, SIGKILL)
+      except ProcessLookupError:
+         pass
+
+   # Run a process: timeout in seconds, memory limit in GiB, output is the name of the file
+   # where its output is written (None: inherited from us, if there is no on_line callback).
+   # With the watchdog, the limit is on the resident memory of the process tree.
+   async def execute(self, id, exe, timeout = None, limit = None, output = None, on_line = None,
+                     watchdog = False):
+      run = Run(id, exe)
+      acquired = False
+      try:
+         if self.semaphore != None:
+            try:
+               await self.semaphore.acquire()
+            except asyncio.CancelledError:
+               run.cancelled = True
+               return run
+            acquired = True
+         t = datetime.now()
+         piped = output != None or on_line != None
+         p = Popen(exe, stdin=DEVNULL, stdout=PIPE if piped else None, stderr=STDOUT if piped else None,
+                   start_new_session=True)
+         run.pid = p.pid
+         if limit != None and platform.system() == "Linux" and not watchdog:
+            try:
+               resource.prlimit(p.pid, resource.RLIMIT_AS, (int(limit*GiB*8//10), int(limit*GiB)))
+            except ProcessLookupError:
+               pass
+         f = open(output, "wb") if output != None else None
+         watcher = None
+         try:
+            work = [self.reap(run)] + ([self.stream(p.stdout, f, on_line)] if piped else [])
+            everything = asyncio.gather(*work)
+            if watchdog and limit != None:
+               watcher = asyncio.ensure_future(self.watch(run, limit))
+            try:
+               await asyncio.wait_for(asyncio.shield(everything), timeout)
+            except asyncio.TimeoutError:
+               run.timed_out = True
+               self.kill(run)
+               await self.finish(everything, run)
+            except asyncio.CancelledError:
+               run.cancelled = True
+               self.kill(run)
+               await self.finish(everything, run)
+         finally:
+            if watcher != None:
+               watcher.cancel()
+            if f != None:
+               f.close()
+            # the process has been reaped by wait4
+            p.returncode = run.status
+         run.duration = datetime.now() - t
+      finally:
+         if acquired:
+            self.semaphore.release()
+         with self.lock:
+            self.tasks.pop(id, None)
+            self.end(id)
+      return run
+
+   # (with self.lock)
+   def end(self, id):
+      self.doomed.discard(id)
+      self.ended[id] = None
+      if len(self.ended) > ENDED:
+         self.ended.popitem(last = False)
+
+   async def start(self, id, exe, *args, **kwargs):
+      with self.lock:
+         if id in self.doomed:
+            self.end(id)
+            run = Run(id, exe)
+            run.cancelled = True
+            return run
+         task = asyncio.ensure_future(self.execute(id, exe, *args, **kwargs))
+         self.tasks[id] = task
+      try:
+         return await task
+      except asyncio.CancelledError:
+         # cancelled before it started
+         with self.lock:
+            self.tasks.pop(id, None)
+            self.end(id)
+         run = Run(id, exe)
+         run.cancelled = True
+         return run
+
+   # Run a process from another thread: return a concurrent.futures.Future of the Run.
+   def submit(self, id, exe, timeout = None, limit = None, output = None, on_line = None, watchdog = False):
+      return asyncio.run_coroutine_threadsafe(self.start(id, exe, timeout, limit, output, on_line, watchdog),
+                                              self.loop)
+
+   def run(self, id, exe, timeout = None, limit = None, output = None, on_line = None, watchdog = False):
+      return self.submit(id, exe, timeout, limit, output, on_line, watchdog).result()
+
+   # Kill the process of a job, if it is running (or waiting to run), otherwise do not start it,
+   # unless it has already ended. Job ids must not be reused.
+   def cancel(self, id):
+      with self.lock:
+         task = self.tasks.get(id)
+         if task == None and not id in self.ended:
+            self.doomed.add(id)
+      if task != None:
+         self.loop.call_soon_threadsafe(task.cancel)
+         return True
+      return False
+
+   # Forget a job that was cancelled and will not be submitted.
+   def forget(self, id):
+      with self.lock:
+         self.doomed.discard(id)
+
+   def running(self):
+      with self.lock:
+         return list(self.tasks.keys())
+
+   def close(self):
+      for id in self.running():
+         self.cancel(id)
+      self.doomed = set()
+      self.loop.call_soon_threadsafe(self.loop.stop)
+      self.thread.join()
@@ -0,0 +1,48 @@
+# Snapshots of a lattice exploration campaign, to restart it after a crash (prove.py --resume).
+# prove.py saves the state of the explorer (see Explorer.state) at most every PERIOD seconds:
+# the results marked in the lattice, the timeout and the round of the escalation, and the
+# configurations being tested. The snapshot also has the id of the last decision of the store
+# (see store.py) when it was taken: on restart, the decisions recorded after it are replayed.
+# The configurations that were being tested are not marked, so they are tested again.
+#
+# The file is replaced atomically: a crash while saving leaves the previous snapshot.
+
+import json
+from os import fsync, replace
+from time import monotonic
+
+PERIOD = 60 # seconds
+
+
+def file_name(query):
+   return "snapshot_" + query + ".json"
+
+def save(file, snapshot):
+   tmp = file + ".tmp"
+   with open(tmp, "w") as f:
+      json.dump(snapshot, f, separators = (',', ':'))
+      f.flush()
+      fsync(f.fileno())
+   replace(tmp, file)
+
+# The snapshot saved in the file, None if there is none.
+def load(file):
+   try:
+      with open(file, "r") as f:
+         return json.load(f)
+   except FileNotFoundError:
+      return None
+
+
+# Saves the snapshot given by state() when PERIOD has elapsed since the last one (or when forced).
+class Snapshots:
+   def __init__(self, file, state, period = PERIOD):
+      self.file   = file
+      self.state  = state
+      self.period = period
+      self.last   = monotonic()
+
+   def __call__(self, force = False):
+      if force or monotonic() - self.last >= self.period:
+         save(self.file, self.state())
+         self.last = monotonic()
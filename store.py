@@ -0,0 +1,125 @@
+# Store of the decisions of the lattice exploration campaigns (see prove.py).
+# Each result of a test is appended to an SQLite database as soon as it is known: campaign
+# (the query of prove.py), configuration, result, timeout, running time, peak memory, hash
+# of the input files of ProVerif and version of ProVerif. A campaign can then be resumed
+# from the store (prove.py --start campaigns.db) instead of the results printed at the end
+# of a previous run, even if that run was interrupted.
+
+from configurations import *
+
+import sqlite3
+
+STORE_FILE = "campaigns.db"
+DECIDED    = [Result.TRUE, Result.FALSE, Result.CANNOT]
+BAD        = [Result.FALSE, Result.CANNOT, Result.MEM_OUT, Result.TIMEOUT]
+
+# is this file a store (and not a results file)?
+def is_store(file):
+   try:
+      with open(file, "rb") as f:
+         return f.read(16) == b"SQLite format 3\0"
+   except OSError:
+      return False
+
+# minimal and maximal configurations of a list of bitmasks
+def minimal(bits_list):
+   r = []
+   for b in sorted(bits_list, key = int.bit_count):
+      if not any((m & ~b) == 0 for m in r):
+         r += [b]
+   return r
+
+def maximal(bits_list):
+   r = []
+   for b in sorted(bits_list, key = int.bit_count, reverse = True):
+      if not any((b & ~m) == 0 for m in r):
+         r += [b]
+   return r
+
+
+class Store:
+   def __init__(self, file = STORE_FILE):
+      self.file = file
+      self.db   = sqlite3.connect(file)
+      self.ignored = 0 # decisions left out by the last decisions() or since()
+      self.db.execute("PRAGMA journal_mode=WAL")
+      self.db.execute("""CREATE TABLE IF NOT EXISTS decisions (
+                           id            INTEGER PRIMARY KEY,
+                           campaign      TEXT    NOT NULL,
+                           bits          INTEGER NOT NULL,
+                           configuration TEXT    NOT NULL,
+                           result        TEXT    NOT NULL,
+                           timeout       INTEGER,
+                           duration      REAL,
+                           peak          INTEGER,
+                           model_hash    TEXT,
+                           version       TEXT,
+                           final         INTEGER,
+                           date          TEXT)""")
+      self.db.execute("CREATE INDEX IF NOT EXISTS decisions_campaign ON decisions (campaign, bits)")
+      self.db.commit()
+
+   def record(self, campaign, conf, result, timeout, duration, peak = None, model_hash = None,
+              version = None, final = False):
+      self.db.execute("""INSERT INTO decisions (campaign, bits, configuration, result, timeout, duration,
+                                                peak, model_hash, version, final, date)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))""",
+                      (campaign, conf.bits, str(conf), result.name, timeout, duration.total_seconds(),
+                       peak, model_hash, version, int(final)))
+      self.db.commit()
+
+   # The decision of each configuration below sup, tested in the campaign: bits -> (result, duration).
+   # A result (TRUE, FALSE, CANNOT) overrides the TIMEOUT and MEM_OUT, the last one wins.
+   # current(bits, model_hash, version), if given, tells whether a decision was taken on the
+   # input files and the version of ProVerif of now: the other decisions are ignored, and
+   # counted in self.ignored.
+   def decisions(self, campaign, sup, current = None):
+      d = {}
+      self.ignored = 0
+      for bits, result, duration, model_hash, version in self.db.execute(
+             "SELECT bits, result, duration, model_hash, version FROM decisions " +
+             "WHERE campaign = ? AND (bits & ?) = 0 ORDER BY id",
+             (campaign, ~sup.bits & ALL_BITS)):
+         if current != None and not current(bits, model_hash, version):
+            self.ignored += 1
+            continue
+         result = Result[result]
+         if bits in d and d[bits][0] in DECIDED and not result in DECIDED:
+            continue
+         d[bits] = (result, timedelta(seconds=duration or 0))
+      return d
+
+   # The lists that prove.py reads from a results file: the minimal unproved configurations
+   # (TIMEOUT, and MEM_OUT unless skip_oom), the minimal Out of Memory ones (if skip_oom),
+   # the minimal FALSE (or CANNOT) ones and the maximal TRUE ones (see decisions for current).
+   def resume(self, campaign, sup, skip_oom = False, current = None):
+      d = self.decisions(campaign, sup, current)
+      min_bad = minimal([b for b in d if d[b][0] in BAD])
+      min_cfg   = [bitconf(b) for b in min_bad
+                   if d[b][0] == Result.TIMEOUT or (d[b][0] == Result.MEM_OUT and not skip_oom)]
+      min_oom   = [(bitconf(b), d[b][1]) for b in min_bad if d[b][0] == Result.MEM_OUT and skip_oom]
+      min_false = [(bitconf(b), d[b][0], d[b][1]) for b in min_bad if d[b][0] in [Result.FALSE, Result.CANNOT]]
+      max_true  = [(bitconf(b), d[b][1]) for b in maximal([b for b in d if d[b][0] == Result.TRUE])]
+      return min_cfg, min_oom, min_false, max_true
+
+   # Id of the last decision recorded for the campaign (0 if none)
+   def last(self, campaign):
+      return self.db.execute("SELECT MAX(id) FROM decisions WHERE campaign = ?", (campaign,)).fetchone()[0] or 0
+
+   # The decisions recorded for the campaign after the given id: (bits, result, timeout, duration),
+   # without those that current rejects (see decisions).
+   def since(self, campaign, id, current = None):
+      d = []
+      self.ignored = 0
+      for bits, result, timeout, duration, model_hash, version in self.db.execute(
+             "SELECT bits, result, timeout, duration, model_hash, version FROM decisions " +
+             "WHERE campaign = ? AND id > ? ORDER BY id",
+             (campaign, id)):
+         if current != None and not current(bits, model_hash, version):
+            self.ignored += 1
+            continue
+         d.append((bits, Result[result], timeout, timedelta(seconds=duration or 0)))
+      return d
+
+   def close(self):
+      self.db.close()
@@ -0,0 +1,126 @@
+# Exploration strategies of the lattice: which undecided configuration the explorer tests next
+# (see Explorer). The property is monotone: a configuration below a TRUE one is TRUE, and one
+# above a FALSE one is FALSE; the lattice propagates each result, so a strategy only picks the
+# configurations whose results decide the most.
+#  $ python3 prove.py --strategy bisect ...
+# benchmark.py compares the strategies by the number of calls to the prover.
+
+from configurations import *
+
+
+class Strategy:
+
+   # The next configuration to test among the undecided ones of the lattice of the explorer E,
+   # None if there is none for now. When E speculates, a configuration comparable to one being
+   # tested may be left to E.speculation.
+   def next(self, E):
+      return E.T.first()
+
+   # The configuration to test right after the job (whose result is marked), None if none.
+   def follow(self, E, job):
+      return None
+
+
+# The walk of the Trie: its first configuration (the cheapest of the next ones, if the running
+# times are predicted), and after a TRUE chained job, a mutation up of its configuration. When
+# speculating, the first of the next configurations comparable to none being tested.
+class Greedy(Strategy):
+
+   def next(self, E):
+      conf = E.T.first() if E.predictor == None else E.cheapest()
+      if conf != None and E.speculate and not E.independent(conf):
+         conf = next((c for c in E.T.upcoming(E.CANDIDATES) if E.independent(c)), None)
+      return conf
+
+   def follow(self, E, job):
+      if job.chain and job.result == Result.TRUE:
+         return E.T.mutate_up(job.conf)
+      return None
+
+
+# Binary search along chains: a maximal chain of undecided configurations is built through the
+# first one of the lattice, and its middle is tested. A TRUE result decides the lower half of
+# the chain, any other the upper half, so the boundary of the property on a chain of n
+# configurations is found with about log2(n) calls to the prover. The lattice keeps the
+# chains up to date: they are filtered to the undecided configurations. A chain with a test
+# running waits for its result, and the other workers start other chains.
+class Bisection(Strategy):
+
+   def __init__(self):
+      self.chains = []
+
+   # a maximal chain of undecided configurations through conf, from the bottom up
+   def chain(self, T, conf):
+      down = []
+      c = conf
+      while True:
+         for e in reversed(c.elements):
+            d = c.remove(e)
+            if T.find(d):
+               down.insert(0, d)
+               c = d
+               break
+         else:
+            break
+      up = []
+      c = conf
+      while True:
+         for e in ELEMENTS:
+            if e in T.max and not e in c and T.find(c.add(e)):
+               c = c.add(e)
+               up.append(c)
+               break
+         else:
+            break
+      return down + [conf] + up
+
+   def next(self, E):
+      T = E.T
+      chains = []
+      for chain in self.chains:
+         chain = [c for c in chain if T.result_of(c) in [Result.UNKNOWN, Result.PENDING]]
+         if chain != []:
+            chains.append(chain)
+      self.chains = chains
+      for chain in chains:
+         if all(T.find(c) for c in chain):
+            return chain[len(chain) // 2]
+      taken = set(c for chain in chains for c in chain)
+      for conf in T.upcoming(E.CANDIDATES):
+         if not conf in taken:
+            chain = self.chain(T, conf)
+            self.chains.append(chain)
+            return chain[len(chain) // 2]
+      return None
+
+
+# Priority to the configurations whose result decides the most: a TRUE result decides the
+# undecided configurations below, any other those above, so the expected gain of a test is
+# p * |undecided below| + (1 - p) * |undecided above|, with p the probability that it is TRUE
+# (see Explorer.verdict). The next configurations of the lattice with the highest gain are
+# handed out first, except those comparable to a configuration being tested, as the result of
+# one could make the other pointless (when speculating, those are left to
+# Explorer.speculation).
+class Gain(Strategy):
+   CANDIDATES = 64
+
+   def gain(self, E, conf):
+      p = E.verdict(conf)
+      return p * E.T.count_undecided(conf) + (1 - p) * E.T.count_undecided(conf, up = True)
+
+   def next(self, E):
+      confs = E.T.upcoming(self.CANDIDATES)
+      if confs == []:
+         return None
+      busy = [job.conf for job in E.running.values()] + [job.conf for job in E.held]
+      free = [c for c in confs if not any(c <= b or b <= c for b in busy)]
+      if free == [] and E.speculate:
+         return None
+      return max(free or confs, key = lambda c: self.gain(E, c))
+
+
+STRATEGIES = {
+   "greedy": Greedy,
+   "bisect": Bisection,
+   "gain":   Gain,
+}
@@ -0,0 +1,81 @@
+# The cache of proof results (see cache.py): a decided result answers any job, a TIMEOUT entry
+# answers the jobs with no more time (and gives the others a lower bound), a MEM_OUT entry those
+# with no more memory, and a negative entry never replaces a decided one.
+#
+# usage:
+#  $ python3 test_cache.py
+#  $ python3 -m pytest test_cache.py
+
+from cache import Cache
+from configurations import Result
+from opcua import ProofResult
+
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+
+KEY = "0123456789abcdef"
+
+
+def proof(result):
+   r = ProofResult(["Conf[C]"], "RSA, None, no_reopen, SSec, anon, no_switch, no_leaks")
+   r.result   = result
+   r.duration = timedelta(seconds=3)
+   if result == Result.TRUE:
+      r.verdicts = [Result.TRUE]
+      r.output   = "Verification summary:\n\nQuery not attacker(x) is true.\n"
+   return r
+
+# The result of the job with this budget, if the cache answers it, and the lower bound of
+# the running time known from the cache
+def load(c, timeout, limit):
+   r = proof(Result.UNKNOWN)
+   return (r.result if c.load(KEY, r, timeout, limit) else None), r.lower_bound
+
+def test_timeout():
+   with TemporaryDirectory() as d:
+      c = Cache(d)
+      c.store(KEY, proof(Result.TIMEOUT), 10, 4)
+      assert load(c, 5, 4)  == (Result.TIMEOUT, None)
+      assert load(c, 10, 4) == (Result.TIMEOUT, None)
+      assert load(c, 20, 4) == (None, timedelta(seconds=10))
+      assert load(c, None, 4) == (None, timedelta(seconds=10))
+      # the longest timeout is kept
+      c.store(KEY, proof(Result.TIMEOUT), 20, 4)
+      c.store(KEY, proof(Result.TIMEOUT), 15, 4)
+      assert load(c, 20, 4) == (Result.TIMEOUT, None)
+      # without timeout, a TIMEOUT is not an answer
+      c = Cache(d + "/none")
+      c.store(KEY, proof(Result.TIMEOUT), None, 4)
+      assert load(c, 5, 4) == (None, None)
+
+def test_mem_out():
+   with TemporaryDirectory() as d:
+      c = Cache(d)
+      c.store(KEY, proof(Result.MEM_OUT), 10, 4)
+      assert load(c, 10, 2)    == (Result.MEM_OUT, None)
+      assert load(c, 60, 4)    == (Result.MEM_OUT, None)
+      assert load(c, 10, 8)    == (None, None)
+      assert load(c, 10, None) == (None, None)
+      # without limit, nothing has more memory
+      c.store(KEY, proof(Result.MEM_OUT), 10, None)
+      assert load(c, 10, 8)    == (Result.MEM_OUT, None)
+      assert load(c, 10, None) == (Result.MEM_OUT, None)
+
+def test_decided():
+   with TemporaryDirectory() as d:
+      c = Cache(d)
+      c.store(KEY, proof(Result.TRUE), 10, 4)
+      c.store(KEY, proof(Result.TIMEOUT), 20, 4)
+      c.store(KEY, proof(Result.MEM_OUT), 20, 4)
+      c.store(KEY, proof(Result.ERROR), 20, 4)
+      assert load(c, 100, 100) == (Result.TRUE, None)
+      # errors are not cached
+      c = Cache(d + "/error")
+      c.store(KEY, proof(Result.ERROR), 20, 4)
+      assert load(c, 1, 1) == (None, None)
+
+if __name__ == "__main__":
+   test_timeout()
+   test_mem_out()
+   test_decided()
+   print("The cache answers the jobs whose budget is not larger than the one that failed.")
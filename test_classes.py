@@ -0,0 +1,73 @@
+# The classes of configurations of prove.py --classes (see opcua.classes): the configurations
+# whose input files are the same, once the library keeps only what the model uses, are proved
+# once, and all of them get the result. The model here uses only the crypto of the library,
+# so that the configurations that differ elsewhere fall in the same class.
+#
+# usage:
+#  $ python3 test_classes.py
+#  $ python3 -m pytest test_classes.py
+
+from configurations import *
+from explorer import Explorer
+from lazy import LazyTrie
+import opcua
+
+from os import close, remove
+from tempfile import mkstemp
+
+MODEL = """
+free c: channel.
+process
+  in(c, crypto: cryptography);
+  if allowed_crypto(crypto) then out(c, crypto)
+"""
+SUP = "RSA|ECC, None|Sign, no_reopen, SSec, anon, switch, no_leaks"
+
+
+def model():
+   fd, name = mkstemp(prefix = "tmp_model", suffix = ".pv", dir = ".")
+   close(fd)
+   with open(name, "w") as f:
+      f.write(MODEL)
+   return name
+
+def classes(configurations, **flags):
+   return opcua.classes(configurations, ["Conf[C]"], reconstruct = False, **flags)
+
+def test_hash():
+   m = model()
+   try:
+      rsa    = "RSA, None, no_reopen, SSec, anon, no_switch, no_leaks"
+      switch = "RSA, Sign, no_reopen, SSec, anon, switch, no_leaks"
+      ecc    = "ECC, None, no_reopen, SSec, anon, no_switch, no_leaks"
+      assert opcua.class_hash(["Conf[C]"], rsa, model = m) == opcua.class_hash(["Conf[C]"], switch, model = m)
+      assert opcua.class_hash(["Conf[C]"], rsa, model = m) != opcua.class_hash(["Conf[C]"], ecc, model = m)
+      # the model of the campaigns uses the whole library
+      assert opcua.class_hash(["Conf[C]"], rsa) != opcua.class_hash(["Conf[C]"], switch)
+   finally:
+      remove(m)
+
+def test_explorer():
+   m = model()
+   try:
+      confs = [c for c, r, t, min, max in LazyTrie.from_conf(bitconf.from_str(SUP)).configurations()]
+      groups = classes(confs, model = m)
+   finally:
+      remove(m)
+   assert len(set(map(id, groups.values()))) == 3 # by crypto
+   calls = []
+   def test(job):
+      calls.append(job.conf)
+      return (Result.FALSE if Crypto.ECC in job.conf else Result.TRUE), timedelta(seconds=1)
+   E = Explorer(LazyTrie.from_conf(bitconf.from_str(SUP)), test)
+   E.classes = groups
+   E.run([], use_first = True)
+   # one run per class at most, and every configuration gets the result of its class
+   assert len(calls) == len(set(id(groups[c]) for c in calls))
+   for c in confs:
+      assert E.T.result_of(c) == (Result.FALSE if Crypto.ECC in c else Result.TRUE), str(c)
+
+if __name__ == "__main__":
+   test_hash()
+   test_explorer()
+   print("The configurations of a class are proved once.")
@@ -0,0 +1,96 @@
+# The coordinator of cluster.py, with workers on localhost that need no ProVerif: a worker with
+# a wrong token is rejected and stops, and the run given to a worker that hangs (it reads
+# nothing and answers nothing) blocks no one else, and is handed out to another worker once the
+# hung one is disconnected.
+#
+# usage:
+#  $ python3 test_cluster.py
+#  $ python3 -m pytest test_cluster.py
+
+import cluster
+from cluster import Coordinator, Worker, send
+from configurations import Result
+import opcua
+
+import json
+import socket
+from threading import Lock, Thread
+from time import sleep, time
+
+TOKEN = "secret"
+JOB   = 32 << 20 # characters of the input file, more than the buffers of a socket
+
+
+def coordinator():
+   C = Coordinator(0, token = TOKEN)
+   return C, C.server.getsockname()[1]
+
+# A worker without ProVerif: it answers the pings and proves every job, unless it hangs.
+def fake_worker(port, hang = False):
+   sock = socket.create_connection(("localhost", port))
+   stream = sock.makefile('rwb')
+   lock = Lock()
+   send(stream, lock, {"type": "hello", "host": "hung" if hang else "fake", "cores": 1, "memory": 1,
+                       "token": TOKEN})
+   if hang:
+      return sock
+   def answer():
+      try:
+         for line in stream:
+            m = json.loads(line)
+            if m["type"] == "ping":
+               send(stream, lock, {"type": "pong"})
+            elif m["type"] == "job":
+               r = opcua.ProofResult(["Conf[C]"], "")
+               r.result, r.verdicts = Result.TRUE, [Result.TRUE]
+               send(stream, lock, {"type": "result", "id": m["id"], "result": r.to_dict()})
+      except OSError:
+         pass
+   Thread(target = answer, daemon = True).start()
+   return sock
+
+def wait(condition, timeout = 10):
+   t = time()
+   while not condition():
+      assert time() - t < timeout, "too long"
+      sleep(0.05)
+
+def test_token():
+   C, port = coordinator()
+   w = Thread(target = Worker("localhost", port, 1, 1, "wrong").run, daemon = True)
+   w.start()
+   w.join(10)
+   assert not w.is_alive(), "the rejected worker keeps trying"
+   assert C.workers == []
+
+def test_hung_worker():
+   heartbeat, silence = cluster.HEARTBEAT, cluster.SILENCE
+   cluster.HEARTBEAT, cluster.SILENCE = 0.2, 2
+   try:
+      C, port = coordinator()
+      hung = fake_worker(port, hang = True)
+      wait(lambda: len(C.workers) == 1)
+      r = opcua.ProofResult(["Conf[C]"], "")
+      job = Thread(target = C.execute, args = (r, "x" * JOB, ""), kwargs = {"job_id": "job"},
+                  daemon = True)
+      job.start()
+      wait(lambda: C.pending == [])
+      # the job is being sent to the hung worker, without the lock of the coordinator
+      cancel = Thread(target = C.cancel, args = ("other",), daemon = True)
+      cancel.start()
+      cancel.join(1)
+      assert not cancel.is_alive(), "the coordinator is blocked by the hung worker"
+      C.forget("other")
+      fake_worker(port)
+      job.join(30)
+      assert not job.is_alive(), "the run is not handed out again"
+      assert r.result == Result.TRUE
+      assert [w.host for w in C.workers] == ["fake"]
+      hung.close()
+   finally:
+      cluster.HEARTBEAT, cluster.SILENCE = heartbeat, silence
+
+if __name__ == "__main__":
+   test_token()
+   test_hung_worker()
+   print("The coordinator rejects the wrong tokens and gets over hung workers.")
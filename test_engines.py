@@ -0,0 +1,58 @@
+# The lattice engines (Trie of configurations.py, DenseTrie of lattice.py and LazyTrie of
+# lazy.py, the default one) must explore the lattice in the same way: with the same
+# deterministic prover, each strategy calls it on the same configurations, in the same order,
+# and finds the same frontiers. The prover is an oracle built from the proofs of results.md
+# (see benchmark.py), where some of the configurations that are not proved time out.
+#
+# usage:
+#  $ python3 test_engines.py
+#  $ python3 -m pytest test_engines.py
+
+from benchmark import MAXIMAL, proofs
+from configurations import *
+from explorer import Explorer
+from lazy import LazyTrie
+from strategy import STRATEGIES
+
+ENGINES = {"trie": Trie, "lazy": LazyTrie}
+try:
+   from lattice import DenseTrie
+   ENGINES["dense"] = DenseTrie
+except ImportError:
+   print("NumPy is missing: the dense engine is not tested.")
+
+PROPERTIES = ["Conf[C]", "Conf[Pwd]"]
+SLOW       = bitconf.from_str("RSA, None, no_reopen, SNoAA, cert, no_switch, no_leaks") # and above
+
+
+# The calls to the prover and the frontiers of the exploration of the engine.
+def explore(engine, strategy, proved, sup):
+   calls = []
+   def test(job):
+      calls.append(str(job.conf))
+      if any(job.conf <= c for c in proved):
+         return Result.TRUE, timedelta(seconds=1)
+      if SLOW <= job.conf:
+         return Result.TIMEOUT, timedelta(seconds=2)
+      return Result.FALSE, timedelta(seconds=1)
+   E = Explorer(engine.from_conf(sup), test, 1, 2, strategy = STRATEGIES[strategy]())
+   E.run([], use_first = True)
+   return calls, [[(str(c), r) for c, r, d in f] for f in E.frontier()]
+
+def test_engines():
+   sup = bitconf.from_str(MAXIMAL)
+   p = proofs()
+   for query in PROPERTIES:
+      for strategy in STRATEGIES:
+         runs = {name: explore(engine, strategy, p[query], sup) for name, engine in ENGINES.items()}
+         calls, frontiers = runs["trie"]
+         assert frontiers[1] != [] and frontiers[2] != []
+         for name, run in runs.items():
+            assert run[0] == calls, name + " and trie call the prover differently for " + \
+                                    query + " with the " + strategy + " strategy"
+            assert run[1] == frontiers, name + " and trie find different frontiers for " + \
+                                        query + " with the " + strategy + " strategy"
+
+if __name__ == "__main__":
+   test_engines()
+   print("The engines " + ", ".join(ENGINES) + " agree.")
@@ -0,0 +1,55 @@
+# The history of the runs of ProVerif (see history.py and predictor.py): only the runs of the
+# same model (see opcua.model_settings), e.g. the fixed one of prove.py, predict the memory,
+# the running time and the verdicts of the next runs; the runs of another model, e.g. with
+# the signature oracle, are kept in the file, but not used.
+#
+# usage:
+#  $ python3 test_history.py
+#  $ python3 -m pytest test_history.py
+
+from configurations import *
+from history import History
+import opcua
+from predictor import Predictor
+
+from os import path
+from tempfile import TemporaryDirectory
+
+QUERY = "Conf[Pwd]"
+BELOW = "RSA, None, no_reopen, SNoAA, pwd, no_switch, no_leaks"
+CONF  = "RSA, None, no_reopen, SNoAA, pwd, no_switch, lt_leaks"
+FIXED  = opcua.model_settings(reconstruct = False)
+ORACLE = opcua.model_settings(reconstruct = False, oracle = True)
+
+
+def run(result, seconds, peak):
+   r = opcua.ProofResult([QUERY], BELOW)
+   r.result, r.duration, r.peak = result, timedelta(seconds=seconds), peak
+   return r
+
+def test_model():
+   assert FIXED != ORACLE
+   with TemporaryDirectory() as d:
+      file = path.join(d, "history.jsonl")
+      h = History(file, FIXED)
+      h.record(run(Result.FALSE, 3000, 1 << 34), 3600, 32, model = ORACLE)
+      h.record(run(Result.TRUE, 10, 1 << 30), 3600, 32, model = FIXED)
+      assert h.count == 1
+      p = Predictor(h, [QUERY], model = FIXED)
+      assert not h.refuted(QUERY, bitconf.from_str(CONF))
+      assert h.memory(QUERY, bitconf.from_str(CONF)) == (1 << 30) * 2
+      assert round(p.duration(QUERY, bitconf.from_str(CONF))) == 10
+      assert p.true(QUERY, bitconf.from_str(CONF)) == 1
+      # all the runs are in the file
+      h = History(file)
+      assert h.count == 2
+      assert h.refuted(QUERY, bitconf.from_str(CONF))
+      assert Predictor(h, [QUERY]).duration(QUERY, bitconf.from_str(CONF)) > 11
+      p = Predictor(h, [QUERY], model = ORACLE)
+      assert round(p.duration(QUERY, bitconf.from_str(CONF))) == 3000
+      assert p.true(QUERY, bitconf.from_str(CONF)) == 0
+      assert History(file, ORACLE).count == 1
+
+if __name__ == "__main__":
+   test_model()
+   print("The runs of another model predict nothing.")
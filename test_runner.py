@@ -0,0 +1,98 @@
+# The runner of ProVerif processes (see runner.py), with sh and sleep as the prover: a job that
+# runs out of time or is cancelled by its id is killed with all its process group, and a job
+# cancelled while it waits for a free process (or before it is submitted) never starts, and is
+# not reported as running. With the watchdog (Linux only), a job whose process tree uses more
+# resident memory than its limit is killed.
+#
+# usage:
+#  $ python3 test_runner.py
+#  $ python3 -m pytest test_runner.py
+
+from runner import Runner, GiB
+
+import os
+import platform
+from time import sleep
+
+# A shell that starts a child and prints its pid, then waits for it.
+FAMILY = ["sh", "-c", "sleep 60 & echo $!; wait"]
+# A shell whose child takes 256 MiB of resident memory.
+GREEDY = ["sh", "-c", "python3 -c 'import time; m = bytearray(1 << 28); time.sleep(60)'; true"]
+# A process that maps 1 GiB without using it.
+LAZY   = ["python3", "-c", "import mmap; m = mmap.mmap(-1, 1 << 30)"]
+
+
+def alive(pid):
+   try:
+      os.kill(pid, 0)
+   except ProcessLookupError:
+      return False
+   # a zombie is dead
+   with open("/proc/" + str(pid) + "/stat", "r") as f:
+      return f.read().split(")")[-1].split()[0] != "Z"
+
+def test_timeout():
+   r = Runner()
+   try:
+      lines = []
+      run = r.run("timeout", FAMILY, timeout = 1, on_line = lines.append)
+      assert run.timed_out and run.signaled and not run.cancelled
+      child = int(lines[0])
+      sleep(0.2)
+      assert not alive(child), "the child of the shell survives"
+   finally:
+      r.close()
+
+def test_cancel():
+   r = Runner(processes = 1)
+   try:
+      lines = []
+      running = r.submit("running", FAMILY, on_line = lines.append)
+      waiting = r.submit("waiting", ["true"])
+      while lines == []:
+         sleep(0.05)
+      assert sorted(r.running()) == ["running", "waiting"]
+      # cancelled while it waits for the process of the first job
+      assert r.cancel("waiting")
+      run = waiting.result(10)
+      assert run.cancelled and run.pid == None
+      assert r.running() == ["running"]
+      assert not r.cancel("waiting"), "an ended job is cancelled again"
+      # cancelled while it runs
+      assert r.cancel("running")
+      run = running.result(10)
+      assert run.cancelled and run.signaled
+      sleep(0.2)
+      assert not alive(int(lines[0])), "the child of the shell survives"
+      assert r.running() == []
+      # cancelled before it is submitted
+      assert not r.cancel("later")
+      run = r.run("later", ["true"])
+      assert run.cancelled and run.pid == None
+      # the process is free again
+      run = r.run("last", ["true"], timeout = 10)
+      assert run.exit_code() == 0 and not run.cancelled
+   finally:
+      r.close()
+
+def test_watchdog():
+   if platform.system() != "Linux":
+      return
+   r = Runner()
+   try:
+      run = r.run("greedy", GREEDY, timeout = 30, limit = 0.125, watchdog = True)
+      assert run.memory_exceeded and run.signaled and not run.timed_out
+      assert run.peak() > GiB // 8
+      # the address space is not limited, as it is without the watchdog
+      run = r.run("lazy", LAZY, timeout = 30, limit = 0.5, watchdog = True)
+      assert run.exit_code() == 0 and not run.memory_exceeded
+      run = r.run("limited", LAZY, timeout = 30, limit = 0.5, output = os.devnull)
+      assert run.exit_code() != 0
+   finally:
+      r.close()
+
+if __name__ == "__main__":
+   test_timeout()
+   test_cancel()
+   test_watchdog()
+   print("The runner kills the process groups of the jobs that time out, are cancelled or use too much memory.")
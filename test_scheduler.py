@@ -0,0 +1,76 @@
+# The memory admission of the tests (see explorer.Scheduler): a test is admitted only if the
+# memory predicted for it (with a margin) fits beside the tests being run, or if no test runs,
+# and a test without prediction counts for the default limit of each of its processes. With
+# several processes, the explorer never runs more tests than the memory admits.
+#
+# usage:
+#  $ python3 test_scheduler.py
+#  $ python3 -m pytest test_scheduler.py
+
+from configurations import *
+from explorer import Explorer, Scheduler, GiB
+from lazy import LazyTrie
+
+from threading import Lock
+from time import sleep
+
+SUP = "RSA|ECC, None|Sign, no_reopen, SSec, anon|pwd, switch, no_leaks"
+
+
+class Job:
+   def __init__(self, id, need):
+      self.id    = id
+      self.conf  = need # the scheduler only gives it to need_of
+      self.limit = None
+
+def test_admit():
+   S = Scheduler(lambda need: need, 2, runs = 3, capacity = 10 * GiB)
+   big, other, small, unknown = Job(1, 4 * GiB), Job(2, 4 * GiB), Job(3, GiB // 2), Job(4, None)
+   assert S.need(big) == 6 * GiB      # with the margin
+   assert S.need(small) == 1 * GiB    # at least MIN_LIMIT
+   assert S.need(unknown) == 6 * GiB  # the default limit for each of its 3 processes
+   assert S.admit(big) and big.limit == 2 # the default limit without the watchdog
+   assert not S.admit(other)
+   assert S.admit(small)
+   assert not S.admit(small, aside = 4 * GiB) # memory kept for a held test
+   S.release(big)
+   assert S.admit(other)
+   S.release(other)
+   S.release(small)
+   # a test too large for the memory is admitted alone
+   huge = Job(5, 100 * GiB)
+   assert S.admit(huge)
+   assert not S.admit(small)
+   # with the watchdog, the limit of a test is its prediction with the margin
+   W = Scheduler(lambda need: need, 2, capacity = 10 * GiB, watchdog = True)
+   assert W.admit(big) and big.limit == 6
+   assert W.admit(unknown) and unknown.limit == 2
+
+def test_explorer():
+   lock = Lock()
+   running = []
+   most = [0]
+   cancelled = set() # like prove.py, the tests decided meanwhile are stopped
+   def test(job):
+      with lock:
+         running.append(job)
+         most[0] = max(most[0], len(running))
+      sleep(0.02)
+      with lock:
+         running.remove(job)
+      if job.id in cancelled:
+         return Result.CANCELLED, timedelta(0)
+      return (Result.FALSE if Mode.Sign in job.conf else Result.TRUE), timedelta(seconds=1)
+   # each test needs 4 GiB, that is 6 GiB with the margin: 2 of them fit in 13 GiB
+   S = Scheduler(lambda conf: 4 * GiB, 2, capacity = 13 * GiB)
+   E = Explorer(LazyTrie.from_conf(bitconf.from_str(SUP)), test, 4, cancel = cancelled.add, scheduler = S)
+   E.run([], use_first = True)
+   assert most[0] == 2
+   assert S.reserved == {}
+   for c, r, t, inf, sup in E.T.configurations():
+      assert r == (Result.FALSE if Mode.Sign in c else Result.TRUE), str(c)
+
+if __name__ == "__main__":
+   test_admit()
+   test_explorer()
+   print("The tests are admitted within the memory.")
@@ -0,0 +1,70 @@
+# The snapshots of prove.py --resume (see snapshot.py and Explorer.state): an exploration
+# restarted from a snapshot taken in the middle of a run does not test again what the snapshot
+# knows, and ends with the same frontiers and decided results as the run that was not
+# interrupted. The prover is an oracle built from the proofs of results.md, as in
+# test_engines.py.
+#
+# usage:
+#  $ python3 test_snapshot.py
+#  $ python3 -m pytest test_snapshot.py
+
+from benchmark import MAXIMAL, proofs
+from configurations import *
+from explorer import Explorer
+from lazy import LazyTrie
+import snapshot
+
+from os import path
+from tempfile import TemporaryDirectory
+
+QUERY = "Conf[C]"
+SLOW  = bitconf.from_str("RSA, None, no_reopen, SNoAA, cert, no_switch, no_leaks") # and above
+AFTER = 10 # results before the snapshot
+
+
+def explorer(calls):
+   proved = proofs()[QUERY]
+   def test(job):
+      calls.append(job.conf.bits)
+      if any(job.conf <= c for c in proved):
+         return Result.TRUE, timedelta(seconds=1)
+      if SLOW <= job.conf:
+         return Result.TIMEOUT, timedelta(seconds=2)
+      return Result.FALSE, timedelta(seconds=1)
+   return Explorer(LazyTrie.from_conf(bitconf.from_str(MAXIMAL)), test, 1, 2)
+
+def results(E):
+   return {c.bits: r for c, r, t, min, max in E.T.configurations()}
+
+def test_resume():
+   with TemporaryDirectory() as d:
+      file = path.join(d, snapshot.file_name(QUERY))
+      calls = []
+      E = explorer(calls)
+      def checkpoint():
+         if len(calls) == AFTER:
+            snapshot.save(file, E.state())
+      E.checkpoint = checkpoint
+      E.run([], use_first = True)
+      assert len(calls) > AFTER
+      s = snapshot.load(file)
+      assert len(s["facts"]) + len(s["timeouts"]) == AFTER
+      again = []
+      R = explorer(again)
+      R.restore(s)
+      R.run([], use_first = True)
+      assert set(again).isdisjoint(calls[:AFTER]), "tested again after the snapshot"
+      assert len(again) <= len(calls) - AFTER
+      # the facts are marked before the timeouts: a configuration above a FALSE one and a
+      # TIMEOUT one may be FALSE after the restart, and TIMEOUT without it
+      e, r = results(E), results(R)
+      assert e.keys() == r.keys()
+      assert all(r[b] == e[b] for b in e if e[b] in [Result.TRUE, Result.FALSE])
+      assert all(r[b] in [Result.FALSE, Result.TIMEOUT] for b in e if e[b] == Result.TIMEOUT)
+      assert [[(c.bits, r) for c, r, t in f] for f in R.frontier()] == \
+             [[(c.bits, r) for c, r, t in f] for f in E.frontier()]
+   assert snapshot.load(file) == None
+
+if __name__ == "__main__":
+   test_resume()
+   print("A run restarted from a snapshot ends like the run that was not interrupted.")
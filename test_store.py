@@ -0,0 +1,69 @@
+# The store of the decisions of the campaigns (see store.py): when a campaign is resumed, a
+# decided result (TRUE, FALSE, CANNOT) of a configuration overrides its TIMEOUT and MEM_OUT
+# whatever their order, the decisions taken on another model or with another version of
+# ProVerif are left out, and the lists are those of a results file.
+#
+# usage:
+#  $ python3 test_store.py
+#  $ python3 -m pytest test_store.py
+
+from configurations import *
+from store import Store
+
+from os import path
+from tempfile import TemporaryDirectory
+
+QUERY = "Conf[C]"
+SUP   = bitconf.from_str("RSA|ECC, None, no_reopen, SSec, anon|pwd, no_switch, no_leaks")
+RSA   = bitconf.from_str("RSA, None, no_reopen, SSec, anon, no_switch, no_leaks")
+ECC   = bitconf.from_str("ECC, None, no_reopen, SSec, anon, no_switch, no_leaks")
+PWD   = bitconf.from_str("RSA, None, no_reopen, SSec, pwd, no_switch, no_leaks")
+OTHER = bitconf.from_str("RSA, Sign, no_reopen, SSec, anon, no_switch, no_leaks") # above SUP
+
+
+def record(s, conf, result, timeout = 10, version = "1"):
+   s.record(QUERY, conf, result, timeout, timedelta(seconds=timeout), model_hash = "h", version = version)
+
+def test_resume():
+   with TemporaryDirectory() as d:
+      s = Store(path.join(d, "campaigns.db"))
+      # decided before and after a timeout
+      record(s, RSA, Result.TRUE)
+      record(s, RSA, Result.TIMEOUT, 60)
+      record(s, ECC, Result.TIMEOUT)
+      record(s, ECC, Result.MEM_OUT)
+      record(s, ECC, Result.FALSE, 20)
+      record(s, PWD, Result.TIMEOUT)
+      record(s, OTHER, Result.FALSE)
+      d = s.decisions(QUERY, SUP)
+      assert d[RSA.bits] == (Result.TRUE, timedelta(seconds=10))
+      assert d[ECC.bits] == (Result.FALSE, timedelta(seconds=20))
+      assert not OTHER.bits in d
+      min_cfg, min_oom, min_false, max_true = s.resume(QUERY, SUP)
+      assert [str(c) for c in min_cfg] == [str(PWD)]
+      assert min_oom == []
+      assert [(str(c), r) for c, r, t in min_false] == [(str(ECC), Result.FALSE)]
+      assert [str(c) for c, t in max_true] == [str(RSA)]
+      s.close()
+
+def test_current():
+   with TemporaryDirectory() as d:
+      s = Store(path.join(d, "campaigns.db"))
+      record(s, RSA, Result.TRUE, version = "0")
+      record(s, RSA, Result.TIMEOUT)
+      record(s, ECC, Result.MEM_OUT)
+      current = lambda bits, model_hash, version: version == "1"
+      min_cfg, min_oom, min_false, max_true = s.resume(QUERY, SUP, skip_oom = True, current = current)
+      assert s.ignored == 1
+      assert [str(c) for c in min_cfg] == [str(RSA)]
+      assert [str(c) for c, t in min_oom] == [str(ECC)]
+      assert max_true == []
+      assert [(b, r) for b, r, t, d in s.since(QUERY, 1, current)] == \
+             [(RSA.bits, Result.TIMEOUT), (ECC.bits, Result.MEM_OUT)]
+      assert s.since(QUERY, 0, current)[0][1] == Result.TIMEOUT and s.ignored == 1
+      s.close()
+
+if __name__ == "__main__":
+   test_resume()
+   test_current()
+   print("The decided results of the store override its timeouts.")
@@ -0,0 +1,54 @@
+# The parser of the output of ProVerif as it is printed (see opcua.StreamParser): ProVerif is
+# stopped at the first false query, once, and the job is FALSE with the verdicts known then.
+# The prover is a shell script that prints its verdicts, then sleeps.
+#
+# usage:
+#  $ python3 test_stream.py
+#  $ python3 -m pytest test_stream.py
+
+from configurations import Result
+import opcua
+
+import os
+from tempfile import TemporaryDirectory
+from time import monotonic
+
+PROVERIF = """#!/bin/sh
+echo "RESULT not attacker(secret[]) is true."
+echo "Starting query not attacker(pwd[])"
+echo "RESULT not attacker(pwd[]) is false."
+sleep 60
+"""
+
+
+def test_parser():
+   aborts = []
+   p = opcua.StreamParser(abort = lambda: aborts.append(len(p.verdicts)))
+   for line in ["Process 0", "RESULT inj-event(end) ==> inj-event(begin) is true.",
+                "RESULT not attacker(k[]) cannot be proved.", "RESULT not attacker(pwd[]) is false.",
+                "RESULT not attacker(secret[]) is false.", "RESULT not attacker(nonce[]) is true."]:
+      p.line(line + "\n")
+   assert p.verdicts == [Result.TRUE, Result.CANNOT, Result.FALSE, Result.FALSE, Result.TRUE]
+   assert p.aborted and aborts == [3]
+
+def test_abort():
+   with TemporaryDirectory() as d:
+      with open(os.path.join(d, "proverif"), "w") as f:
+         f.write(PROVERIF)
+      os.chmod(os.path.join(d, "proverif"), 0o755)
+      path = os.environ["PATH"]
+      os.environ["PATH"] = d + os.pathsep + path
+      try:
+         r = opcua.ProofResult(["Conf[C]", "Conf[Pwd]"], "")
+         t = monotonic()
+         opcua.execute(r, "", "", timeout = 30, rnd_ext = "_test_stream", early_abort = True)
+         assert monotonic() - t < 10, "ProVerif is not stopped"
+      finally:
+         os.environ["PATH"] = path
+   assert r.result == Result.FALSE and r.cancelled and not r.timed_out
+   assert r.aborted == [Result.TRUE, Result.FALSE]
+
+if __name__ == "__main__":
+   test_parser()
+   test_abort()
+   print("ProVerif is stopped at the first false query.")